@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
 
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        # drop cached token lookups when a token or its user changes (deleting a user
+        # cascades to its token)
+        from django.contrib.auth.models import User
+        from rest_framework.authtoken.models import Token
+        from api import authentication
+        post_save.connect(authentication.evict_token, sender=Token, dispatch_uid='token_cache_save_token')
+        post_delete.connect(authentication.evict_token, sender=Token, dispatch_uid='token_cache_delete_token')
+        post_save.connect(authentication.evict_user_tokens, sender=User, dispatch_uid='token_cache_save_user')
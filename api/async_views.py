@@ -0,0 +1,285 @@
+"""
+    async_views.py: async versions of the read endpoints, served by jetson/asgi.py
+
+    The ORM is synchronous, so database work still runs on a thread (database_sync_to_async),
+    but only for as long as it takes. Cached token lookups are answered on the event loop
+    without a thread, so one process holds many more concurrent requests than it has
+    threads. The per-user quotes and the catalog version stamps they depend on come from
+    the shared caches (see SHARED_CACHE in jetson/settings.py), so they are read on a
+    thread. The JSON bodies are the ones the views in api/views.py return, those views
+    and their helpers do the actual work.
+
+    Only GET requests are handled here, anything else goes to the WSGI app (see
+    AsyncApiApplication). The requests handled here skip the MIDDLEWARE stack: the headers
+    SecurityMiddleware and XFrameOptionsMiddleware add are added to the responses here as
+    well (RESPONSE_MIDDLEWARE), but there is no Server-Timing header or api.timing log line
+    (api/timing.py) and no request profiles (api/profiling.py), use the WSGI endpoints to
+    time or profile a request.
+"""
+
+import json
+import pickle
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpRequest, QueryDict
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from rest_framework import exceptions
+from rest_framework.authentication import get_authorization_header
+
+from api import views
+from api.authentication import CachedTokenAuthentication, tokenCache
+from api.profile import UserProfile
+from api.renderers import render_response
+from app.scripts import catalog
+
+
+def database_sync_to_async(func):
+    """
+        sync_to_async for functions that query the database: runs them on the thread pool
+        and closes connections that are past CONN_MAX_AGE or broken, like the request
+        signals do for the WSGI handler. The catalog version stamps are read at most once
+        per call.
+    """
+    def run(*args, **kwargs):
+        close_old_connections()
+        catalog.start_request()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            catalog.finish_request()
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False)
+
+
+def unauthorized(request, detail):
+    # the body and header DRF sends for a failed TokenAuthentication
+    response = render_response(request, {'detail': str(detail)}, status=401)
+    response['WWW-Authenticate'] = 'Token'
+    return response
+
+
+async def authenticate(request):
+    """
+        Sets request.user the way CachedTokenAuthentication does, from the token cache
+        when possible
+        :return None or the 401 response to send
+    """
+    auth = get_authorization_header(request).split()
+    cached = None
+    if len(auth) == 2 and auth[0].lower() == b'token':
+        cached = tokenCache.get(auth[1].decode('latin1'))
+
+    try:
+        if cached is not None:
+            user, token = pickle.loads(cached)
+        else:
+            result = await database_sync_to_async(CachedTokenAuthentication().authenticate)(request)
+            if result is None:
+                raise exceptions.NotAuthenticated()
+            user, token = result
+    except exceptions.APIException as exc:
+        return unauthorized(request, exc.detail)
+
+    request.user = user
+    request.auth = token
+    return None
+
+
+async def getUserInfo(request):
+    res = { 'success': False, 'error': '', 'data': None }
+
+    if (views.validateRequest(request, [], 'GET', res)):
+        res['data'] = await database_sync_to_async(views.getUserInfoHelper)(request.user)
+        res['success'] = True
+
+    return render_response(request, res)
+
+
+async def getInsuranceInfo(request):
+    res = { 'success': False, 'error': '', 'data': None }
+
+    if (views.validateRequest(request, ['insuranceType'], 'GET', res)):
+        insuranceType = request.GET['insuranceType']
+
+        if (insuranceType == 'HEALTH' or insuranceType == 'LIFE' or insuranceType == 'DISABILITY'):
+            res['data'] = await database_sync_to_async(views.getInsuranceInfoHelper)(request.user, insuranceType)
+            res['success'] = True
+        else:
+            res['error'] = 'invalid insurance type'
+
+    return render_response(request, res)
+
+
+async def getAllInsuranceInfo(request):
+    res = { 'success': False, 'error': '', 'data': None }
+
+    def load(user):
+        profile = UserProfile(user)
+        return dict((insuranceType, views.getInsuranceInfoHelper(user, insuranceType, profile))
+            for insuranceType in ['HEALTH', 'LIFE', 'DISABILITY'])
+
+    if (views.validateRequest(request, [], 'GET', res)):
+        res['data'] = await database_sync_to_async(load)(request.user)
+        res['success'] = True
+
+    return render_response(request, res)
+
+
+async def cachedQuotes(user, insurance_types):
+    """
+        The async getCachedQuotes: the shared cache lookup and, on a miss, the quotes are
+        done in one trip to the thread pool
+    """
+    return await database_sync_to_async(views.getCachedQuotes)(user, insurance_types)
+
+
+async def getInsuranceQuote(request):
+    res = { 'success': False, 'error': '', 'data': None }
+
+    if (views.validateRequest(request, ['insuranceType'], 'GET', res)):
+        insurance_type = request.GET['insuranceType']
+
+        if (insurance_type == 'HEALTH' or insurance_type == 'LIFE' or insurance_type == 'DISABILITY'):
+            res['data'] = (await cachedQuotes(request.user, [insurance_type]))[insurance_type]
+            res['success'] = True
+        else:
+            res['error'] = 'invalid insurance type'
+
+    return render_response(request, res)
+
+
+async def getAllInsuranceQuotes(request):
+    res = { 'success': False, 'error': '', 'data': None }
+
+    if (views.validateRequest(request, [], 'GET', res)):
+        res['data'] = await cachedQuotes(request.user, ['LIFE', 'HEALTH', 'DISABILITY'])
+        res['success'] = True
+
+    return render_response(request, res)
+
+
+async def generateInsuranceQuotes(request):
+    res = { 'success': False, 'error': '', 'data': None }
+
+    if (not views.validateRequest(request, ['userData'], 'GET', res)):
+        return render_response(request, res)
+
+    userData = json.loads(request.GET['userData'])
+
+    def respond():
+        # the etag needs the catalog version stamps, computing needs the catalogs
+        etag, response = views.cachedQuotesResponse(request, userData)
+        if (response is None):
+            response = views.computeQuotesResponse(request, userData, etag)
+        return response
+
+    return await database_sync_to_async(respond)()
+
+
+# url name --> (async view, needs a token)
+ASYNC_VIEWS = {
+    'getUserInfo': (getUserInfo, True),
+    'getInsuranceInfo': (getInsuranceInfo, True),
+    'getAllInsuranceInfo': (getAllInsuranceInfo, True),
+    'getInsuranceQuote': (getInsuranceQuote, True),
+    'getAllInsuranceQuotes': (getAllInsuranceQuotes, True),
+    'generateInsuranceQuotes': (generateInsuranceQuotes, False),
+}
+
+
+def build_request(scope):
+    """
+        Builds the HttpRequest of an ASGI http scope (GET requests only, no body)
+    """
+    request = HttpRequest()
+    request.method = scope['method']
+    request.path = request.path_info = scope['path']
+    query_string = scope.get('query_string', b'').decode('latin1')
+    request.META = {
+        'REQUEST_METHOD': scope['method'],
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': query_string,
+        'SCRIPT_NAME': scope.get('root_path', ''),
+    }
+    if scope.get('server'):
+        request.META['SERVER_NAME'], request.META['SERVER_PORT'] = scope['server'][0], str(scope['server'][1])
+    if scope.get('client'):
+        request.META['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        request.META[name] = value.decode('latin1')
+    request.GET = QueryDict(query_string)
+    return request
+
+
+# middleware of MIDDLEWARE that only add response headers, applied to the async responses
+# too when they are installed
+RESPONSE_MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+
+class AsyncApiApplication(object):
+    """
+        ASGI application serving ASYNC_VIEWS itself and passing every other request to
+        `fallback` (the WSGI app wrapped with asgiref's WsgiToAsgi)
+    """
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self.routes = None
+        self.response_middleware = None
+
+    def process_response(self, request, response):
+        """
+            Runs the installed RESPONSE_MIDDLEWARE over response, in the order the WSGI
+            handler would
+        """
+        if self.response_middleware is None:
+            self.response_middleware = [import_string(path)(lambda request: None)
+                for path in reversed(settings.MIDDLEWARE) if path in RESPONSE_MIDDLEWARE]
+        for middleware in self.response_middleware:
+            response = middleware.process_response(request, response)
+        return response
+
+    def route(self, path):
+        if self.routes is None:
+            self.routes = dict((reverse(name), view) for name, view in ASYNC_VIEWS.items())
+        return self.routes.get(path)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        route = self.route(scope['path']) if scope['type'] == 'http' and scope['method'] == 'GET' else None
+        if route is None:
+            return await self.fallback(scope, receive, send)
+
+        view, needs_token = route
+        request = build_request(scope)
+        response = await authenticate(request) if needs_token else None
+        if response is None:
+            response = await view(request)
+        response = self.process_response(request, response)
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(name.encode('latin1'), value.encode('latin1')) for name, value in response.items()],
+        })
+        await send({'type': 'http.response.body', 'body': response.content})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,58 @@
+"""
+    authentication.py: token authentication with a per-worker cache of the token lookups
+"""
+
+import pickle
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from api.caching import TTLCache
+
+# token key --> pickled (user, token), see CachedTokenAuthentication
+tokenCache = TTLCache(getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 10000), getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 5))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+        Drop-in replacement for TokenAuthentication that remembers which user a token
+        belongs to, so repeat requests skip the authtoken_token / auth_user join
+
+        Entries are evicted in this worker as soon as a token is deleted or rotated or its
+        user is saved (deactivation, password change), see api/apps.py. Other workers keep
+        accepting a revoked token until their entry expires, at most AUTH_TOKEN_CACHE_TTL
+        seconds, so the ttl is kept short: a few seconds still absorb the bursts of requests
+        a page load makes.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = tokenCache.get(key)
+        if cached is not None:
+            # every request gets its own copies, nothing is shared between threads
+            return pickle.loads(cached)
+
+        user, token = super(CachedTokenAuthentication, self).authenticate_credentials(key)
+        tokenCache.set(key, pickle.dumps((user, token), pickle.HIGHEST_PROTOCOL))
+        return (user, token)
+
+
+def evict_token(sender, instance, **kwargs):
+    """
+        Signal receiver for Token post_save/post_delete
+    """
+    tokenCache.delete(instance.key)
+
+# User fields the cached lookups depend on: whether the user may authenticate, and the
+# staff flags the views and the profiler check
+AUTH_USER_FIELDS = frozenset(['is_active', 'password', 'is_staff', 'is_superuser'])
+
+def evict_user_tokens(sender, instance, update_fields=None, **kwargs):
+    """
+        Signal receiver for User post_save, saves of other fields only (e.g. the last_login
+        update of every django login) cost nothing
+    """
+    if update_fields is not None and not AUTH_USER_FIELDS.intersection(update_fields):
+        return
+    for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+        tokenCache.delete(key)
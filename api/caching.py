@@ -0,0 +1,181 @@
+"""
+    caching.py: caches used by the api views
+"""
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+
+class TTLCache(object):
+    """
+        Thread safe LRU cache whose entries also expire after `ttl` seconds
+        :param maxsize: int --> entries kept before the least recently used one is evicted
+        :param ttl: seconds an entry stays valid
+
+        Entries can be stored with a cost (e.g. the seconds it took to compute them), which
+        is added to `saved` every time the entry is served from the cache
+    """
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved = 0.0
+
+    def get(self, key):
+        """
+            :return the cached value or None if missing or expired
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved += entry[2]
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, cost=0.0):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value, cost)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+            Returns a copy of the counters
+            hit_ratio --> hits / lookups, None before the first lookup
+            saved --> total cost of the entries served from the cache
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': float(self.hits) / lookups if lookups else None,
+                'saved': self.saved,
+            }
+
+
+def content_hash(data, *versions):
+    """
+        Hashes json-able data in a normalized form (sorted keys, no whitespace), so equal
+        inputs hash the same however they were written
+        :param versions: strings mixed into the hash, e.g. catalog version stamps
+
+        :return hex sha256 digest
+    """
+    digest = hashlib.sha256()
+    for version in versions:
+        digest.update(str(version).encode('utf-8'))
+        digest.update(b'\0')
+    digest.update(json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class UserQuoteCache(object):
+    """
+        Per user quotes kept in the django cache `alias`, which every worker must share
+        (see SHARED_CACHE in jetson/settings.py)
+
+        Every user has an answers version stamp that is deleted whenever their answers are
+        written (invalidate) and replaced by a new one on the next read. Quotes are stored
+        together with the answers and catalog versions they were computed from and are only
+        served while all of them are still current, so a catalog reload or an answer write
+        makes the old entry unreachable in every worker.
+
+        Cost per read, besides the catalog stamps (one get_many per request, see
+        app/scripts/catalog.py): a get_many of the answers stamp and the entry, and on a miss
+        a set of the entry (plus one of the stamp after an answer write). An answer write
+        costs a delete. With the default file backend a get_many reads one small file per key
+        and no SQL is run; FileBasedCache lists its directory on every set to cull it, so
+        misses get slower as the directory approaches MAX_ENTRIES. With the database backend
+        every get_many is a query and every set several statements.
+    """
+    def __init__(self, alias='quotes'):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _keys(self, user_id):
+        return 'quotes.answers.%d' % user_id, 'quotes.user.%d' % user_id
+
+    def invalidate(self, user_id):
+        """
+            Call after any write to the answers of user_id
+        """
+        self.cache.delete(self._keys(user_id)[0])
+
+    def get_quotes(self, user_id, insurance_types, compute, catalog_versions=()):
+        """
+            Returns the quotes of a user, computing only the ones that are not cached
+            :param insurance_types: [ string ] --> e.g. ['LIFE', 'HEALTH', 'DISABILITY']
+            :param compute: callable([ string ]) -> { insurance_type: quote }
+            :param catalog_versions: version stamps the quotes depend on besides the answers
+
+            :return { insurance_type: quote }
+        """
+        answers_key, entry_key = self._keys(user_id)
+        found = self.cache.get_many([answers_key, entry_key])
+
+        answers_version = found.get(answers_key)
+        if answers_version is None:
+            # racing readers may each set one, the entries of all but the last are just misses
+            answers_version = uuid.uuid4().hex
+            self.cache.set(answers_key, answers_version)
+        versions = (answers_version,) + tuple(catalog_versions)
+
+        quotes = {}
+        entry = found.get(entry_key)
+        if entry is not None and entry[0] == versions:
+            quotes = entry[1]
+
+        missing = [insurance_type for insurance_type in insurance_types if insurance_type not in quotes]
+        if not missing:
+            self.hits += 1
+        else:
+            self.misses += 1
+            quotes.update(compute(missing))
+            # stamped with the versions read before computing, a concurrent write wins
+            self.cache.set(entry_key, (versions, quotes))
+
+        return dict((insurance_type, quotes[insurance_type]) for insurance_type in insurance_types)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'alias': self.alias,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': float(self.hits) / lookups if lookups else None,
+        }
@@ -1,13 +1,23 @@
 """
   formatting.py: a helpful module for formatting numbers for display
+
+  The dollar formatters are memoized (MEMO_SIZE entries each): the quote paths format
+  catalog values such as deductible and policy_amount, which come from a small set.
+  nums_to_usd, abbrev_nums and abbrev_nums_to_usd format whole lists or numpy arrays,
+  formatting every distinct value once.
 """
 
+import functools
+
 # helpful constants
 THOUSAND          = 1000
 HUNDRED_THOUSAND  = 100000
 ONE_MILLION       = 1000000
 TEN_MILLION       = 10000000
 
+# distinct values remembered per formatter
+MEMO_SIZE         = 1024
+
 def num_to_string(num):
   """
     num_to_string returns string representation of number
@@ -36,6 +46,10 @@ def num_to_usd(num):
     : param num: the number to convert
     : return --> correctly formatted usd string
   """
+  return _num_to_usd(num)
+
+@functools.lru_cache(maxsize=MEMO_SIZE, typed=True)
+def _num_to_usd(num):
   temp = num_to_decimal(num, 2)
   if temp[-2] + temp[-1] == '00':
     return '$' + temp[:-3]
@@ -62,6 +76,10 @@ def abbrev_num(num):
       Everything else
 
   """
+  return _abbrev_num(num)
+
+@functools.lru_cache(maxsize=MEMO_SIZE, typed=True)
+def _abbrev_num(num):
   # only abbreviate numbers greater than 100K
   if num < HUNDRED_THOUSAND:
     return num_to_usd(num)
@@ -94,7 +112,46 @@ def abbrev_num_to_usd(num):
     : param num: the number to convert
     : return --> correctly formatted usd string
   """
+  return _abbrev_num_to_usd(num)
+
+@functools.lru_cache(maxsize=MEMO_SIZE, typed=True)
+def _abbrev_num_to_usd(num):
   if num < HUNDRED_THOUSAND:
     return abbrev_num(num)
   else:
-    return '$' + abbrev_num(num)
\ No newline at end of file
+    return '$' + abbrev_num(num)
+
+def format_all(formatter, nums):
+  """
+    format_all: formats every number of a list, formatting each distinct value once
+    : param formatter: one of the scalar formatters above
+    : param nums: list of int / float or numpy array
+    : return --> list of strings, in the order of nums
+  """
+  if hasattr(nums, 'tolist'):
+    # numpy scalars are not int or float, the formatters want python numbers
+    nums = nums.tolist()
+  # equal numbers (1 and 1.0) format the same, so one entry per distinct value
+  formatted = dict((num, formatter(num)) for num in set(nums))
+  return [formatted[num] for num in nums]
+
+def nums_to_usd(nums):
+  """
+    nums_to_usd: num_to_usd of every number of a list or numpy array
+    : return --> list of usd strings
+  """
+  return format_all(num_to_usd, nums)
+
+def abbrev_nums(nums):
+  """
+    abbrev_nums: abbrev_num of every number of a list or numpy array
+    : return --> list of abbreviated strings
+  """
+  return format_all(abbrev_num, nums)
+
+def abbrev_nums_to_usd(nums):
+  """
+    abbrev_nums_to_usd: abbrev_num_to_usd of every number of a list or numpy array
+    : return --> list of abbreviated usd strings
+  """
+  return format_all(abbrev_num_to_usd, nums)
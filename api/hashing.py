@@ -0,0 +1,87 @@
+"""
+    hashing.py: runs password hashing (PBKDF2) on a small dedicated thread pool
+
+    hashlib releases the GIL while it hashes, so the pool caps how many cores password
+    hashing can take from the rest of the worker, and a full pool turns a login storm into
+    fast 503s instead of slow quote endpoints. The pool sits in the password hasher (see
+    PASSWORD_HASHERS in jetson/settings.py), so signup, login through
+    django.contrib.auth.authenticate (signals and AUTHENTICATION_BACKENDS included) and the
+    admin all use it. Only the hashing runs on the pool, the database work stays on the
+    request thread.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class PoolFull(Exception):
+    """
+        Raised when a BoundedExecutor already has as many jobs as it accepts
+    """
+    pass
+
+
+class BoundedExecutor(object):
+    """
+        Thread pool that rejects work instead of queueing it without limit
+        :param workers: int --> threads running jobs
+        :param queue_size: int --> jobs allowed to wait for a thread
+    """
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def executor(self):
+        # started on first use, so importing this module never spawns threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers)
+            return self._executor
+
+    def run(self, func, *args):
+        """
+            Runs func(*args) on the pool and waits for it
+            :return func's result
+            :raise PoolFull when workers + queue_size jobs are already in flight
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PoolFull()
+
+        try:
+            return self.executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.completed += 1
+
+    def stats(self):
+        with self._lock:
+            return {'workers': self.workers, 'queue_size': self.queue_size,
+                'completed': self.completed, 'rejected': self.rejected}
+
+
+passwordPool = BoundedExecutor(getattr(settings, 'PASSWORD_HASHING_WORKERS', 2), getattr(settings, 'PASSWORD_HASHING_QUEUE', 16))
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+        Django's PBKDF2 hasher with the hashing on passwordPool. It keeps the pbkdf2_sha256
+        algorithm name, so stored hashes are unchanged, and replaces PBKDF2PasswordHasher in
+        PASSWORD_HASHERS (hashers are looked up by algorithm name).
+
+        Every make_password and check_password goes through encode, including the dummy hash
+        ModelBackend computes for unknown usernames, so they raise PoolFull when the pool is full.
+    """
+    def encode(self, password, salt, iterations=None):
+        return passwordPool.run(super(PooledPBKDF2PasswordHasher, self).encode, password, salt, iterations)
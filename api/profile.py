@@ -0,0 +1,61 @@
+"""
+    profile.py: loads the stored answers of a user for the quote and info endpoints
+"""
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.functional import cached_property
+
+from app.models import *
+
+
+def _related_or_none(instance, name):
+    try:
+        return getattr(instance, name)
+    except ObjectDoesNotExist:
+        return None
+
+
+class UserProfile(object):
+    """
+        Snapshot of everything stored about a user, loaded at most once per request and
+        shared by the HEALTH, LIFE and DISABILITY helpers
+        :param user: User instance
+
+        Attributes are loaded on first use:
+            general --> user_general_answers or None
+            life --> user_life_answers or None
+            health --> user_health_questions_answer (options joined) or None
+            recommendation --> the stored user_recommendation or None
+                (the four above come from a single joined query)
+            kid_ages --> [int] (1 query)
+    """
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def _answers(self):
+        related = ['user_general_answers', 'user_life_answers', 'user_health_questions_answer', 'user_recommendation']
+        related += ['user_health_questions_answer__' + field for field in HEALTH_ANSWER_FIELDS]
+        return User.objects.select_related(*related).get(pk=self.user.pk)
+
+    @property
+    def general(self):
+        return _related_or_none(self._answers, 'user_general_answers')
+
+    @property
+    def life(self):
+        return _related_or_none(self._answers, 'user_life_answers')
+
+    @property
+    def health(self):
+        return _related_or_none(self._answers, 'user_health_questions_answer')
+
+    @cached_property
+    def recommendation(self):
+        # cached so the quote helpers can swap in the row they just wrote
+        return _related_or_none(self._answers, 'user_recommendation')
+
+    @cached_property
+    def kid_ages(self):
+        return list(user_kids.objects.filter(user_id=self.user).values_list('kid_age', flat=True))
@@ -0,0 +1,182 @@
+"""
+    profiling.py: profiles single requests and writes the profiles to PROFILE_DIR
+
+    ProfilingMiddleware runs the view under a profiler when
+        - a staff user (session or token) sends an X-Profile header, its value picks the
+          profiler: 'deterministic' (cProfile, every call, slower) or 'sampling'; anything
+          else uses PROFILE_MODE
+        - or a random PROFILE_SAMPLE_RATE fraction of all requests, with PROFILE_MODE
+
+    Every profile is written as <time>-<url name>-<request id>.json: the endpoint, method,
+    status, wall and CPU time and either the sampled stacks or the name of the .prof file
+    holding the cProfile dump. The request id is a random uuid returned in the X-Profile-Id
+    header; nothing about the user, the path or the parameters is stored. The
+    collapse_profiles management command merges profiles into a flame graph input.
+
+    Requests that are not profiled cost a header lookup (and a random() call when sampling).
+    The async views and the body of streaming responses are not profiled.
+"""
+
+import cProfile
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.authentication import CachedTokenAuthentication
+from app.scripts.flamegraph import MODES, frame_label
+
+
+class SamplingProfiler(object):
+    """
+        Samples the call stack of the thread that calls start() from a background thread
+        every interval seconds, until stop(). Each sample is weighted with the time since
+        the previous one, so stacks is in microseconds like a collapsed cProfile dump.
+        Frames of the caller of start() and outside it are left out.
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._labels = {}
+
+    def start(self):
+        self._ident = threading.get_ident()
+        # the caller and the frames it is called from
+        self._outer = 0
+        frame = sys._getframe(1)
+        while frame is not None:
+            self._outer += 1
+            frame = frame.f_back
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = frame_label(code.co_filename, code.co_name)
+        return label
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._ident)
+            now = time.perf_counter()
+            labels = []
+            while frame is not None:
+                labels.append(self._label(frame.f_code))
+                frame = frame.f_back
+            labels = labels[::-1][self._outer:]
+            if labels:
+                self.stacks[';'.join(labels)] += (now - last) * 1e6
+                self.samples += 1
+            last = now
+
+
+def is_staff_request(request):
+    """
+        :return True when the session user or the Authorization token is staff
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    try:
+        auth = CachedTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return auth is not None and auth[0].is_staff
+
+
+class ProfilingMiddleware(object):
+    """
+        See the module docstring. Comes last in MIDDLEWARE, so the session user is known
+        and only the view is profiled.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+        self.mode = getattr(settings, 'PROFILE_MODE', 'sampling')
+        self.interval = getattr(settings, 'PROFILE_SAMPLE_INTERVAL', .001)
+        self.directory = settings.PROFILE_DIR
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def requested(self, request):
+        """
+            :return (mode, trigger) of the profile to take, (None, None) for no profile
+        """
+        header = request.META.get('HTTP_X_PROFILE')
+        if header is not None and is_staff_request(request):
+            return (header if header in MODES else self.mode), 'header'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return self.mode, 'sample'
+        return None, None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        mode, trigger = self.requested(request)
+        if mode is None:
+            return None
+
+        request_id = uuid.uuid4().hex
+        profiler = cProfile.Profile() if mode == 'deterministic' else SamplingProfiler(self.interval)
+        started = timezone.now()
+        start, cpu_start = time.perf_counter(), time.process_time()
+        response = None
+        try:
+            if mode == 'deterministic':
+                response = profiler.runcall(view_func, request, *view_args, **view_kwargs)
+            else:
+                profiler.start()
+                try:
+                    response = view_func(request, *view_args, **view_kwargs)
+                finally:
+                    profiler.stop()
+        finally:
+            meta = {
+                'request_id': request_id,
+                'url_name': request.resolver_match.url_name,
+                'method': request.method,
+                'status': response.status_code if response is not None else 500,
+                'mode': mode,
+                'trigger': trigger,
+                'started': started.isoformat(),
+                'wall_ms': round((time.perf_counter() - start) * 1000, 2),
+                # the whole process, other threads included
+                'cpu_ms': round((time.process_time() - cpu_start) * 1000, 2),
+            }
+            self.dump(meta, profiler)
+
+        response['X-Profile-Id'] = request_id
+        return response
+
+    def dump(self, meta, profiler):
+        """
+            Writes the profile and its metadata to PROFILE_DIR
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        name = '%s-%s-%s' % (time.strftime('%Y%m%dT%H%M%S'), meta['url_name'], meta['request_id'])
+        if meta['mode'] == 'deterministic':
+            meta['profile'] = name + '.prof'
+            profiler.dump_stats(os.path.join(self.directory, meta['profile']))
+        else:
+            meta['samples'] = profiler.samples
+            meta['stacks'] = dict((stack, round(weight, 1)) for stack, weight in profiler.stacks.items())
+        with open(os.path.join(self.directory, name + '.json'), 'w') as f:
+            json.dump(meta, f, sort_keys=True)
@@ -0,0 +1,146 @@
+"""
+    renderers.py: response encodings the API negotiates with the Accept header
+
+    JSON stays the default and is written with ujson when it is installed. Clients that
+    send Accept: application/msgpack or application/cbor get the same data in that
+    encoding, when msgpack / cbor2 are installed. The libraries are optional, renderers
+    whose library is missing are never selected.
+
+    The renderers are also DRF renderers (REST_FRAMEWORK in jetson/settings.py), so DRF's
+    own responses (401, 403) come in the negotiated encoding too.
+"""
+
+import json
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer
+
+from api import timing
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+def encode_default(value):
+    # dates, decimals, uuids... the way JsonResponse encodes them
+    return DjangoJSONEncoder().default(value)
+
+
+class JSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+    available = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if ujson is not None:
+            try:
+                return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+            except TypeError:
+                # something only DjangoJSONEncoder knows how to encode
+                pass
+        return json.dumps(data, cls=DjangoJSONEncoder).encode('utf-8')
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    available = msgpack is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return msgpack.packb(data, use_bin_type=True, default=encode_default)
+
+
+class CBORRenderer(BaseRenderer):
+    media_type = 'application/cbor'
+    format = 'cbor'
+    charset = None
+    available = cbor2 is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return cbor2.dumps(data, default=lambda encoder, value: encoder.encode(encode_default(value)))
+
+
+RENDERERS = [JSONRenderer(), MessagePackRenderer(), CBORRenderer()]
+
+
+def parse_accept(accept):
+    """
+        :return [ media range ] of an Accept header, highest q first (header order on ties),
+            without the ranges the client refuses (q=0)
+    """
+    ranges = []
+    for position, item in enumerate(accept.split(',')):
+        params = item.split(';')
+        media_range = params[0].strip().lower()
+        quality = 1.0
+        for param in params[1:]:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_range and quality > 0:
+            ranges.append((-quality, position, media_range))
+    return [media_range for quality, position, media_range in sorted(ranges)]
+
+
+def negotiate(accept, renderers=RENDERERS):
+    """
+        :param accept: Accept header value
+        :param renderers: [ renderer ], the first available one is the default
+        :return the available renderer the client prefers, the default when it accepts none
+            of them (the API never answers 406)
+    """
+    renderers = [renderer for renderer in renderers if getattr(renderer, 'available', True)]
+    for media_range in parse_accept(accept or ''):
+        for renderer in renderers:
+            if media_range in (renderer.media_type, renderer.media_type.split('/')[0] + '/*'):
+                return renderer
+        if media_range == '*/*':
+            break
+    return renderers[0]
+
+
+class AcceptNegotiation(DefaultContentNegotiation):
+    """
+        DRF content negotiation with negotiate() (parsers are still selected by DRF)
+    """
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderer = negotiate(request.META.get('HTTP_ACCEPT'), renderers)
+        return (renderer, renderer.media_type)
+
+
+def render_response(request, data, status=200):
+    """
+        The JsonResponse replacement of the API views
+        :param request: HttpRequest or DRF Request (which already negotiated a renderer)
+        :return HttpResponse with data in the encoding the client asked for
+    """
+    renderer = getattr(request, 'accepted_renderer', None) or negotiate(request.META.get('HTTP_ACCEPT'))
+    start = time.perf_counter()
+    content = renderer.render(data)
+    request_timing = timing.current()
+    if request_timing is not None:
+        request_timing.durations['serialization'] += time.perf_counter() - start
+    response = HttpResponse(content, content_type=renderer.media_type, status=status)
+    patch_vary_headers(response, ['Accept'])
+    return response
@@ -1,3 +1,869 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
 
-# Create your tests here.
+import asyncio
+
+from django.conf import settings
+from django.test import Client, TestCase, TransactionTestCase
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth.models import update_last_login
+from django.contrib.auth.signals import user_login_failed
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+
+from app.models import *
+from app.scripts import catalog
+from app.scripts import recommendations
+from api import views
+from api.authentication import tokenCache
+from api.caching import UserQuoteCache
+from api.profile import UserProfile
+from api.hashing import PoolFull, passwordPool
+from api.async_views import AsyncApiApplication
+from api import renderers
+from api import formatting
+
+CATALOG_FIXTURES = ['health_questions', 'health_question_options', 'health_plan_costs', 'life_plan_costs', 'disability_plan_costs']
+
+HEALTH_ANSWERS = {
+    'q_1': 'No',
+    'q_2': 'No',
+    'q_5': 'Might go',
+    'q_6': 'Never or just for my annual physical',
+    'q_7': "Drink some tea, it'll pass",
+    'q_8': 'Find out cost before booking appt',
+    'q_9': 'It crosses my mind sometimes.',
+    'q_10': 'It crosses my mind sometimes.',
+    'q_11': 'Convenient time with any doctor',
+    'q_12': 'If my doc says so'
+}
+
+# a generateInsuranceQuotes input, with the answers of the APITestCase user
+USER_DATA = {
+    'GENERAL': {'age': 31, 'zipcode': '14850', 'marital_status': 'married', 'health_condition': 'good', 'annual_income': '85000',
+        'spouse_annual_income': '0', 'spouse_age': 30, 'num_kids': '2', 'kid_ages': [3, 6], 'gender': 'female'},
+    'HEALTH': HEALTH_ANSWERS,
+    'LIFE': {'mortgage_balance': 20000, 'other_debts_balance': 500, 'existing_life_insurance': 100, 'balance_investings_savings': 1000}
+}
+
+
+class APITestMixin(object):
+    """
+        Signs up a user with a full set of answers and warms the catalogs, so query counts
+        only measure the endpoint itself
+    """
+    fixtures = CATALOG_FIXTURES
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='test@jetson.com', email='test@jetson.com', password='jetson-test-pw')
+        self.auth = {'HTTP_AUTHORIZATION': 'Token ' + Token.objects.create(user=self.user).key}
+
+        user_general_answers.objects.create(user_id=self.user, age=31, zipcode=14850, marital_status='married',
+            num_kids=2, annual_income=85000, gender='female')
+        user_life_answers.objects.create(user_id=self.user, mortgage_balance=20000, other_debts_balance=500,
+            existing_life_insurance=100, balance_investings_savings=1000)
+        for age in [3, 6]:
+            user_kids.objects.create(user_id=self.user, kid_age=age, will_pay_for_college='yes')
+
+        health = user_health_questions_answer(user_id=self.user)
+        for field, answer in HEALTH_ANSWERS.items():
+            setattr(health, field, catalog.health_option(int(field[2:]), answer))
+        health.save()
+
+        catalog.get_catalog()
+        catalog.health_denominators()
+        # test users reuse ids, don't let them see each other's quotes
+        caches['quotes'].clear()
+        tokenCache.clear()
+
+    def get(self, name, data=None):
+        res = self.client.get(reverse(name), data or {}, **self.auth)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.json()['success'])
+        return res.json()['data']
+
+
+class APITestCase(APITestMixin, TestCase):
+    pass
+
+
+class QueryBudgetTest(APITestCase):
+    """
+        Pins the number of queries each read endpoint is allowed to make, once the token
+        lookup is cached. The catalog version stamps and the quotes cache are in the default
+        file based shared caches, which cost no queries.
+    """
+
+    def setUp(self):
+        super(QueryBudgetTest, self).setUp()
+        # store the user's recommendation, after that quote reads are read only
+        self.get('getAllInsuranceQuotes')
+        caches['quotes'].clear()
+
+    def test_health_quote(self):
+        # the profile
+        with self.assertNumQueries(1):
+            data = self.get('getInsuranceQuote', {'insuranceType': 'HEALTH'})
+        self.assertEqual(data['has_spouse'], True)
+
+    def test_warm_quote_helper(self):
+        profile = UserProfile(self.user)
+        expected = dict((insurance_type, views.getQuoteHelper(self.user, insurance_type, profile))
+            for insurance_type in ['HEALTH', 'LIFE', 'DISABILITY'])
+        # loaded profile, warm catalogs and an unchanged recommendation: no SQL at all,
+        # the catalog version stamps included
+        with self.assertNumQueries(0):
+            for insurance_type, quote in expected.items():
+                self.assertEqual(views.getQuoteHelper(self.user, insurance_type, profile), quote)
+
+    def test_health_info(self):
+        with self.assertNumQueries(1):
+            data = self.get('getInsuranceInfo', {'insuranceType': 'HEALTH'})
+        self.assertEqual(data, HEALTH_ANSWERS)
+
+    def test_all_insurance_info(self):
+        with self.assertNumQueries(1):
+            data = self.get('getAllInsuranceInfo')
+        self.assertEqual(data['HEALTH'], HEALTH_ANSWERS)
+        self.assertEqual(data['DISABILITY'], {'annual_income': 85000})
+
+    def test_all_insurance_quotes(self):
+        # the profile and the kids
+        with self.assertNumQueries(2):
+            data = self.get('getAllInsuranceQuotes')
+        self.assertEqual(set(data), set(['LIFE', 'HEALTH', 'DISABILITY']))
+
+
+class CatalogQuoteTest(APITestCase):
+    """
+        Quotes come from the cached plan catalog and health denominators, and follow any
+        edit of a plan or a question
+    """
+
+    def quote(self):
+        return self.get('getInsuranceQuote', {'insuranceType': 'HEALTH'})
+
+    def test_plan_edit(self):
+        quote = self.quote()
+        plan = health_plan_costs.objects.get(pk=quote['health_plan_id'])
+        plan.monthly_premium += 100
+        plan.save()
+        self.assertEqual(self.quote()['monthly_premium'], quote['monthly_premium'] + 100)
+
+    def test_question_edit(self):
+        self.assertEqual(self.quote()['deductible_level'], 'High')
+        # far more high deductible points on offer, the same answers now score low on it
+        for question in health_questions.objects.all():
+            question.high_deductible_total *= 100
+            question.save()
+        self.assertEqual(self.quote()['deductible_level'], 'Low')
+
+    def test_hits_and_misses(self):
+        before = catalog.catalog_stats()
+        self.quote()
+        after = catalog.catalog_stats()
+        self.assertEqual(after['hits'], before['hits'] + 1)
+        self.assertEqual((after['misses'], after['reloads'], after['question_reloads']),
+            (before['misses'], before['reloads'], before['question_reloads']))
+
+        self.assertIsNone(catalog.health_plan('HMO', 'High', True, 99))
+        self.assertEqual(catalog.catalog_stats()['misses'], after['misses'] + 1)
+
+        # a question edit only rebuilds the scoring tables
+        question = health_questions.objects.first()
+        question.save()
+        self.quote()
+        stats = catalog.catalog_stats()
+        self.assertEqual((stats['reloads'], stats['question_reloads']), (after['reloads'], after['question_reloads'] + 1))
+
+
+class HealthAnswerFormatTest(APITestCase):
+    """
+        Health answers can be sent as the option text or as the option's position within
+        its question, both resolve through the in-memory option index
+    """
+
+    def positions(self, answers):
+        return dict((field, [option.option for option in catalog.questions.get().positions[int(field[2:])]].index(answer))
+            for field, answer in answers.items())
+
+    def test_integer_answers_round_trip(self):
+        by_text = self.client.get(reverse('generateInsuranceQuotes'), {'userData': json.dumps(USER_DATA)}).json()['data']
+        user_data = dict(USER_DATA, HEALTH=self.positions(HEALTH_ANSWERS))
+        by_position = self.client.get(reverse('generateInsuranceQuotes'), {'userData': json.dumps(user_data)}).json()['data']
+        self.assertEqual(by_position, by_text)
+
+        health_answer = self.positions({'q_1': 'Yes'})
+        res = self.client.post(reverse('updateInsuranceInfo'), {'insuranceType': 'HEALTH',
+            'insuranceData': json.dumps(dict(self.positions(HEALTH_ANSWERS), **health_answer))}, **self.auth)
+        self.assertTrue(res.json()['success'])
+        self.assertEqual(self.get('getInsuranceInfo', {'insuranceType': 'HEALTH'}), dict(HEALTH_ANSWERS, q_1='Yes'))
+
+    def test_out_of_range_position(self):
+        with self.assertRaises(health_question_options.DoesNotExist):
+            catalog.health_option(1, 99)
+
+    def test_option_edit(self):
+        option = health_question_options.objects.get(pk=catalog.health_option(1, 'Yes').pk)
+        option.option = 'Yes, often'
+        option.save()
+        self.assertEqual(catalog.health_option(1, 'Yes, often').pk, option.pk)
+        with self.assertRaises(health_question_options.DoesNotExist):
+            catalog.health_option(1, 'Yes')
+
+
+class UpdateUserInfoTest(APITestCase):
+    """
+        updateUserInfo writes the answers and the diffed kids in one transaction
+    """
+    user_data = {'age': 31, 'zipcode': 14850, 'marital_status': 'married', 'health_condition': 'good', 'annual_income': 85000,
+        'spouse_annual_income': 0, 'spouse_age': 30, 'num_kids': 3, 'gender': 'female'}
+
+    def update(self, kid_ages):
+        res = self.client.post(reverse('updateUserInfo'), {'userData': json.dumps(dict(self.user_data, kid_ages=kid_ages))}, **self.auth)
+        self.assertTrue(res.json()['success'])
+
+    def kid_ages(self):
+        return sorted(user_kids.objects.filter(user_id=self.user).values_list('kid_age', flat=True))
+
+    def test_query_count(self):
+        # token, savepoint, answers, read kids, update 6 -> 9, insert 12 and 14, release
+        with self.assertNumQueries(7):
+            self.update([3, 9, 12, 14])
+        self.assertEqual(self.kid_ages(), [3, 9, 12, 14])
+
+        # unchanged kids cost no writes, the token lookup is cached now
+        with self.assertNumQueries(4):
+            self.update(['14', 3, 12, 9])
+        self.assertEqual(self.kid_ages(), [3, 9, 12, 14])
+
+    def test_kids_are_diffed(self):
+        kept = user_kids.objects.get(user_id=self.user, kid_age=6).kid
+        self.update([6, 8])
+        self.assertEqual(self.kid_ages(), [6, 8])
+        self.assertTrue(user_kids.objects.filter(kid=kept, kid_age=6).exists())
+
+        self.update([])
+        self.assertEqual(self.kid_ages(), [])
+
+
+class UpdateInsuranceInfoTest(APITestCase):
+    """
+        updateInsuranceInfo writes an answer set with a constant number of statements
+    """
+
+    def update(self, insurance_type, data):
+        res = self.client.post(reverse('updateInsuranceInfo'),
+            {'insuranceType': insurance_type, 'insuranceData': json.dumps(data)}, **self.auth)
+        return res.json()
+
+    def test_health_query_count(self):
+        # token, savepoint, update, release
+        with self.assertNumQueries(4):
+            self.assertTrue(self.update('HEALTH', dict(HEALTH_ANSWERS, q_1='Yes'))['success'])
+        self.assertEqual(self.get('getInsuranceInfo', {'insuranceType': 'HEALTH'})['q_1'], 'Yes')
+
+        with self.assertNumQueries(3):
+            self.assertTrue(self.update('HEALTH', {'q_2': 'Yes'})['success'])
+        data = self.get('getInsuranceInfo', {'insuranceType': 'HEALTH'})
+        self.assertEqual((data['q_1'], data['q_2']), ('', 'Yes'))
+
+    def test_users_share_answers(self):
+        other = User.objects.create_user(username='other@jetson.com', password='jetson-test-pw')
+        self.auth = {'HTTP_AUTHORIZATION': 'Token ' + Token.objects.create(user=other).key}
+        self.assertTrue(self.update('HEALTH', HEALTH_ANSWERS)['success'])
+        self.assertEqual(self.get('getInsuranceInfo', {'insuranceType': 'HEALTH'}), HEALTH_ANSWERS)
+
+    def test_invalid_answer(self):
+        res = self.update('HEALTH', dict(HEALTH_ANSWERS, q_1='Yes', q_5='Maybe'))
+        self.assertEqual((res['success'], res['error']), (False, 'invalid answer for q_5'))
+        self.assertEqual(self.get('getInsuranceInfo', {'insuranceType': 'HEALTH'})['q_1'], 'No')
+
+        res = self.update('HEALTH', {'q_3': 'No'})
+        self.assertEqual((res['success'], res['error']), (False, 'invalid health question q_3'))
+
+    def test_life(self):
+        with self.assertNumQueries(4):
+            self.assertTrue(self.update('LIFE', {'mortgage_balance': 1000, 'other_debts_balance': ''})['success'])
+        self.assertEqual(self.get('getInsuranceInfo', {'insuranceType': 'LIFE'}), {'mortgage_balance': 1000,
+            'other_debts_balance': 0, 'existing_life_insurance': 0, 'balance_investings_savings': 0})
+
+
+class CachedTokenAuthenticationTest(APITestCase):
+    """
+        Token lookups are cached until the token or its user changes
+    """
+
+    def test_cached_lookup(self):
+        self.get('getInsuranceInfo', {'insuranceType': 'LIFE'})
+        hits = tokenCache.hits
+        with self.assertNumQueries(1):
+            self.get('getInsuranceInfo', {'insuranceType': 'LIFE'})
+        self.assertEqual(tokenCache.hits, hits + 1)
+
+    def test_deactivated_user(self):
+        self.get('getInsuranceInfo', {'insuranceType': 'LIFE'})
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(reverse('getInsuranceInfo'), {'insuranceType': 'LIFE'}, **self.auth)
+        self.assertEqual(res.status_code, 401)
+
+    def test_last_login_keeps_the_cache(self):
+        self.get('getInsuranceInfo', {'insuranceType': 'LIFE'})
+        # the update only, no token lookup to evict anything
+        with self.assertNumQueries(1):
+            update_last_login(None, self.user)
+        with self.assertNumQueries(1):
+            self.get('getInsuranceInfo', {'insuranceType': 'LIFE'})
+
+        # saving an auth field still evicts
+        with self.assertNumQueries(2):
+            self.user.save(update_fields=['is_staff'])
+
+    def test_logout(self):
+        self.get('getInsuranceInfo', {'insuranceType': 'LIFE'})
+        res = self.client.post(reverse('logout'), **self.auth)
+        self.assertTrue(res.json()['success'])
+
+        res = self.client.get(reverse('getInsuranceInfo'), {'insuranceType': 'LIFE'}, **self.auth)
+        self.assertEqual(res.status_code, 401)
+
+        res = self.client.post(reverse('signIn'), {'username': 'test@jetson.com', 'password': 'jetson-test-pw'})
+        self.assertNotEqual('Token ' + res.json()['token'], self.auth['HTTP_AUTHORIZATION'])
+
+    def test_revoked_elsewhere(self):
+        self.get('getInsuranceInfo', {'insuranceType': 'LIFE'})
+        # deleted by another worker: no signal reaches this one
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM authtoken_token WHERE user_id = %s', [self.user.id])
+
+        now = time.time()
+        with mock.patch('api.caching.time.time', return_value=now + settings.AUTH_TOKEN_CACHE_TTL - 1):
+            res = self.client.get(reverse('getInsuranceInfo'), {'insuranceType': 'LIFE'}, **self.auth)
+            self.assertEqual(res.status_code, 200)
+        with mock.patch('api.caching.time.time', return_value=now + settings.AUTH_TOKEN_CACHE_TTL + 1):
+            res = self.client.get(reverse('getInsuranceInfo'), {'insuranceType': 'LIFE'}, **self.auth)
+            self.assertEqual(res.status_code, 401)
+
+
+class SignupLoginTest(TestCase):
+    """
+        signup and login hash passwords on the bounded pool and shed load when it is full
+    """
+    signup_data = {'firstName': 'Test', 'lastName': 'User', 'email': 'new@jetson.com', 'password': 'jetson-test-pw'}
+
+    def test_signup_and_login(self):
+        token = self.client.post(reverse('signup'), self.signup_data).json()['token']
+        self.assertTrue(User.objects.get(username='new@jetson.com').check_password('jetson-test-pw'))
+
+        res = self.client.post(reverse('signIn'), {'username': 'new@jetson.com', 'password': 'jetson-test-pw'}).json()
+        self.assertEqual((res['success'], res['token']), (True, token))
+        res = self.client.post(reverse('signIn'), {'username': 'new@jetson.com', 'password': 'wrong'}).json()
+        self.assertFalse(res['success'])
+        res = self.client.post(reverse('signIn'), {'username': 'nobody@jetson.com', 'password': 'wrong'}).json()
+        self.assertFalse(res['success'])
+
+    def test_pool_full(self):
+        with mock.patch.object(passwordPool, 'run', side_effect=PoolFull):
+            res = self.client.post(reverse('signup'), self.signup_data)
+            self.assertEqual(res.status_code, 503)
+            self.assertEqual(res['Retry-After'], '1')
+            self.assertFalse(User.objects.filter(username='new@jetson.com').exists())
+
+            res = self.client.post(reverse('signIn'), {'username': 'new@jetson.com', 'password': 'jetson-test-pw'})
+            self.assertEqual(res.status_code, 503)
+
+    def test_login_uses_auth_backends(self):
+        self.client.post(reverse('signup'), self.signup_data)
+        User.objects.filter(username='new@jetson.com').update(is_active=False)
+        completed = passwordPool.completed
+
+        failed = mock.Mock()
+        user_login_failed.connect(failed)
+        self.addCleanup(user_login_failed.disconnect, failed)
+        res = self.client.post(reverse('signIn'), {'username': 'new@jetson.com', 'password': 'jetson-test-pw'}).json()
+        self.assertFalse(res['success'])
+        self.assertEqual(failed.call_count, 1)
+        self.assertEqual(passwordPool.completed, completed + 1)
+
+        with self.settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.AllowAllUsersModelBackend']):
+            res = self.client.post(reverse('signIn'), {'username': 'new@jetson.com', 'password': 'jetson-test-pw'}).json()
+        self.assertTrue(res['success'])
+
+
+class AsyncViewsTest(APITestMixin, TransactionTestCase):
+    """
+        The async views answer exactly like the WSGI views (TransactionTestCase, the async
+        views query from other threads)
+    """
+    requests = [
+        ('getUserInfo', {}),
+        ('getInsuranceInfo', {'insuranceType': 'HEALTH'}),
+        ('getInsuranceInfo', {'insuranceType': 'PET'}),
+        ('getAllInsuranceInfo', {}),
+        ('getInsuranceQuote', {'insuranceType': 'LIFE'}),
+        ('getAllInsuranceQuotes', {}),
+        ('getAllInsuranceQuotes', {}),
+        ('generateInsuranceQuotes', {'userData': json.dumps(USER_DATA)}),
+    ]
+
+    def asgi(self, method, path, query='', headers=None):
+        """
+            :return status, headers, body of one request through the ASGI app
+        """
+        messages = []
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        async def send(message):
+            messages.append(message)
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(), 'root_path': '',
+            'headers': [(name.encode(), value.encode()) for name, value in (headers or {}).items()],
+            'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234)}
+
+        async def fallback(scope, receive, send):
+            await send({'type': 'http.response.start', 'status': 599, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(AsyncApiApplication(fallback)(scope, receive, send))
+        finally:
+            loop.close()
+        return messages[0]['status'], dict(messages[0]['headers']), messages[1]['body']
+
+    def test_same_responses(self):
+        from urllib.parse import urlencode
+        for name, data in self.requests:
+            expected = self.client.get(reverse(name), data, **self.auth)
+            status, headers, body = self.asgi('GET', reverse(name), urlencode(data), {'Authorization': self.auth['HTTP_AUTHORIZATION']})
+            self.assertEqual((status, json.loads(body.decode())), (expected.status_code, expected.json()), name)
+            # the headers of the security middleware
+            for header in ['X-Frame-Options', 'X-Content-Type-Options', 'Referrer-Policy', 'Cross-Origin-Opener-Policy']:
+                self.assertEqual(headers.get(header.encode()), expected[header].encode() if expected.has_header(header) else None, header)
+        self.assertIn(b'X-Frame-Options', headers)
+
+    def test_unauthenticated(self):
+        expected = self.client.get(reverse('getUserInfo'), HTTP_AUTHORIZATION='Token nope')
+        status, headers, body = self.asgi('GET', reverse('getUserInfo'), headers={'Authorization': 'Token nope'})
+        self.assertEqual((status, body), (expected.status_code, expected.content))
+        self.assertEqual(self.asgi('GET', reverse('getUserInfo'))[0], 401)
+
+    def test_fallback(self):
+        self.assertEqual(self.asgi('POST', reverse('getUserInfo'))[0], 599)
+        self.assertEqual(self.asgi('GET', reverse('getMetrics'))[0], 599)
+
+
+class BatchTest(APITestCase):
+    """
+        /api/batch answers like the endpoints it stands in for, with one authentication and
+        one profile load
+    """
+
+    def batch(self, operations):
+        res = self.client.post(reverse('batch'), {'operations': json.dumps(operations)}, **self.auth)
+        self.assertTrue(res.json()['success'])
+        return res.json()['data']
+
+    def test_first_paint(self):
+        expected = dict((name, self.client.get(reverse(name), **self.auth).json())
+            for name in ['getUserInfo', 'getAllInsuranceInfo', 'getAllInsuranceQuotes'])
+        caches['quotes'].clear()
+        tokenCache.clear()
+
+        # token, profile, kids
+        with self.assertNumQueries(3):
+            data = self.batch(['getUserInfo', 'getAllInsuranceInfo', 'getAllInsuranceQuotes'])
+        self.assertEqual(data, expected)
+
+    def test_params_and_errors(self):
+        data = self.batch([{'op': 'getInsuranceQuote', 'params': {'insuranceType': 'LIFE'}, 'key': 'life'},
+            {'op': 'getInsuranceInfo', 'params': {'insuranceType': 'PET'}}, 'deleteEverything'])
+
+        self.assertEqual(data['life'], self.client.get(reverse('getInsuranceQuote'), {'insuranceType': 'LIFE'}, **self.auth).json())
+        self.assertEqual(data['getInsuranceInfo'], {'success': False, 'error': 'invalid insurance type', 'data': None})
+        self.assertEqual(data['deleteEverything'], {'success': False, 'error': 'unknown operation deleteEverything', 'data': None})
+
+    def test_failed_operation_keeps_the_others(self):
+        user_general_answers.objects.filter(user_id=self.user).delete()
+        data = self.batch(['getAllInsuranceInfo', 'getAllInsuranceQuotes'])
+        self.assertTrue(data['getAllInsuranceInfo']['success'])
+        self.assertEqual(data['getAllInsuranceQuotes'], {'success': False, 'error': 'invalid answers', 'data': None})
+
+    def test_malformed_operations(self):
+        self.get('getUserInfo')
+        for operations, error in [
+                ('[getUserInfo', 'operations must be valid JSON'),
+                ('{"op": "getUserInfo"}', 'operations must be a list'),
+                ('[3]', 'every operation must be a name or an object with an op name'),
+                ('[{"params": {}}]', 'every operation must be a name or an object with an op name'),
+                ('[{"op": "getInsuranceQuote", "params": ["LIFE"]}]', 'params of getInsuranceQuote must be an object'),
+                ('[{"op": "getUserInfo", "key": ["user"]}]', 'key of getUserInfo must be a string'),
+                ('["getUserInfo", {"op": "getInsuranceQuote", "key": "getUserInfo"}]', 'duplicate key getUserInfo')]:
+            # cached token, rejected before the profile is loaded
+            with self.assertNumQueries(0):
+                res = self.client.post(reverse('batch'), {'operations': operations}, **self.auth)
+            self.assertEqual(res.status_code, 400)
+            self.assertEqual(res.json(), {'success': False, 'error': error, 'data': None})
+
+
+class RecommendationWriteTest(APITestCase):
+    """
+        Quote reads only write user_recommendation when the recommended plans change
+    """
+
+    def test_both_lines_are_kept(self):
+        data = self.get('getAllInsuranceQuotes')
+        rec = user_recommendation.objects.get(user_id=self.user)
+        self.assertEqual((rec.health_plan_id_id, rec.life_plan_id_id), (data['HEALTH']['health_plan_id'], data['LIFE']['life_plan_id']))
+
+        caches['quotes'].clear()
+        self.get('getInsuranceQuote', {'insuranceType': 'HEALTH'})
+        rec.refresh_from_db()
+        self.assertEqual(rec.life_plan_id_id, data['LIFE']['life_plan_id'])
+
+    def test_write_behind(self):
+        with self.settings(RECOMMENDATION_WRITE_BEHIND=True):
+            with self.assertNumQueries(3):
+                data = self.get('getAllInsuranceQuotes')
+        self.assertFalse(user_recommendation.objects.filter(user_id=self.user).exists())
+
+        self.assertEqual(recommendations.buffer.flush(), 1)
+        rec = user_recommendation.objects.get(user_id=self.user)
+        self.assertEqual((rec.health_plan_id_id, rec.life_plan_id_id), (data['HEALTH']['health_plan_id'], data['LIFE']['life_plan_id']))
+
+    def test_timer_flush(self):
+        buffer = recommendations.RecommendationBuffer(100, .05)
+        flushed = threading.Event()
+        with mock.patch('app.scripts.recommendations.apply_changes', side_effect=lambda changes: flushed.set()) as apply:
+            # nothing else is added, the timer writes the change
+            buffer.add(self.user.id, {'life_plan_id_id': 3})
+            self.assertTrue(flushed.wait(5))
+        apply.assert_called_once_with({self.user.id: {'life_plan_id_id': 3}})
+        self.assertEqual(buffer.stats(), {'pending': 0, 'flushes': 1})
+
+
+class GenerateQuotesCacheTest(APITestCase):
+    """
+        generateInsuranceQuotes responses are cached and revalidated by content hash
+    """
+    user_data = USER_DATA
+
+    def setUp(self):
+        super(GenerateQuotesCacheTest, self).setUp()
+        views.quoteCache.clear()
+
+    def generate(self, user_data, **headers):
+        return self.client.get(reverse('generateInsuranceQuotes'), {'userData': json.dumps(user_data)}, **headers)
+
+    def test_repeat_is_served_from_cache(self):
+        first = self.generate(self.user_data)
+        hits = views.quoteCache.hits
+        # same profile with its keys in another order
+        second = self.generate(dict(reversed(list(self.user_data.items()))))
+
+        self.assertEqual(views.quoteCache.hits, hits + 1)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertTrue(first.json()['success'])
+        self.assertIn('max-age', first['Cache-Control'])
+
+    def test_if_none_match(self):
+        etag = self.generate(self.user_data)['ETag']
+        res = self.generate(self.user_data, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_catalog_change_changes_etag(self):
+        etag = self.generate(self.user_data)['ETag']
+        catalog.bump_catalog_version()
+        res = self.generate(self.user_data, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res['ETag'], etag)
+
+
+class BulkInsuranceQuotesTest(APITestCase):
+    """
+        bulkInsuranceQuotes streams one result line per NDJSON record
+    """
+
+    def bulk(self, lines):
+        res = self.client.post(reverse('bulkInsuranceQuotes'), '\n'.join(lines), content_type='application/x-ndjson', **self.auth)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(res.streaming_content).decode().splitlines()]
+
+    def test_matches_generate_insurance_quotes(self):
+        expected = self.client.get(reverse('generateInsuranceQuotes'), {'userData': json.dumps(USER_DATA)}).json()['data']
+        bad_answer = dict(USER_DATA, HEALTH={'q_1': 'Maybe'})
+        lines = [json.dumps(dict(USER_DATA, id='a')), '', 'not json', json.dumps({'GENERAL': {}}),
+            json.dumps(bad_answer), json.dumps(dict(USER_DATA, id='b'))]
+
+        # the token, the catalogs are warm
+        with self.settings(BULK_QUOTES_CHUNK_SIZE=2), self.assertNumQueries(1):
+            results = self.bulk(lines)
+
+        self.assertEqual([result['line'] for result in results], [1, 3, 4, 5, 6])
+        self.assertEqual([result['success'] for result in results], [True, False, False, False, True])
+        self.assertEqual([results[0]['id'], results[4]['id']], ['a', 'b'])
+        self.assertEqual(results[0]['data'], expected)
+        self.assertEqual(results[4]['data'], expected)
+        self.assertEqual(results[1]['error'], 'invalid JSON')
+        self.assertEqual(results[2]['error'], 'missing HEALTH')
+        self.assertIn('health question 1', results[3]['error'])
+
+    def test_requires_token(self):
+        res = self.client.post(reverse('bulkInsuranceQuotes'), json.dumps(USER_DATA), content_type='application/x-ndjson')
+        self.assertEqual(res.status_code, 401)
+
+
+class ExportAnswersTest(APITestCase):
+    """
+        exportAnswers streams the answers of every user, admins only
+    """
+
+    def setUp(self):
+        super(ExportAnswersTest, self).setUp()
+        self.admin = User.objects.create_superuser(username='admin@jetson.com', email='admin@jetson.com', password='jetson-admin-pw')
+        self.admin_auth = {'HTTP_AUTHORIZATION': 'Token ' + Token.objects.create(user=self.admin).key}
+
+    def export(self, **params):
+        res = self.client.get(reverse('exportAnswers'), params, **self.admin_auth)
+        self.assertEqual(res.status_code, 200)
+        return b''.join(res.streaming_content).decode()
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export(fileType='ndjson').splitlines()]
+        self.assertEqual([row['user_id'] for row in rows], [self.user.pk, self.admin.pk])
+        self.assertEqual(rows[0]['q_5'], 'Might go')
+        self.assertEqual(rows[0]['annual_income'], 85000)
+        self.assertEqual(rows[0]['recommended_health_plan_id'], None)
+        self.assertEqual(rows[1]['age'], None)
+
+        rows = [json.loads(line) for line in self.export(fileType='ndjson', sinceId=self.user.pk).splitlines()]
+        self.assertEqual([row['user_id'] for row in rows], [self.admin.pk])
+
+    def test_csv(self):
+        lines = self.export(since='2000-01-01').splitlines()
+        self.assertTrue(lines[0].startswith('user_id,username,date_joined,age,'))
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(self.export(since='2999-01-01T00:00:00').splitlines()[1:], [])
+
+    def test_admin_only(self):
+        res = self.client.get(reverse('exportAnswers'), **self.auth)
+        self.assertEqual(res.status_code, 403)
+        res = self.client.get(reverse('exportAnswers'), {'since': 'yesterday'}, **self.admin_auth)
+        self.assertEqual(res.json()['error'], 'invalid since')
+
+
+class ContentNegotiationTest(APITestCase):
+    """
+        Responses come in the encoding the Accept header asks for, JSON by default
+    """
+
+    def test_json_by_default(self):
+        for accept in ['', 'text/html,application/xhtml+xml,*/*;q=0.8', 'application/xml']:
+            res = self.client.get(reverse('getAllInsuranceQuotes'), HTTP_ACCEPT=accept, **self.auth)
+            self.assertEqual(res['Content-Type'], 'application/json')
+            self.assertIn('Accept', res['Vary'])
+            self.assertTrue(res.json()['success'])
+
+    def test_negotiate(self):
+        self.assertEqual(renderers.negotiate('application/cbor;q=0.5, application/msgpack').format,
+            'msgpack' if renderers.msgpack is not None else 'cbor' if renderers.cbor2 is not None else 'json')
+        self.assertEqual(renderers.negotiate('application/msgpack;q=0, */*').format, 'json')
+
+    @unittest.skipUnless(renderers.msgpack is not None, 'msgpack is not installed')
+    def test_msgpack(self):
+        expected = self.client.get(reverse('getAllInsuranceInfo'), **self.auth).json()
+        res = self.client.get(reverse('getAllInsuranceInfo'), HTTP_ACCEPT='application/msgpack', **self.auth)
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        self.assertEqual(renderers.msgpack.unpackb(res.content, raw=False), expected)
+
+        res = self.client.get(reverse('getAllInsuranceInfo'), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(res.status_code, 401)
+        self.assertIn('detail', renderers.msgpack.unpackb(res.content, raw=False))
+
+    @unittest.skipUnless(renderers.cbor2 is not None, 'cbor2 is not installed')
+    def test_cbor_generate_quotes(self):
+        params = {'userData': json.dumps(USER_DATA)}
+        expected = self.client.get(reverse('generateInsuranceQuotes'), params)
+        res = self.client.get(reverse('generateInsuranceQuotes'), params, HTTP_ACCEPT='application/cbor')
+        self.assertEqual(res['Content-Type'], 'application/cbor')
+        self.assertEqual(renderers.cbor2.loads(res.content), expected.json())
+        # cached per encoding
+        self.assertNotEqual(res['ETag'], expected['ETag'])
+        self.assertEqual(self.client.get(reverse('generateInsuranceQuotes'), params, HTTP_ACCEPT='application/cbor').content, res.content)
+
+
+class FormattingTest(unittest.TestCase):
+    """
+        The list formatters agree with the scalar ones
+    """
+    values = [0, 5, 99.5, 1240, 15060, 99999, 100000, 150021, 150299, 999999, 1000000, 1200000, 9999999, 25000000, 1240, 15060.0]
+
+    def test_lists_match_scalars(self):
+        self.assertEqual(formatting.nums_to_usd(self.values), [formatting.num_to_usd(value) for value in self.values])
+        self.assertEqual(formatting.abbrev_nums(self.values), [formatting.abbrev_num(value) for value in self.values])
+        self.assertEqual(formatting.abbrev_nums_to_usd(self.values), [formatting.abbrev_num_to_usd(value) for value in self.values])
+
+    def test_known_values(self):
+        self.assertEqual(formatting.nums_to_usd([1240, 99.5, 3000.0]), ['$1,240', '$99.50', '$3,000'])
+        self.assertEqual(formatting.abbrev_nums_to_usd([150299, 250000, 1500000]), ['$150.3K', '$250K', '$1.5M'])
+
+    def test_numpy(self):
+        import numpy as np
+        self.assertEqual(formatting.abbrev_nums_to_usd(np.array([250000, 500000, 250000])), ['$250K', '$500K', '$250K'])
+
+
+class ServerTimingTest(APITestCase):
+    """
+        With SERVER_TIMING on every response says where its time went
+    """
+
+    def test_header_and_log(self):
+        with self.settings(SERVER_TIMING=True):
+            client = Client()
+            with self.assertLogs('api.timing', 'INFO') as logs, CaptureQueriesContext(connection) as queries:
+                res = client.get(reverse('getAllInsuranceQuotes'), **self.auth)
+
+        metrics = dict((metric.split(';')[0], metric) for metric in res['Server-Timing'].split(', '))
+        self.assertEqual(set(metrics), set(['db', 'recommendation', 'serialization', 'total']))
+        self.assertIn('desc="%d queries"' % len(queries), metrics['db'])
+
+        record = logs.records[0]
+        self.assertEqual((record.url_name, record.status, record.db_queries), ('getAllInsuranceQuotes', 200, len(queries)))
+        self.assertGreater(record.recommendation_ms, 0)
+        self.assertGreater(record.serialization_ms, 0)
+
+    def test_off_by_default(self):
+        res = Client().get(reverse('getAllInsuranceQuotes'), **self.auth)
+        self.assertFalse(res.has_header('Server-Timing'))
+
+
+class ProfilingTest(APITestCase):
+    """
+        Staff can profile one request with X-Profile, collapse_profiles merges the dumps
+    """
+
+    def setUp(self):
+        super(ProfilingTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.profiling = self.settings(PROFILING=True, PROFILE_DIR=self.directory, PROFILE_SAMPLE_INTERVAL=.0001)
+        self.profiling.enable()
+        self.addCleanup(self.profiling.disable)
+
+    def profile(self, mode):
+        res = Client().get(reverse('getAllInsuranceQuotes'), HTTP_X_PROFILE=mode, **self.auth)
+        self.assertEqual(res.status_code, 200)
+        return res.get('X-Profile-Id')
+
+    def metadata(self, request_id):
+        [name] = [name for name in os.listdir(self.directory) if request_id in name and name.endswith('.json')]
+        with open(os.path.join(self.directory, name)) as f:
+            return json.load(f)
+
+    def test_off_by_default(self):
+        self.profiling.disable()
+        self.addCleanup(self.profiling.enable)
+        self.user.is_staff = True
+        self.user.save()
+        with self.settings(PROFILE_DIR=self.directory):
+            self.assertIsNone(self.profile('deterministic'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_staff_only(self):
+        self.assertIsNone(self.profile('deterministic'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_deterministic_and_sampling(self):
+        self.user.is_staff = True
+        self.user.save()
+
+        meta = self.metadata(self.profile('deterministic'))
+        self.assertEqual((meta['url_name'], meta['status'], meta['mode'], meta['trigger']),
+            ('getAllInsuranceQuotes', 200, 'deterministic', 'header'))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, meta['profile'])))
+
+        self.assertEqual(self.metadata(self.profile('sampling'))['mode'], 'sampling')
+
+        out = io.StringIO()
+        call_command('collapse_profiles', dir=self.directory, mode='deterministic', stdout=out, stderr=io.StringIO())
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines)
+        self.assertEqual(set(line.rsplit(' ', 1)[0].split(';')[0] for line in lines), set(['django/views/decorators/csrf.py:wrapped_view']))
+        self.assertTrue(any('api/views.py:getAllInsuranceQuotes;' in line for line in lines))
+        self.assertTrue(any('recommendation_logic.py:' in line for line in lines))
+
+    def test_sample_rate(self):
+        with self.settings(PROFILE_SAMPLE_RATE=1, PROFILE_MODE='deterministic'):
+            res = Client().get(reverse('getAllInsuranceQuotes'), **self.auth)
+        self.assertEqual(self.metadata(res['X-Profile-Id'])['trigger'], 'sample')
+
+
+class UserQuoteCacheTest(APITestCase):
+    """
+        Repeat quote reads are served from the quotes cache until the answers or catalogs change
+    """
+
+    def test_repeat_dashboard_load(self):
+        first = self.get('getAllInsuranceQuotes')
+        # served from the shared caches alone
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get('getAllInsuranceQuotes'), first)
+            self.assertEqual(self.get('getInsuranceQuote', {'insuranceType': 'LIFE'}), first['LIFE'])
+
+    def test_cost_of_a_hit(self):
+        self.get('getAllInsuranceQuotes')
+        versions, quotes = catalog.versions_cache(), caches['quotes']
+        with mock.patch.object(versions, 'get_many', wraps=versions.get_many) as versions_read, \
+                mock.patch.object(quotes, 'get_many', wraps=quotes.get_many) as quotes_read, \
+                mock.patch.object(quotes, 'set', wraps=quotes.set) as quotes_write, \
+                self.assertNumQueries(0):
+            self.get('getAllInsuranceQuotes')
+        # the catalog stamps and the answers stamp with the entry, nothing written
+        self.assertEqual((versions_read.call_count, quotes_read.call_count, quotes_write.call_count), (1, 1, 0))
+        self.assertEqual(len(quotes_read.call_args[0][0]), 2)
+
+    def test_answer_write_invalidates(self):
+        self.assertEqual(self.get('getInsuranceQuote', {'insuranceType': 'DISABILITY'})['benefit_amount'], '$51,000')
+
+        user_data = {'age': 31, 'zipcode': 14850, 'marital_status': 'married', 'health_condition': 'good', 'annual_income': 100000,
+            'spouse_annual_income': 0, 'spouse_age': 30, 'num_kids': 2, 'kid_ages': [3, 6], 'gender': 'female'}
+        res = self.client.post(reverse('updateUserInfo'), {'userData': json.dumps(user_data)}, **self.auth)
+        self.assertTrue(res.json()['success'])
+
+        self.assertEqual(self.get('getInsuranceQuote', {'insuranceType': 'DISABILITY'})['benefit_amount'], '$60,000')
+
+    def test_catalog_reload_invalidates(self):
+        self.get('getAllInsuranceQuotes')
+        catalog.bump_catalog_version()
+        misses = views.userQuoteCache.misses
+        self.get('getAllInsuranceQuotes')
+        self.assertEqual(views.userQuoteCache.misses, misses + 1)
+
+    def test_shared_between_workers(self):
+        self.assertNotIn('LocMemCache', settings.CACHES['quotes']['BACKEND'])
+        # another worker: its own UserQuoteCache on the same alias
+        worker = UserQuoteCache()
+        compute = mock.Mock(return_value={'LIFE': 'old'})
+        worker.get_quotes(self.user.id, ['LIFE'], compute)
+        worker.get_quotes(self.user.id, ['LIFE'], compute)
+        self.assertEqual(compute.call_count, 1)
+
+        # an answer write handled by this worker is seen by the other one
+        views.userQuoteCache.invalidate(self.user.id)
+        compute.return_value = {'LIFE': 'new'}
+        self.assertEqual(worker.get_quotes(self.user.id, ['LIFE'], compute), {'LIFE': 'new'})
+        self.assertEqual(compute.call_count, 2)
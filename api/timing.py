@@ -0,0 +1,117 @@
+"""
+    timing.py: per-request SQL, recommendation and serialization timings
+
+    ServerTimingMiddleware (SERVER_TIMING setting) collects, for every request, the number
+    of SQL statements and their total time, the time spent in the recommendation logic and
+    the time spent serializing the response. They are sent back in a Server-Timing header
+    (browser devtools show it next to the request) and logged on the 'api.timing' logger
+    with the url name of the view as structured fields (record.url_name, record.db_queries,
+    record.db_ms...).
+
+    When SERVER_TIMING is off the middleware removes itself at startup and timed() costs
+    one thread-local lookup per call.
+"""
+
+import functools
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger('api.timing')
+
+# the RequestTiming of the request this thread is serving, if it is being timed
+_local = threading.local()
+
+
+class RequestTiming(object):
+    """
+        What one request spent its time on, in seconds
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_queries = 0
+        self.durations = {'db': 0.0, 'recommendation': 0.0, 'serialization': 0.0}
+
+    def record_query(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations['db'] += time.perf_counter() - start
+            self.db_queries += 1
+
+    def header(self, total):
+        """
+            :return Server-Timing header value, durations in milliseconds
+        """
+        metrics = ['db;desc="%d queries";dur=%.2f' % (self.db_queries, self.durations['db'] * 1000)]
+        metrics += ['%s;dur=%.2f' % (name, self.durations[name] * 1000) for name in ['recommendation', 'serialization']]
+        metrics.append('total;dur=%.2f' % (total * 1000))
+        return ', '.join(metrics)
+
+
+def current():
+    """
+        :return the RequestTiming of this thread's request, None when it is not timed
+    """
+    return getattr(_local, 'timing', None)
+
+
+def timed(name, func):
+    """
+        Wraps func so the time spent in it counts towards the `name` duration of the
+        request being timed
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        timing = current()
+        if timing is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timing.durations[name] += time.perf_counter() - start
+
+    return wrapper
+
+
+class ServerTimingMiddleware(object):
+    """
+        Adds the Server-Timing header and the 'api.timing' log line, see the module docstring
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'SERVER_TIMING', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = _local.timing = RequestTiming()
+        try:
+            with connection.execute_wrapper(timing.record_query):
+                response = self.get_response(request)
+        finally:
+            _local.timing = None
+
+        total = time.perf_counter() - timing.start
+        response['Server-Timing'] = timing.header(total)
+
+        match = request.resolver_match
+        url_name = match.url_name if match is not None else None
+        fields = {
+            'url_name': url_name,
+            'method': request.method,
+            'status': response.status_code,
+            'db_queries': timing.db_queries,
+            'db_ms': round(timing.durations['db'] * 1000, 2),
+            'recommendation_ms': round(timing.durations['recommendation'] * 1000, 2),
+            'serialization_ms': round(timing.durations['serialization'] * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }
+        logger.info(' '.join('%s=%s' % (key, fields[key]) for key in sorted(fields)), extra=fields)
+        return response
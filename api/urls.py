@@ -9,6 +9,7 @@ from api import views
 urlpatterns = [
     path('signup', views.signup, name='signup'),
     path('login', views.login, name="signIn"),
+    path('logout', views.logout, name="logout"),
     path('update-user-info', views.updateUserInfo, name="updateUserInfo"),
     path('get-user-info', views.getUserInfo, name="getUserInfo"),
     path('update-insurance-info', views.updateInsuranceInfo, name="updateInsuranceInfo"),
@@ -16,5 +17,9 @@ urlpatterns = [
     path('get-all-insurance-info', views.getAllInsuranceInfo, name="getAllInsuranceInfo"),
     path('get-insurance-quote', views.getInsuranceQuote, name="getInsuranceQuote"),
     path('get-all-insurance-quotes', views.getAllInsuranceQuotes, name="getAllInsuranceQuotes"),
-    path('generate-insurance-quotes', views.generateInsuranceQuotes, name="generateInsuranceQuotes")
+    path('batch', views.batch, name="batch"),
+    path('generate-insurance-quotes', views.generateInsuranceQuotes, name="generateInsuranceQuotes"),
+    path('bulk-insurance-quotes', views.bulkInsuranceQuotes, name="bulkInsuranceQuotes"),
+    path('export-answers', views.exportAnswers, name="exportAnswers"),
+    path('metrics', views.getMetrics, name="getMetrics")
 ]
\ No newline at end of file
@@ -1,11 +1,20 @@
 from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.http import parse_etags
+from django.utils.cache import patch_vary_headers
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, When, Value, IntegerField
 from django.views.decorators.http import require_POST
 from django.views.decorators.http import require_GET
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
-from django.contrib.auth import authenticate
-from rest_framework.authentication import TokenAuthentication
+from api.authentication import CachedTokenAuthentication, tokenCache
+from api.hashing import PoolFull, passwordPool
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from django.core import serializers
@@ -17,9 +26,29 @@ from django.views.decorators.csrf import ensure_csrf_cookie
 from app.models import *
 import json
 from app.scripts.recommendation_logic import *
+from app.scripts import catalog
+from app.scripts import recommendations
+from app.scripts import export
 from django.forms.models import model_to_dict
+from rest_framework.permissions import IsAdminUser
 
 from api.formatting import *
+from api.profile import UserProfile
+from api.caching import TTLCache, UserQuoteCache, content_hash
+from api.renderers import negotiate, render_response
+from api import timing
+import time
+
+#responses of generateInsuranceQuotes keyed by their ETag
+quoteCache = TTLCache(getattr(settings, 'QUOTE_CACHE_SIZE', 1024), getattr(settings, 'QUOTE_CACHE_TTL', 300))
+
+#quotes of signed in users, see getCachedQuotes
+userQuoteCache = UserQuoteCache('quotes')
+
+# time spent in the recommendation logic shows up in Server-Timing (see api/timing.py)
+life_insurance = timing.timed('recommendation', life_insurance)
+health_insurance = timing.timed('recommendation', health_insurance)
+disability_rec = timing.timed('recommendation', disability_rec)
 
 #TODO: what to output if nothing returned from generating quotes
 
@@ -54,6 +83,15 @@ def validateRequest(request, keys, method, response):
 def asInt(value):
     return 0 if value == '' else int(value)
 
+def serverBusy(request, response):
+    """
+        503 for requests shed because the password hashing pool is full (see api/hashing.py)
+    """
+    response['error'] = 'Server busy, please try again'
+    busy = render_response(request, response, status=503)
+    busy['Retry-After'] = '1'
+    return busy
+
 @require_POST
 def signup(request):
     """
@@ -80,20 +118,26 @@ def signup(request):
             res['error'] = 'Existing account already associated with ' + email
             print(res['error'])
         else:
-            # create user & api token
-            user = User.objects.create_user(
-                username=email,
-                email=email,
-                password=password,
+            # create user & api token, the password hasher runs on the hashing pool
+            try:
+                hashed = make_password(password)
+            except PoolFull:
+                return serverBusy(request, res)
+
+            user = User(
+                username=User.normalize_username(email),
+                email=User.objects.normalize_email(email),
+                password=hashed,
                 first_name=firstName,
                 last_name=lastName
             )
+            user.save()
             token = Token.objects.create(user=user)
             res['success'] = True
             res['token'] = token.key
             print('created user: ' + user.username)
 
-    return JsonResponse(res)
+    return render_response(request, res)
 
 
 @require_POST
@@ -114,7 +158,10 @@ def login(request):
         username = request.POST['username']
         password = request.POST['password']
 
-        user = authenticate(username=username, password=password)
+        try:
+            user = authenticate(request, username=username, password=password)
+        except PoolFull:
+            return serverBusy(request, res)
 
         # check if user has already been created
         if user is None:
@@ -132,11 +179,33 @@ def login(request):
                 res['success'] = False
                 res['error'] = 'No token exists for user'
 
-    return JsonResponse(res)
+    return render_response(request, res)
+
+
+@api_view(['POST'])
+@authentication_classes((CachedTokenAuthentication,))
+@permission_classes((IsAuthenticated,))
+def logout(request):
+    """
+        Log Out of JetsonBenefits: replaces the user's api token, so the current one stops
+        working everywhere (login hands out the new one)
+        :param request
+
+        :return JsonResponse
+            { success: bool, error: string }
+    """
+    res = { 'success': False, 'error': '' }
+
+    with transaction.atomic():
+        request.auth.delete()
+        Token.objects.create(user=request.user)
+
+    res['success'] = True
+    return render_response(request, res)
 
 
 @api_view(['POST'])
-@authentication_classes((TokenAuthentication,))
+@authentication_classes((CachedTokenAuthentication,))
 @permission_classes((IsAuthenticated,))
 def updateUserInfo(request):
     """
@@ -179,25 +248,67 @@ def updateUserInfo(request):
             if not type(userData[key]) in [int, float]:
                 userData[key] = asInt(userData[key])
         
-        #save user answers into object
-        getAnswers = user_general_answers(**userData)
-        getAnswers.save()
-
-        # Delete kids and add new ones instead if any exist
-        user_kids.objects.filter(user_id=user).delete()
-        i = 0
-        while(i<len(kid_ages)):
-            age = user_kids(user_id=user, kid_age = asInt(kid_ages[i]), will_pay_for_college = 'yes')
-            age.save()
-            i = i+1
+        #save user answers and kids together, readers never see one without the other
+        with transaction.atomic():
+            getAnswers = user_general_answers(**userData)
+            getAnswers.save()
+
+            updateKidsHelper(user, [asInt(age) for age in kid_ages])
 
+        userQuoteCache.invalidate(user.id)
         res['success'] = True
 
-    return JsonResponse(res)
+    return render_response(request, res)
+
+
+def replaceAnswersHelper(model, user, values):
+    """
+        Replaces the row of a per-user answers model in one statement
+        :param
+            model is user_health_questions_answer or user_life_answers
+            user is User instance
+            values { field: value } for every answer field of the model
+
+        --> an UPDATE, plus an INSERT the first time a user answers, in one transaction
+    """
+    with transaction.atomic():
+        if (model.objects.filter(user_id=user).update(**values) == 0):
+            model.objects.create(user_id=user, **values)
+
+
+def updateKidsHelper(user, kid_ages):
+    """
+        Makes the user_kids rows of a user match kid_ages, reusing existing rows
+        :param
+            user is User instance
+            kid_ages [ int ]
+
+        --> 1 query to read the existing rows, then at most one bulk UPDATE, DELETE and INSERT
+    """
+    existing = list(user_kids.objects.filter(user_id=user).order_by('kid').values_list('kid', 'kid_age'))
+
+    #kids whose age is unchanged keep their row
+    new_ages = list(kid_ages)
+    leftover = []
+    for kid, kid_age in existing:
+        if kid_age in new_ages:
+            new_ages.remove(kid_age)
+        else:
+            leftover.append(kid)
+
+    #rows left over take the new ages, then the rest is deleted or inserted
+    changed = list(zip(leftover, new_ages))
+    if (len(changed) > 0):
+        user_kids.objects.filter(kid__in=[kid for kid, age in changed]).update(
+            kid_age=Case(*[When(kid=kid, then=Value(age)) for kid, age in changed], output_field=IntegerField()))
+    if (len(leftover) > len(changed)):
+        user_kids.objects.filter(kid__in=leftover[len(changed):]).delete()
+    if (len(new_ages) > len(changed)):
+        user_kids.objects.bulk_create([user_kids(user_id=user, kid_age=age, will_pay_for_college='yes') for age in new_ages[len(changed):]])
 
 
 @api_view(['GET'])
-@authentication_classes((TokenAuthentication,))
+@authentication_classes((CachedTokenAuthentication,))
 @permission_classes((IsAuthenticated,))
 def getUserInfo(request):
     """
@@ -222,31 +333,37 @@ def getUserInfo(request):
     res = { 'success': False, 'error': '', 'data': None }
 
     if (validateRequest(request, requiredKeys, 'GET', res)):
-        user = request.user
+        res['data'] = getUserInfoHelper(request.user)
+        res['success'] = True
 
-        #get users answers
-        user_answers = list(user_general_answers.objects.filter(user_id=user).values())
-        userData = {}
-        if len(user_answers)>=1:
-            userData = user_answers[0]
+    return render_response(request, res)
 
 
-        #get users kids
-        if (user_kids.objects.filter(user_id = user).exists()):
-            user_kids_ages = list(user_kids.objects.values_list('kid_age', flat = True).filter(user_id = user))
+def getUserInfoHelper(user, profile=None):
+    """
+        Gets a users information, see getUserInfo
+        :param
+            user is User instance
+            profile is an optional UserProfile of user, pass one to share it between calls
 
-            userData['kid_ages'] = user_kids_ages
-        else:
-            userData['kid_ages'] = []
+        :return dictionary userData
+    """
+    if profile is None:
+        profile = UserProfile(user)
 
-        res['data'] = userData
-        res['success'] = True
+    #get users answers
+    userData = {}
+    if (profile.general is not None):
+        userData = dict((field.attname, getattr(profile.general, field.attname)) for field in user_general_answers._meta.concrete_fields)
 
-    return JsonResponse(res)
+    #get users kids
+    userData['kid_ages'] = profile.kid_ages
+
+    return userData
 
 
 @api_view(['POST'])
-@authentication_classes((TokenAuthentication,))
+@authentication_classes((CachedTokenAuthentication,))
 @permission_classes((IsAuthenticated,))
 def updateInsuranceInfo(request):
     """
@@ -267,6 +384,8 @@ def updateInsuranceInfo(request):
                 q_11: 'Convenient time with any doctor',
                 q_12: 'If my doc says so'
             }
+            each q_N is either the option text or the int position of the option within
+            the question (e.g. q_1: 1 is 'No'), positions follow health_question_options ids
             q_1 is 'Yes' or 'No'
             q_2 is 'Yes' or 'No'
             q_5 is 'No chance', 'Might go', 'I'll definitely go'
@@ -286,6 +405,9 @@ def updateInsuranceInfo(request):
             balance_investings_savings: 1000,
         }
 
+        unanswered questions ('' or left out) are cleared, the submitted answers replace the
+        stored ones; nothing is written if a key or an answer is invalid
+
         :return JsonResponse
             { success: bool, error: string }
     """
@@ -297,46 +419,51 @@ def updateInsuranceInfo(request):
         insuranceType = request.POST['insuranceType']
         insuranceData = json.loads(request.POST['insuranceData'])
 
-        print(insuranceData)
-
         if (insuranceType == 'HEALTH'):
-            healthRecord = user_health_questions_answer(user_id=user)
-            
-            health_dict = {}
+            #resolve every answer first, from the in-memory option index, so a bad one writes nothing
+            health_dict = dict((field, None) for field in HEALTH_ANSWER_FIELDS)
             for key in insuranceData:
+                if (key not in health_dict):
+                    res['error'] = 'invalid health question ' + key
+                    return render_response(request, res)
                 if insuranceData[key] == '':
                     continue
                 num = int(key[key.find('_')+1:]) #get id number
-                q = health_question_options.objects.get(option = insuranceData[key], health_question_id = num)
-                health_dict[key] = q
+                try:
+                    health_dict[key] = catalog.health_option(num, insuranceData[key])
+                except health_question_options.DoesNotExist:
+                    res['error'] = 'invalid answer for ' + key
+                    return render_response(request, res)
 
-            # runs over the data in the dictionary returned from health questions options
-            for attr, value in health_dict.items():
-                setattr(healthRecord, attr, value)
-                healthRecord.save()
+            # unanswered questions are cleared, the answers replace the stored ones
+            if any(value is not None for value in health_dict.values()):
+                replaceAnswersHelper(user_health_questions_answer, user, health_dict)
 
         elif (insuranceType == 'LIFE'):
-
-            lifeRecord = user_life_answers(user_id=user)
+            life_dict = dict((field.name, field.get_default()) for field in user_life_answers._meta.concrete_fields if field.name != 'user_id')
             for attr, val in insuranceData.items():
+                if (attr not in life_dict):
+                    res['error'] = 'invalid life question ' + attr
+                    return render_response(request, res)
                 if val == '':
                     continue
-                setattr(lifeRecord, attr, val)
+                life_dict[attr] = val
 
-            lifeRecord.save()
+            replaceAnswersHelper(user_life_answers, user, life_dict)
 
         elif (insuranceType == 'DISABILITY'):
             # DO NOTHING -- disability data already stored
             ### TODO: Is this correct???
             pass
 
+        userQuoteCache.invalidate(user.id)
         res['success'] = True
     
-    return JsonResponse(res)
+    return render_response(request, res)
 
 
 @api_view(['GET'])
-@authentication_classes((TokenAuthentication,))
+@authentication_classes((CachedTokenAuthentication,))
 @permission_classes((IsAuthenticated,))
 @require_GET
 def getInsuranceInfo(request):
@@ -394,11 +521,11 @@ def getInsuranceInfo(request):
         else:
             res['error'] = 'invalid insurance type'
     
-    return JsonResponse(res)
+    return render_response(request, res)
 
 
 @api_view(['GET'])
-@authentication_classes((TokenAuthentication,))
+@authentication_classes((CachedTokenAuthentication,))
 @permission_classes((IsAuthenticated,))
 def getAllInsuranceInfo(request):
     """
@@ -437,19 +564,20 @@ def getAllInsuranceInfo(request):
 
     if (validateRequest(request, requiredKeys, 'GET', res)):
         user = request.user
+        profile = UserProfile(user)
 
-        health_info = getInsuranceInfoHelper(user, 'HEALTH')
-        life_info = getInsuranceInfoHelper(user, 'LIFE')
-        disability_info = getInsuranceInfoHelper(user, 'DISABILITY')
+        health_info = getInsuranceInfoHelper(user, 'HEALTH', profile)
+        life_info = getInsuranceInfoHelper(user, 'LIFE', profile)
+        disability_info = getInsuranceInfoHelper(user, 'DISABILITY', profile)
 
         res['data'] = {'HEALTH': health_info, 'LIFE': life_info, 'DISABILITY': disability_info}
         res['success'] = True
     
-    return JsonResponse(res)
+    return render_response(request, res)
 
 
 @api_view(['GET'])
-@authentication_classes((TokenAuthentication,))
+@authentication_classes((CachedTokenAuthentication,))
 @permission_classes((IsAuthenticated,))
 def getInsuranceQuote(request):
     """
@@ -500,17 +628,17 @@ def getInsuranceQuote(request):
 
         if (insurance_type == 'HEALTH' or insurance_type == 'LIFE' or insurance_type == 'DISABILITY'):
             #depending on the insurance type, the func getQouteHelper is called
-            data = getQuoteHelper(user, insurance_type)
+            data = getCachedQuotes(user, [insurance_type])[insurance_type]
             res['data'] = data
             res['success'] = True
         else:
             res['error'] = 'invalid insurance type'
     
-    return JsonResponse(res)
+    return render_response(request, res)
 
 
 @api_view(['GET'])
-@authentication_classes((TokenAuthentication,))
+@authentication_classes((CachedTokenAuthentication,))
 @permission_classes((IsAuthenticated,))
 def getAllInsuranceQuotes(request):
     """
@@ -553,17 +681,133 @@ def getAllInsuranceQuotes(request):
 
     if (validateRequest(request, requiredKeys, 'GET', res)):
         user = request.user
-
-        life_quote = getQuoteHelper(user, 'LIFE')
-        health_quote = getQuoteHelper(user, 'HEALTH')
-        disability_quote = getQuoteHelper(user, 'DISABILITY')
-
-        data = {'LIFE': life_quote, 'HEALTH': health_quote, 'DISABILITY': disability_quote}
+        data = getCachedQuotes(user, ['LIFE', 'HEALTH', 'DISABILITY'])
 
         res['success'] = True
         res['data'] = data
     
-    return JsonResponse(res)
+    return render_response(request, res)
+
+def batchInsuranceInfo(user, profile, params):
+    insuranceType = params.get('insuranceType')
+    if (insuranceType not in ['HEALTH', 'LIFE', 'DISABILITY']):
+        raise ValueError('invalid insurance type')
+    return getInsuranceInfoHelper(user, insuranceType, profile)
+
+def batchInsuranceQuote(user, profile, params):
+    insurance_type = params.get('insuranceType')
+    if (insurance_type not in ['HEALTH', 'LIFE', 'DISABILITY']):
+        raise ValueError('invalid insurance type')
+    return getCachedQuotes(user, [insurance_type], profile)[insurance_type]
+
+#operations batch can run: url name --> func(user, profile, params) returning the data of that endpoint
+BATCH_OPERATIONS = {
+    'getUserInfo': lambda user, profile, params: getUserInfoHelper(user, profile),
+    'getInsuranceInfo': batchInsuranceInfo,
+    'getAllInsuranceInfo': lambda user, profile, params: dict((insuranceType, getInsuranceInfoHelper(user, insuranceType, profile))
+        for insuranceType in ['HEALTH', 'LIFE', 'DISABILITY']),
+    'getInsuranceQuote': batchInsuranceQuote,
+    'getAllInsuranceQuotes': lambda user, profile, params: getCachedQuotes(user, ['LIFE', 'HEALTH', 'DISABILITY'], profile),
+}
+
+def parseBatchOperations(raw):
+    """
+        Parses and validates the operations parameter of batch
+        :param raw: string --> JSON list of operations, see batch
+        :return [ { op: string, params: dict, key: string } ]
+        :raise ValueError with the error to return when the request is malformed
+    """
+    try:
+        operations = json.loads(raw)
+    except ValueError:
+        raise ValueError('operations must be valid JSON')
+    if (not isinstance(operations, list)):
+        raise ValueError('operations must be a list')
+
+    parsed = []
+    keys = set()
+    for operation in operations:
+        if (isinstance(operation, str)):
+            operation = {'op': operation}
+        if (not isinstance(operation, dict) or not isinstance(operation.get('op'), str)):
+            raise ValueError('every operation must be a name or an object with an op name')
+        params = operation.get('params')
+        if (params is not None and not isinstance(params, dict)):
+            raise ValueError('params of ' + operation['op'] + ' must be an object')
+        key = operation.get('key', operation['op'])
+        if (not isinstance(key, str)):
+            raise ValueError('key of ' + operation['op'] + ' must be a string')
+        if (key in keys):
+            raise ValueError('duplicate key ' + key)
+        keys.add(key)
+        parsed.append({'op': operation['op'], 'params': params or {}, 'key': key})
+    return parsed
+
+@api_view(['POST'])
+@authentication_classes((CachedTokenAuthentication,))
+@permission_classes((IsAuthenticated,))
+def batch(request):
+    """
+        Runs several read operations in one request, authenticating once and loading the
+        user's answers once for all of them
+        :param request:
+            { POST: { operations: [ operation ] } }
+            operation = 'getUserInfo' | 'getAllInsuranceInfo' | 'getAllInsuranceQuotes'
+                or { op: string, params: object, key: string } for operations that take
+                parameters, e.g. { op: 'getInsuranceQuote', params: { insuranceType: 'LIFE' }, key: 'lifeQuote' }
+                (key defaults to op)
+
+        :return JsonResponse
+            { success: bool, error: string, data: object }
+            data = {
+                key: { success: bool, error: string, data: object } --> what the op's own endpoint returns
+            }
+            an operation that fails only fails its own key; 400 without running any
+            operation when operations is not a JSON list of operations of that form or
+            two operations have the same key
+    """
+    requiredKeys = ['operations']
+    res = { 'success': False, 'error': '', 'data': None }
+
+    if (validateRequest(request, requiredKeys, 'POST', res)):
+        try:
+            operations = parseBatchOperations(request.POST['operations'])
+        except ValueError as e:
+            res['error'] = str(e)
+            return render_response(request, res, status=400)
+
+        user = request.user
+        profile = UserProfile(user)
+
+        data = {}
+        for operation in operations:
+            op = operation['op']
+            key = operation['key']
+            result = { 'success': False, 'error': '', 'data': None }
+
+            if (op not in BATCH_OPERATIONS):
+                result['error'] = 'unknown operation ' + op
+            else:
+                try:
+                    result['data'] = BATCH_OPERATIONS[op](user, profile, operation['params'])
+                    result['success'] = True
+                except ValueError as e:
+                    result['error'] = str(e)
+                except KeyError as e:
+                    result['error'] = 'missing key ' + str(e.args[0])
+                except ObjectDoesNotExist as e:
+                    result['error'] = str(e)
+                except (TypeError, AttributeError):
+                    # e.g. quotes of a user who has not answered the general questions
+                    result['error'] = 'invalid answers'
+
+            data[key] = result
+
+        res['data'] = data
+        res['success'] = True
+
+    return render_response(request, res)
+
 
 @require_GET
 def generateInsuranceQuotes(request):
@@ -583,7 +827,7 @@ def generateInsuranceQuotes(request):
               gender: 'female' 
             },
             HEALTH: {
-              q_1: 'No',
+              q_1: 'No',        (or the option's int position within the question, e.g. q_1: 1)
               q_2: 'No', 
               q_5: 'Might go',
               q_6: 'Never or just for my annual physical', 
@@ -635,116 +879,285 @@ def generateInsuranceQuotes(request):
     requiredKeys = ['userData']
     res = { 'success': False, 'error': '', 'data': None }
 
-    if (validateRequest(request, requiredKeys, 'GET', res)):
-        #userData fetched from getUserInfo func.
-        userData = json.loads(request.GET['userData'])
+    if (not validateRequest(request, requiredKeys, 'GET', res)):
+        return render_response(request, res)
 
-        general_post = userData['GENERAL']
-        life_post = userData['LIFE']
-        health_post = userData['HEALTH']
+    #userData fetched from getUserInfo func.
+    userData = json.loads(request.GET['userData'])
 
-        life_obj = None
-        health_obj = None
-        general_obj = None
-        
-        user_kids_ages = []
-        is_married = False
-        num_kids = 0
-        age = 0
-        gender = 'male'
-
-        #get general answers
-        if (general_post != {}):
-            general_post['user_id'] = User()
-            
-            user_kids_ages = general_post['kid_ages']
-            del general_post['kid_ages']
+    etag, response = cachedQuotesResponse(request, userData)
+    if (response is None):
+        response = computeQuotesResponse(request, userData, etag)
+    return response
 
-            #get number of kids
-            num_kids = asInt(general_post['num_kids'])
-            num_kids = min(num_kids, 2)
+def cachedQuotesResponse(request, userData):
+    """
+        Answers generateInsuranceQuotes without computing anything when possible
+        :return etag, response --> response is a 304 or a cached response, None if the
+            quotes have to be computed (see computeQuotesResponse)
+    """
+    #same input + same catalogs + same encoding --> same response, so the hash doubles as a strong ETag
+    renderer = negotiate(request.META.get('HTTP_ACCEPT'))
+    etag = '"%s"' % content_hash(userData, *(catalogVersions() + (renderer.format,)))
+
+    response = None
+    if (etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))):
+        response = HttpResponseNotModified()
+    else:
+        content = quoteCache.get(etag)
+        if (content is not None):
+            response = HttpResponse(content, content_type=renderer.media_type)
+
+    return etag, (quotesCacheHeaders(response, etag) if response is not None else None)
+
+def computeQuotesResponse(request, userData, etag):
+    """
+        Computes the generateInsuranceQuotes response and caches it under etag
+    """
+    res = { 'success': True, 'error': '', 'data': None }
+    start = time.time()
+    res['data'] = generateQuotesHelper(userData)
+    response = render_response(request, res)
+    quoteCache.set(etag, response.content, time.time() - start)
+
+    return quotesCacheHeaders(response, etag)
+
+def quotesCacheHeaders(response, etag):
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=%d' % quoteCache.ttl
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+@api_view(['POST'])
+@authentication_classes((CachedTokenAuthentication,))
+@permission_classes((IsAuthenticated,))
+def bulkInsuranceQuotes(request):
+    """
+        Generates insurance quotes for many households in one request
+        :param request:
+            POST body: NDJSON (application/x-ndjson), one generateInsuranceQuotes userData
+            document per line, with an optional id that is echoed back
+            { id: any, GENERAL: {...}, HEALTH: {...}, LIFE: {...} }
+
+        :return StreamingHttpResponse (application/x-ndjson), one line per input record, in order
+            { line: int, id: any, success: bool, error: string, data: object }
+            data = { LIFE:, HEALTH:, DISABILITY: } --> see generateInsuranceQuotes
+
+        Records are read, quoted and written BULK_QUOTES_CHUNK_SIZE at a time, so memory
+        stays the same however long the stream is. A bad record only fails its own line.
+    """
+    stream = request.stream
+    lines = iter(stream.readline, b'') if stream is not None else iter(())
+    response = StreamingHttpResponse(bulkQuoteChunks(lines, getattr(settings, 'BULK_QUOTES_CHUNK_SIZE', 500)),
+        content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-store'
+    return response
+
+def bulkQuoteChunks(lines, chunk_size):
+    """
+        :param lines: iterator of NDJSON input lines (bytes)
+        :return generator of NDJSON output, one string per chunk of records
+    """
+    chunk = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if (line):
+            chunk.append((number, line))
+        if (len(chunk) >= chunk_size):
+            yield bulkQuoteChunk(chunk)
+            chunk = []
+
+    if (chunk):
+        yield bulkQuoteChunk(chunk)
+
+def bulkQuoteChunk(chunk):
+    """
+        Quotes one chunk of records against the catalogs (no queries once they are loaded),
+        households that appear more than once in the chunk are only quoted once
+        :param chunk: [ (line number, line) ]
+        :return string, the NDJSON lines of the chunk
+    """
+    quoted = {}
+    output = []
+    for number, line in chunk:
+        result = { 'line': number, 'id': None, 'success': False, 'error': '', 'data': None }
+
+        try:
+            userData = json.loads(line.decode('utf-8'))
+        except ValueError:
+            userData = None
+            result['error'] = 'invalid JSON'
+
+        if (userData is not None and not isinstance(userData, dict)):
+            userData = None
+            result['error'] = 'record must be a JSON object'
+
+        if (userData is not None):
+            result['id'] = userData.pop('id', None)
+            missing = [key for key in ['GENERAL', 'HEALTH', 'LIFE'] if not isinstance(userData.get(key), dict)]
+
+            if (missing):
+                result['error'] = 'missing ' + missing[0]
+            else:
+                key = content_hash(userData)
+                if (key not in quoted):
+                    quoted[key] = bulkQuoteRecord(userData)
+                result['data'], result['error'] = quoted[key]
+                result['success'] = result['data'] is not None
+
+        output.append(json.dumps(result, cls=DjangoJSONEncoder) + '\n')
+
+    return ''.join(output)
+
+def bulkQuoteRecord(userData):
+    """
+        :return data, error --> data is None when the record can't be quoted
+    """
+    try:
+        return generateQuotesHelper(userData), ''
+    except KeyError as e:
+        return None, 'missing key ' + str(e.args[0])
+    except ObjectDoesNotExist as e:
+        return None, str(e)
+    except (TypeError, ValueError, AttributeError):
+        return None, 'invalid answers'
+
+def generateQuotesHelper(userData):
+    """
+        Computes the quotes of generateInsuranceQuotes, a pure function of userData and the
+        catalogs (no queries once they are loaded)
+        :param userData: the parsed userData dict, see generateInsuranceQuotes
+
+        :return dictionary data { LIFE:, HEALTH:, DISABILITY: }
+    """
+    general_post = userData['GENERAL']
+    life_post = userData['LIFE']
+    health_post = userData['HEALTH']
 
-            #save answers
-            general_obj = user_general_answers(**general_post)
+    life_obj = None
+    health_obj = None
+    general_obj = None
+    
+    user_kids_ages = []
+    is_married = False
+    num_kids = 0
+    age = 0
+    gender = 'male'
+
+    #get general answers
+    if (general_post != {}):
+        general_post['user_id'] = User()
         
-        #get life answers
-        if (life_post != {}):
-            life_post['user_id'] = User()
-            life_obj = user_life_answers(**life_post)
+        user_kids_ages = general_post['kid_ages']
+        del general_post['kid_ages']
+
+        #get number of kids
+        num_kids = asInt(general_post['num_kids'])
+        num_kids = min(num_kids, 2)
+
+        #save answers
+        general_obj = user_general_answers(**general_post)
+    
+    #get life answers
+    if (life_post != {}):
+        life_post['user_id'] = User()
+        life_obj = user_life_answers(**life_post)
+    
+    #get health answers
+    if (health_post != {}):
+        health_post['user_id'] = User()
+
+        #get every specific answer
+        for key in health_post:
+            if (key != 'user_id'):
+                if (health_post[key] not in ['', None]):
+                    #get id
+                    num = int(key[key.find('_')+1:])
+                    #get specific option, either by its position in the question or by its text
+                    health_post[key] = catalog.health_option(num, health_post[key])
+                else:
+                    health_post[key] = None
+                    
+        health_obj = user_health_questions_answer(**health_post)
+    
+    if (general_obj is not None):
+        if (general_obj.marital_status == 'married'):
+            is_married= True
         
-        #get health answers
-        if (health_post != {}):
-            health_post['user_id'] = User()
-
-            #get every specific answer
-            for key in health_post:
-                if (key != 'user_id'):
-                    if (len(health_post[key]) > 0):
-                        #get id
-                        num = int(key[key.find('_')+1:])
-                        #get specific option_id number
-                        # TODO: Make the value of health_post[q_#] be an int [0...2] and index into string array instead of passing
-                        # that long string value from the frontend
-                        health_post[key] = health_question_options.objects.get(health_question_id = num, option = health_post[key])
-                    else:
-                        health_post[key] = None
-                        
-            health_obj = user_health_questions_answer(**health_post)
+        #to query db have to map ages to these numbers
+        age = str(min([25, 35], key=lambda x:abs(x-int(general_obj.age))))
+        gender = general_obj.gender
         
-        if (general_obj is not None):
-            if (general_obj.marital_status == 'married'):
-                is_married= True
-            
-            #to query db have to map ages to these numbers
-            age = str(min([25, 35], key=lambda x:abs(x-int(general_obj.age))))
-            gender = general_obj.gender
-            
-            if gender is 'none' or gender is None:
-                gender = 'male'
+        if gender is 'none' or gender is None:
+            gender = 'male'
 
-        health_totals = health_questions.objects.all()
+    health_totals = catalog.health_denominators()
 
-        #run recommendation scripts
-        need_insurance, coverage_amount, term = life_insurance(life_obj, general_obj, user_kids_ages)
-        plan_type, deductible, critical_illness = health_insurance(health_totals, health_obj)
-        benefit_amount_d, duration_d, monthly_d = disability_rec(general_obj)
+    #run recommendation scripts
+    need_insurance, coverage_amount, term = life_insurance(life_obj, general_obj, user_kids_ages)
+    plan_type, deductible, critical_illness = health_insurance(health_totals, health_obj)
+    benefit_amount_d, duration_d, monthly_d = disability_rec(general_obj)
 
-        health_quote = {}
-        life_quote = {}
-        disability_quote = {}
+    health_quote = {}
+    life_quote = {}
+    disability_quote = {}
 
-        #get health rec
-        if (health_plan_costs.objects.filter(plan_type= plan_type, deductible_level = deductible, has_spouse= is_married, num_kids = num_kids).exists()):
-            health_quote = health_plan_costs.objects.filter(plan_type= plan_type, deductible_level = deductible, has_spouse= is_married, num_kids = num_kids)[0]
-            health_quote = model_to_dict(health_quote)
-            health_quote['deductible'] = num_to_usd(health_quote['deductible'])
+    #get health rec
+    health_plan = catalog.health_plan(plan_type, deductible, is_married, num_kids)
+    if (health_plan is not None):
+        health_quote = model_to_dict(health_plan)
+        health_quote['deductible'] = num_to_usd(health_quote['deductible'])
+    
+    #get life insurance rec
+    life_plan = catalog.life_plan(term, coverage_amount, gender, age)
+    if (life_plan is not None):
+        life_quote = model_to_dict(life_plan)
+        life_quote['policy_amount'] = abbrev_num_to_usd(life_quote['policy_amount'])
         
-        #get life insurance rec
-        if (life_plan_costs.objects.filter(policy_term = term, policy_amount = coverage_amount, gender = gender, age = age).exists()):
-            life_quote = life_plan_costs.objects.filter(policy_term = term, policy_amount = coverage_amount, gender = gender, age = age)[0]
-            life_quote = model_to_dict(life_quote)
-            life_quote['policy_amount'] = abbrev_num_to_usd(life_quote['policy_amount'])
-            
-        else: #return default value since no match found
-            need_insurance, coverage_amount, term = life_insurance(life_insurance_dict = None, general_questions_dict = general_obj, user_kids_age = user_kids_ages) 
-            life_quote = life_plan_costs.objects.filter(policy_term = term, policy_amount = coverage_amount, gender = 'female', age = 25)[0] 
-            life_quote = model_to_dict(life_quote)
+    else: #return default value since no match found
+        need_insurance, coverage_amount, term = life_insurance(life_insurance_dict = None, general_questions_dict = general_obj, user_kids_age = user_kids_ages) 
+        life_plan = catalog.life_plan(term, coverage_amount, 'female', 25)
+        if (life_plan is not None):
+            life_quote = model_to_dict(life_plan)
 
-        disability_quote = {'benefit_amount': abbrev_num_to_usd(benefit_amount_d), 'duration': duration_d, 'monthly': num_to_usd(monthly_d)}
-             
-        data = {'LIFE': life_quote, 'HEALTH': health_quote, 'DISABILITY': disability_quote}
+    disability_quote = {'benefit_amount': abbrev_num_to_usd(benefit_amount_d), 'duration': duration_d, 'monthly': num_to_usd(monthly_d)}
+         
+    data = {'LIFE': life_quote, 'HEALTH': health_quote, 'DISABILITY': disability_quote}
 
-        res['success'] = True
-        res['data'] = data
+    return data
+
+def getCachedQuotes(user, insurance_types, profile=None):
+    """
+    Gets insurance quotes for a user from userQuoteCache, computing the missing ones with
+    getQuoteHelper (sharing one UserProfile)
+    :param
+        user is User instance
+        insurance_types [ string ] of 'HEALTH', 'LIFE' or 'DISABILITY'
+        profile is an optional UserProfile of user
+
+    :return dictionary { insurance_type: data }, see getQuoteHelper
+    """
+    def compute(missing):
+        shared = profile if profile is not None else UserProfile(user)
+        return dict((insurance_type, getQuoteHelper(user, insurance_type, shared)) for insurance_type in missing)
+
+    return userQuoteCache.get_quotes(user.id, insurance_types, compute, catalogVersions())
 
-    return JsonResponse(res)
+def catalogVersions():
+    """
+        The version stamps every quote depends on besides the user's answers (one read of
+        the shared versions cache)
+    """
+    versions = catalog.read_versions()
+    return (versions[catalog.plans.key], versions[catalog.questions.key])
 
-def getQuoteHelper(user, insurance_type):
+def getQuoteHelper(user, insurance_type, profile=None):
     """
     Gets insurance quotes for a user based on a type
     :param 
         insurance_type 'HEALTH', 'LIFE' or 'DISABILITY'
         user is User instance 
+        profile is an optional UserProfile of user, pass one to share it between calls
 
     :return dictionary data
         data = {
@@ -779,43 +1192,34 @@ def getQuoteHelper(user, insurance_type):
         }
     """
 
-    health_info = None
-    life_info = None
-    gen_answers = None
+    if profile is None:
+        profile = UserProfile(user)
 
     is_married = False
     num_kids = 0
     age = 0
-    user_kids_age = []
 
     data = {}
     
-    #id the user id is present, then gets all the data form the database
-    if (user_general_answers.objects.filter(user_id=user).exists()):
-        gen_answers = user_general_answers.objects.get(user_id=user)
+    #gets all the data from the profile, which loads it from the database once
+    gen_answers = profile.general
+    if (gen_answers is not None):
         is_married = (gen_answers.marital_status == 'married')
         num_kids = min(gen_answers.num_kids, 2)
-        disability_info = user_general_answers.objects.filter(user_id=user.id).values('annual_income')[0]
         age = str(min([25, 35], key=lambda x:abs(x-gen_answers.age)))
         
-    if (user_health_questions_answer.objects.filter(user_id=user).exists()):
-        health_info = user_health_questions_answer.objects.get(user_id=user)
-        
-    if (user_life_answers.objects.filter(user_id=user).exists()):
-        life_info = user_life_answers.objects.filter(user_id=user.id)[0]    
-
-    if (user_kids.objects.filter(user_id=user).exists()):
-        user_kids_age = list(user_kids.objects.values_list('kid_age', flat = True).filter(user_id=user))
+    health_info = profile.health
+    life_info = profile.life
+    user_kids_age = profile.kid_ages if insurance_type == 'LIFE' else []
 
     if (insurance_type == 'HEALTH'):
-        health_totals = health_questions.objects.all()
+        health_totals = catalog.health_denominators()
         plan_type, deductible, critical_illness = health_insurance(health_totals, health_info)
         num_kids = min(num_kids, 2)
 
-        if (health_plan_costs.objects.filter(plan_type= plan_type, deductible_level = deductible, has_spouse= is_married, num_kids = num_kids).exists()):
-            health_quote = health_plan_costs.objects.filter(plan_type= plan_type, deductible_level = deductible, has_spouse= is_married, num_kids = num_kids)[0]
-            user_rec = user_recommendation(user_id=user, health_plan_id = health_quote)
-            user_rec.save()
+        health_quote = catalog.health_plan(plan_type, deductible, is_married, num_kids)
+        if (health_quote is not None):
+            profile.recommendation = recommendations.record(user.id, profile.recommendation, health_plan_id_id = health_quote.pk)
 
             data = model_to_dict(health_quote)
             data['deductible'] = num_to_usd(data['deductible'])
@@ -828,20 +1232,19 @@ def getQuoteHelper(user, insurance_type):
             if gender is not 'none' and gender is not None:
                 gender = gen_answers.gender
             
-        if (life_plan_costs.objects.filter(policy_term = term, policy_amount = coverage_amount, gender = gender, age = age).exists()):
-            life_quote = life_plan_costs.objects.filter(policy_term = term, policy_amount = coverage_amount, gender = gender, age = age)[0]
-            user_rec = user_recommendation(user_id=user, life_plan_id = life_quote)
-            user_rec.save()
+        life_quote = catalog.life_plan(term, coverage_amount, gender, age)
+        if (life_quote is not None):
+            profile.recommendation = recommendations.record(user.id, profile.recommendation, life_plan_id_id = life_quote.pk)
             data = model_to_dict(life_quote)
             data['policy_amount'] = abbrev_num_to_usd(data['policy_amount'])
         else:
             # Return default quote since no match found
             need_insurance, coverage_amount, term = life_insurance(life_insurance_dict = None, general_questions_dict = gen_answers, user_kids_age = user_kids_age) 
-            life_quote = life_plan_costs.objects.filter(policy_term = term, policy_amount = coverage_amount, gender = 'female', age = 25)[0]
-            user_rec = user_recommendation(user_id=user, life_plan_id = life_quote)
-            user_rec.save()
-            data = model_to_dict(life_quote)
-            data['policy_amount'] = abbrev_num_to_usd(data['policy_amount'])
+            life_quote = catalog.life_plan(term, coverage_amount, 'female', 25)
+            if (life_quote is not None):
+                profile.recommendation = recommendations.record(user.id, profile.recommendation, life_plan_id_id = life_quote.pk)
+                data = model_to_dict(life_quote)
+                data['policy_amount'] = abbrev_num_to_usd(data['policy_amount'])
 
     elif (insurance_type == 'DISABILITY'):
         benefit_amount_d, duration_d, monthly_d = disability_rec(gen_answers)
@@ -857,12 +1260,13 @@ def getQuoteHelper(user, insurance_type):
     return data    
 
 
-def getInsuranceInfoHelper(user, insuranceType):
+def getInsuranceInfoHelper(user, insuranceType, profile=None):
     """
         Gets insurance info for a user
         :param
             insuranceType = 'HEALTH' | 'LIFE' | 'DISABILITY'
             user = user object
+            profile = optional UserProfile of user, pass one to share it between calls
 
         :return JsonResponse
             { success: bool, error: string, data: object }
@@ -901,28 +1305,95 @@ def getInsuranceInfoHelper(user, insuranceType):
     """
 
 
+    if profile is None:
+        profile = UserProfile(user)
+
     data = {}
 
     if (insuranceType == 'HEALTH'):
-        answers_to_options = user_health_questions_answer.objects.get(user_id=user)
-        if (answers_to_options is not None):
-            fields = user_health_questions_answer._meta.get_fields()
-            for field in fields:
-                value = getattr(answers_to_options, field.name)       
-                if (value != None and isinstance(value, health_question_options)):
-                    data[field.name] = value.option
-                elif (value == None):
-                    data[field.name] = ""
+        answers_to_options = profile.health
+        for field in HEALTH_ANSWER_FIELDS:
+            value = getattr(answers_to_options, field) if answers_to_options is not None else None
+            if (value != None and isinstance(value, health_question_options)):
+                data[field] = value.option
+            elif (value == None):
+                data[field] = ""
 
     elif (insuranceType == 'LIFE'):
-        data = list(user_life_answers.objects.filter(user_id=user).values())
-        if len(data) > 0:
-            data = data[0]
+        if (profile.life is not None):
+            data = dict((field.attname, getattr(profile.life, field.attname)) for field in user_life_answers._meta.concrete_fields)
     
     elif (insuranceType == 'DISABILITY'):
-        data = list(user_general_answers.objects.filter(user_id=user).values('annual_income'))
-        if len(data) > 0:
-            data = data[0]
+        if (profile.general is not None):
+            data = {'annual_income': profile.general.annual_income}
 
     data.pop('user_id_id', None)
     return data
+
+
+@api_view(['GET'])
+@authentication_classes((CachedTokenAuthentication,))
+@permission_classes((IsAdminUser,))
+def exportAnswers(request):
+    """
+        Streams every user's answers and recommended plans (admin only), see app/scripts/export.py
+        :param request:
+            { GET: { fileType: 'csv' | 'ndjson', sinceId: int, since: ISO date or datetime } }
+            (not format, DRF reserves that for content negotiation)
+            all optional, sinceId --> only users with a greater id,
+            since --> only users who joined at or after it
+
+        :return StreamingHttpResponse, csv (with a header line) or ndjson, one line per user
+            ordered by user id: user_id, username, date_joined, the general and life answers,
+            q_N health answers as option text, recommended_health_plan_id,
+            recommended_life_plan_id, recommended_disability_plan_id
+            or JsonResponse { success: False, error: string, data: None } for bad parameters
+    """
+    res = { 'success': False, 'error': '', 'data': None }
+    format = request.GET.get('fileType', 'csv')
+    since_id = request.GET.get('sinceId')
+    since = request.GET.get('since')
+
+    if (format not in export.FORMATS):
+        res['error'] = 'invalid fileType'
+    elif (since_id is not None and not since_id.isdigit()):
+        res['error'] = 'invalid sinceId'
+    elif (since is not None and export.parse_since(since) is None):
+        res['error'] = 'invalid since'
+    else:
+        rows = export.export_rows(int(since_id) if since_id is not None else None,
+            export.parse_since(since) if since is not None else None)
+        response = StreamingHttpResponse(export.export_lines(rows, format),
+            content_type='text/csv' if format == 'csv' else 'application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="answers.%s"' % format
+        return response
+
+    return render_response(request, res)
+
+
+@api_view(['GET'])
+@authentication_classes((CachedTokenAuthentication,))
+@permission_classes((IsAdminUser,))
+def getMetrics(request):
+    """
+        Gets the cache counters of the worker that serves the request (admin only)
+        :param request:
+
+        :return JsonResponse
+            { success: bool, error: string, data: object }
+            data = {
+                catalog: { hits:, misses:, reloads:, version: },
+                quotes: { size:, maxsize:, hits:, misses:, evictions:, hit_ratio:, saved: }
+                    --> generateInsuranceQuotes response cache, saved is compute time in seconds
+                user_quotes: { alias:, hits:, misses:, hit_ratio: },
+                recommendations: { pending:, flushes: } --> write-behind buffer
+                auth: { size:, maxsize:, hits:, misses:, evictions:, hit_ratio: } --> token lookups
+                password_hashing: { workers:, queue_size:, completed:, rejected: }
+            }
+    """
+    res = { 'success': True, 'error': '', 'data': None }
+    res['data'] = {'catalog': catalog.catalog_stats(), 'quotes': quoteCache.stats(), 'user_quotes': userQuoteCache.stats(),
+        'recommendations': recommendations.buffer.stats(), 'auth': tokenCache.stats(),
+        'password_hashing': passwordPool.stats()}
+
+    return render_response(request, res)
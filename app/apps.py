@@ -1,5 +1,19 @@
 from django.apps import AppConfig
+from django.core.signals import request_started, request_finished
+from django.db.models.signals import post_save, post_delete
 
 
 class AppConfig(AppConfig):
     name = 'app'
+
+    def ready(self):
+        # invalidate the in-process catalogs whenever a rate or question table changes
+        from app.scripts import catalog
+        receivers = [(model, catalog.plans.invalidate) for model in catalog.CATALOG_MODELS]
+        receivers += [(model, catalog.questions.invalidate) for model in catalog.QUESTION_MODELS]
+        for model, receiver in receivers:
+            post_save.connect(receiver, sender=model, weak=False, dispatch_uid='catalog_save_' + model.__name__)
+            post_delete.connect(receiver, sender=model, weak=False, dispatch_uid='catalog_delete_' + model.__name__)
+        # the catalog version stamps are read once per request
+        request_started.connect(catalog.start_request, dispatch_uid='catalog_start_request')
+        request_finished.connect(catalog.finish_request, dispatch_uid='catalog_finish_request')
@@ -0,0 +1,41 @@
+"""
+	collapse_profiles: merges the request profiles in PROFILE_DIR (see api/profiling.py)
+	into one collapsed-stack file, weights in microseconds (see app/scripts/flamegraph.py)
+
+	The output feeds flamegraph.pl (flamegraph.pl profiles.collapsed > profiles.svg),
+	inferno or speedscope.
+
+	usage: python manage.py collapse_profiles [--dir path] [--url-name getAllInsuranceQuotes ...]
+		[--mode sampling|deterministic] [--output profiles.collapsed]
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.scripts.flamegraph import MODES, collapse_profiles, collapsed_lines
+
+
+class Command(BaseCommand):
+	help = 'Merges request profiles into a collapsed-stack file for flame graphs'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--dir', default=None, help='profile directory, PROFILE_DIR by default')
+		parser.add_argument('--url-name', action='append', default=[], help='only the profiles of this endpoint')
+		parser.add_argument('--mode', choices=MODES, default=None, help='only the profiles taken with this profiler')
+		parser.add_argument('--output', default=None, help='file to write instead of stdout')
+
+	def handle(self, *args, **options):
+		directory = options['dir'] or settings.PROFILE_DIR
+		count, stacks = collapse_profiles(directory, options['url_name'], options['mode'])
+		if not count:
+			raise CommandError('No matching profiles in ' + directory)
+
+		lines = collapsed_lines(stacks)
+		if options['output']:
+			with open(options['output'], 'w') as out:
+				out.writelines(lines)
+		else:
+			for line in lines:
+				self.stdout.write(line, ending='')
+
+		self.stderr.write('collapsed %d profiles, %d stacks' % (count, len(lines)))
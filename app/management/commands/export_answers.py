@@ -0,0 +1,51 @@
+"""
+	export_answers: streams every user's general, life and health answers and recommended
+	plans as CSV or NDJSON (see app/scripts/export.py)
+
+	For incremental exports pass the last exported id (printed on stderr when the export
+	finishes) as --since-id, or a date_joined lower bound as --since.
+
+	usage: python manage.py export_answers [--format csv|ndjson] [--since-id N]
+		[--since 2018-04-01[T12:00:00]] [--chunk-size 1000] [--output path]
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.scripts.export import FORMATS, export_lines, export_rows, parse_since
+
+
+class Command(BaseCommand):
+	help = 'Exports user answers and recommendations as CSV or NDJSON'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--format', choices=FORMATS, default='csv')
+		parser.add_argument('--since-id', type=int, default=None, help='only users with a greater id')
+		parser.add_argument('--since', default=None, help='only users who joined at or after this ISO date or datetime')
+		parser.add_argument('--chunk-size', type=int, default=1000, help='users per query')
+		parser.add_argument('--output', default=None, help='file to write instead of stdout')
+
+	def handle(self, *args, **options):
+		since = None
+		if options['since'] is not None:
+			since = parse_since(options['since'])
+			if since is None:
+				raise CommandError('Invalid --since ' + options['since'] + ', expected an ISO date or datetime')
+
+		exported = [0, options['since_id']]
+		def counted(rows):
+			for row in rows:
+				exported[0] += 1
+				exported[1] = row[0]
+				yield row
+
+		rows = counted(export_rows(options['since_id'], since, max(1, options['chunk_size'])))
+		lines = export_lines(rows, options['format'])
+		if options['output']:
+			with open(options['output'], 'w', newline='') as out:
+				out.writelines(lines)
+		else:
+			for line in lines:
+				self.stdout.write(line, ending='')
+
+		# on stderr so it never ends up in the export itself
+		self.stderr.write('exported %d users, last id %s' % tuple(exported))
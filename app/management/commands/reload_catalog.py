@@ -0,0 +1,26 @@
+"""
+	reload_catalog: invalidates the cached plan catalogs and health scoring tables in every worker
+
+	usage: python manage.py reload_catalog [--stats]
+"""
+
+from django.core.management.base import BaseCommand
+
+from app.scripts import catalog
+
+
+class Command(BaseCommand):
+	help = 'Bumps the catalog versions so every worker reloads its rate and question tables'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--stats', action='store_true', help='only print this process\'s catalog counters')
+
+	def handle(self, *args, **options):
+		if not options['stats']:
+			version = catalog.plans.bump()
+			catalog.questions.bump()
+			plans = catalog.get_catalog()
+			self.stdout.write('catalog version %s: %d health, %d life, %d disability plans' % (
+				version, len(plans.health), len(plans.life), len(plans.disability)))
+
+		self.stdout.write(str(catalog.catalog_stats()))
@@ -0,0 +1,145 @@
+"""
+	requote: re-scores users and refreshes user_recommendation in bulk
+
+	Users are streamed in primary key chunks, scored across a process pool with the batch
+	engine (see app/scripts/bulk_quotes.py) and written back with batched upserts. After
+	every chunk the last written user id goes to a checkpoint file, so a killed run picks
+	up where it stopped with --resume. At most 2 chunks per worker are in flight, which
+	caps memory no matter how many users there are.
+
+	usage: python manage.py requote [--start-id N] [--end-id N] [--filter field=value ...]
+		[--chunk-size 1000] [--workers 4] [--checkpoint path] [--resume] [--dry-run]
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from app.models import user_recommendation
+from app.scripts.bulk_quotes import QuoteTables, load_user_columns, score_households
+from app.scripts.recommendations import apply_changes, changed_columns
+
+DEFAULT_CHECKPOINT = 'requote.checkpoint.json'
+
+# set in every worker by _init_worker
+_tables = None
+
+def _init_worker(tables):
+	global _tables
+	_tables = tables
+
+def _score_chunk(columns):
+	health_plan_ids, life_plan_ids = score_households(_tables, columns)
+	return [int(user_id) for user_id in columns['user_id']], health_plan_ids, life_plan_ids
+
+
+def write_recommendations(user_ids, health_plan_ids, life_plan_ids):
+	"""
+		Upserts the recommendations of a chunk of users, only touching rows that changed
+		:return number of rows inserted or updated
+	"""
+	existing = dict((row.user_id_id, row) for row in user_recommendation.objects.filter(user_id__in=user_ids).only(
+		'user_id', 'health_plan_id', 'life_plan_id'))
+
+	changes = {}
+	for user_id, health_plan_id, life_plan_id in zip(user_ids, health_plan_ids, life_plan_ids):
+		current = existing.get(user_id)
+		# keep the stored plans when a quote could not be computed, like the quote endpoints
+		if current is not None:
+			if health_plan_id is None:
+				health_plan_id = current.health_plan_id_id
+			if life_plan_id is None:
+				life_plan_id = current.life_plan_id_id
+		columns = changed_columns(current, health_plan_id_id=health_plan_id, life_plan_id_id=life_plan_id)
+		if columns:
+			changes[user_id] = columns
+
+	return apply_changes(changes)
+
+
+class Command(BaseCommand):
+	help = 'Recomputes the recommended health and life plans of every (or some) users in bulk'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--start-id', type=int, default=None, help='first user id to requote')
+		parser.add_argument('--end-id', type=int, default=None, help='last user id to requote')
+		parser.add_argument('--filter', action='append', default=[], metavar='FIELD=VALUE',
+			help='extra User queryset filter, e.g. is_active=True or user_general_answers__marital_status=married')
+		parser.add_argument('--chunk-size', type=int, default=1000)
+		parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+		parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help='progress file used by --resume')
+		parser.add_argument('--resume', action='store_true', help='continue after the last user in the checkpoint')
+		parser.add_argument('--dry-run', action='store_true', help='score users without writing anything')
+
+	def handle(self, *args, **options):
+		users = User.objects.order_by('pk')
+		if options['start_id'] is not None:
+			users = users.filter(pk__gte=options['start_id'])
+		if options['end_id'] is not None:
+			users = users.filter(pk__lte=options['end_id'])
+		for condition in options['filter']:
+			if '=' not in condition:
+				raise CommandError('Invalid filter ' + condition + ', expected FIELD=VALUE')
+			field, value = condition.split('=', 1)
+			users = users.filter(**{field: {'True': True, 'False': False}.get(value, value)})
+		if options['filter']:
+			# filters across user_kids or other multi-valued joins repeat users
+			users = users.distinct()
+
+		checkpoint = options['checkpoint']
+		last_id = None
+		done = 0
+		if options['resume'] and os.path.exists(checkpoint):
+			with open(checkpoint) as f:
+				state = json.load(f)
+			last_id = state['last_id']
+			done = state['rows']
+			self.stdout.write('resuming after user %d (%d users already requoted)' % (last_id, done))
+
+		resumed = done
+		tables = QuoteTables.current()
+		workers = max(1, options['workers'])
+		chunk_size = options['chunk_size']
+
+		# workers are forked, they must not share the parent's database connections
+		connections.close_all()
+		pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(tables,))
+		pending = deque()
+		written = 0
+		start = time.time()
+
+		try:
+			while True:
+				chunk = users if last_id is None else users.filter(pk__gt=last_id)
+				user_ids = list(chunk.values_list('pk', flat=True)[:chunk_size])
+				if user_ids:
+					last_id = user_ids[-1]
+					pending.append(pool.apply_async(_score_chunk, (load_user_columns(user_ids, tables.option_positions),)))
+
+				# drain in submission order so the checkpoint only ever moves past written chunks
+				while pending and (len(pending) >= 2 * workers or not user_ids):
+					chunk_user_ids, health_plan_ids, life_plan_ids = pending.popleft().get()
+					if not options['dry_run']:
+						written += write_recommendations(chunk_user_ids, health_plan_ids, life_plan_ids)
+						with open(checkpoint, 'w') as f:
+							json.dump({'last_id': chunk_user_ids[-1], 'rows': done + len(chunk_user_ids)}, f)
+					done += len(chunk_user_ids)
+					elapsed = time.time() - start
+					self.stdout.write('requoted users up to %d: %d users, %d rows written, %.0f users/sec' % (
+						chunk_user_ids[-1], done, written, (done - resumed) / elapsed if elapsed else 0))
+
+				if not user_ids:
+					break
+		finally:
+			pool.terminate()
+			pool.join()
+
+		if not options['dry_run'] and os.path.exists(checkpoint):
+			os.remove(checkpoint)
+		self.stdout.write('done: %d users, %d rows written in %.1fs' % (done, written, time.time() - start))
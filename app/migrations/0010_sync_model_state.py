@@ -0,0 +1,319 @@
+# Generated by Django 2.0.2 on 2018-05-01 12:00
+"""
+    Brings the migration state in line with app/models.py. The schema changes below were
+    made to the production database by hand while 0001-0009 fell behind the models, so
+    depending on the database they are either already there or still to be made.
+
+    Upgrade notes
+    - Databases that already have the models' schema (production: health_plan_costs.has_spouse
+      and the other columns added below exist): 0010 only records the new state, no table
+      is touched and no data is dropped.
+    - Databases built by 0001-0009 alone (a fresh `migrate`): the operations run as written,
+      including the RemoveFields (health_plan_costs.is_just_me/is_me_spouse/is_me_spouse_kid/
+      is_me_spouse_two_kids, user_general_answers.health, user_health_questions_answer.q_3/q_4,
+      user_recommendation.recommendation_id). The models never read those columns, but back
+      up any such database you care about first.
+    - A database with only some of the added columns stops the migration with an error;
+      reconcile it by hand (compare with `manage.py sqlmigrate app 0010`), then rerun.
+    - Unapplying 0010 only rewinds the state, the tables are left as they are.
+"""
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# (table, column) the operations add, all present --> the database already has the schema
+ADDED_COLUMNS = [('app_life_questions', 'life_question_id'), ('app_disability_plan_costs', 'salary'),
+    ('app_health_plan_costs', 'has_spouse'), ('app_health_plan_costs', 'num_kids'), ('app_user_general_answers', 'gender'),
+    ('app_user_general_answers', 'health_condition'), ('app_user_general_answers', 'spouse_age')]
+
+
+def has_model_schema(connection):
+    """
+        :return True when the database already has the schema of the operations, False
+            when it has none of it
+    """
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        columns = dict((table, [column.name for column in connection.introspection.get_table_description(cursor, table)])
+            for table in set(table for table, column in ADDED_COLUMNS) & tables)
+    present = [column in columns.get(table, []) for table, column in ADDED_COLUMNS]
+    if all(present):
+        return True
+    if not any(present):
+        return False
+    raise RuntimeError('The app tables have only part of the schema of migration 0010, reconcile them by hand '
+        '(see the upgrade notes in app/migrations/0010_sync_model_state.py)')
+
+
+class SyncModelState(migrations.SeparateDatabaseAndState):
+    """
+        Runs the operations on databases that don't have their schema yet, only records
+        the state everywhere else
+    """
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not has_model_schema(schema_editor.connection):
+            super(SyncModelState, self).database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        pass
+
+
+OPERATIONS = [
+    migrations.CreateModel(
+        name='life_questions',
+        fields=[
+            ('life_question_id', models.IntegerField(primary_key=True, serialize=False)),
+            ('question', models.CharField(max_length=500)),
+        ],
+    ),
+    migrations.RemoveField(
+        model_name='health_plan_costs',
+        name='is_just_me',
+    ),
+    migrations.RemoveField(
+        model_name='health_plan_costs',
+        name='is_me_spouse',
+    ),
+    migrations.RemoveField(
+        model_name='health_plan_costs',
+        name='is_me_spouse_kid',
+    ),
+    migrations.RemoveField(
+        model_name='health_plan_costs',
+        name='is_me_spouse_two_kids',
+    ),
+    migrations.RemoveField(
+        model_name='user_general_answers',
+        name='health',
+    ),
+    migrations.RemoveField(
+        model_name='user_health_questions_answer',
+        name='q_3',
+    ),
+    migrations.RemoveField(
+        model_name='user_health_questions_answer',
+        name='q_4',
+    ),
+    migrations.RemoveField(
+        model_name='user_recommendation',
+        name='recommendation_id',
+    ),
+    migrations.AddField(
+        model_name='disability_plan_costs',
+        name='salary',
+        field=models.IntegerField(default=0),
+    ),
+    migrations.AddField(
+        model_name='health_plan_costs',
+        name='has_spouse',
+        field=models.BooleanField(default=False),
+    ),
+    migrations.AddField(
+        model_name='health_plan_costs',
+        name='num_kids',
+        field=models.IntegerField(default=0),
+    ),
+    migrations.AddField(
+        model_name='user_general_answers',
+        name='gender',
+        field=models.CharField(choices=[('male', 'male'), ('female', 'female'), ('none', 'none')], max_length=20, null=True),
+    ),
+    migrations.AddField(
+        model_name='user_general_answers',
+        name='health_condition',
+        field=models.CharField(choices=[('excellent', 'excellent'), ('good', 'good'), ('meh', 'meh'), ('poor', 'poor')], default='good', max_length=9),
+    ),
+    migrations.AddField(
+        model_name='user_general_answers',
+        name='spouse_age',
+        field=models.IntegerField(default=0),
+    ),
+    migrations.AlterField(
+        model_name='disability_plan_costs',
+        name='benefit_amount',
+        field=models.CharField(max_length=10),
+    ),
+    migrations.AlterField(
+        model_name='disability_plan_costs',
+        name='gender',
+        field=models.CharField(choices=[('male', 'male'), ('female', 'female'), ('none', 'none')], max_length=30),
+    ),
+    migrations.AlterField(
+        model_name='health_questions',
+        name='HMO_total',
+        field=models.FloatField(),
+    ),
+    migrations.AlterField(
+        model_name='health_questions',
+        name='HSA_total',
+        field=models.FloatField(),
+    ),
+    migrations.AlterField(
+        model_name='health_questions',
+        name='PPO_total',
+        field=models.FloatField(),
+    ),
+    migrations.AlterField(
+        model_name='health_questions',
+        name='critical_illness_accident_policy_total',
+        field=models.FloatField(),
+    ),
+    migrations.AlterField(
+        model_name='health_questions',
+        name='health_question_id',
+        field=models.FloatField(primary_key=True, serialize=False),
+    ),
+    migrations.AlterField(
+        model_name='health_questions',
+        name='high_deductible_total',
+        field=models.FloatField(),
+    ),
+    migrations.AlterField(
+        model_name='health_questions',
+        name='low_deductible_total',
+        field=models.FloatField(),
+    ),
+    migrations.AlterField(
+        model_name='life_plan_costs',
+        name='gender',
+        field=models.CharField(choices=[('male', 'male'), ('female', 'female'), ('none', 'none')], max_length=8),
+    ),
+    migrations.AlterField(
+        model_name='user_general_answers',
+        name='age',
+        field=models.IntegerField(default=0),
+    ),
+    migrations.AlterField(
+        model_name='user_general_answers',
+        name='annual_income',
+        field=models.IntegerField(default=0),
+    ),
+    migrations.AlterField(
+        model_name='user_general_answers',
+        name='marital_status',
+        field=models.CharField(choices=[('single', 'single'), ('married', 'married'), ('divorced', 'divorced'), ('widowed', 'widowed')], default='single', max_length=8),
+    ),
+    migrations.AlterField(
+        model_name='user_general_answers',
+        name='num_kids',
+        field=models.IntegerField(default=0),
+    ),
+    migrations.AlterField(
+        model_name='user_general_answers',
+        name='spouse_annual_income',
+        field=models.IntegerField(default=0),
+    ),
+    migrations.AlterField(
+        model_name='user_general_answers',
+        name='zipcode',
+        field=models.IntegerField(default=0),
+    ),
+    migrations.AlterField(
+        model_name='user_health_questions_answer',
+        name='q_1',
+        field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+    ),
+    migrations.AlterField(
+        model_name='user_health_questions_answer',
+        name='q_10',
+        field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+    ),
+    migrations.AlterField(
+        model_name='user_health_questions_answer',
+        name='q_11',
+        field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+    ),
+    migrations.AlterField(
+        model_name='user_health_questions_answer',
+        name='q_12',
+        field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+    ),
+    migrations.AlterField(
+        model_name='user_health_questions_answer',
+        name='q_2',
+        field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+    ),
+    migrations.AlterField(
+        model_name='user_health_questions_answer',
+        name='q_5',
+        field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+    ),
+    migrations.AlterField(
+        model_name='user_health_questions_answer',
+        name='q_6',
+        field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+    ),
+    migrations.AlterField(
+        model_name='user_health_questions_answer',
+        name='q_7',
+        field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+    ),
+    migrations.AlterField(
+        model_name='user_health_questions_answer',
+        name='q_8',
+        field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+    ),
+    migrations.AlterField(
+        model_name='user_health_questions_answer',
+        name='q_9',
+        field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+    ),
+    migrations.AlterField(
+        model_name='user_kids',
+        name='kid',
+        field=models.AutoField(primary_key=True, serialize=False),
+    ),
+    migrations.AlterField(
+        model_name='user_life_answers',
+        name='balance_investings_savings',
+        field=models.IntegerField(default=0),
+    ),
+    migrations.AlterField(
+        model_name='user_life_answers',
+        name='existing_life_insurance',
+        field=models.IntegerField(default=0),
+    ),
+    migrations.AlterField(
+        model_name='user_life_answers',
+        name='mortgage_balance',
+        field=models.IntegerField(default=0),
+    ),
+    migrations.AlterField(
+        model_name='user_life_answers',
+        name='other_debts_balance',
+        field=models.IntegerField(default=0),
+    ),
+    migrations.AlterField(
+        model_name='user_recommendation',
+        name='disability_plan_id',
+        field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, to='app.disability_plan_costs'),
+    ),
+    migrations.AlterField(
+        model_name='user_recommendation',
+        name='health_plan_id',
+        field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, to='app.health_plan_costs'),
+    ),
+    migrations.AlterField(
+        model_name='user_recommendation',
+        name='life_plan_id',
+        field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, to='app.life_plan_costs'),
+    ),
+    migrations.AlterField(
+        model_name='user_recommendation',
+        name='user_id',
+        field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL),
+    ),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app', '0009_auto_20180330_1937'),
+    ]
+
+    operations = [
+        SyncModelState(database_operations=OPERATIONS, state_operations=OPERATIONS),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.0.2 on 2018-05-01 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_sync_model_state'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user_recommendation',
+            name='disability_plan_id',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='app.disability_plan_costs'),
+        ),
+        migrations.AlterField(
+            model_name='user_recommendation',
+            name='health_plan_id',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='app.health_plan_costs'),
+        ),
+        migrations.AlterField(
+            model_name='user_recommendation',
+            name='life_plan_id',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='app.life_plan_costs'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.0.2 on 2018-05-01 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_user_recommendation_plan_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='health_plan_costs',
+            index=models.Index(fields=['plan_type', 'deductible_level', 'has_spouse', 'num_kids'], name='health_plan_lookup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='life_plan_costs',
+            index=models.Index(fields=['policy_term', 'policy_amount', 'gender', 'age'], name='life_plan_lookup_idx'),
+        ),
+    ]
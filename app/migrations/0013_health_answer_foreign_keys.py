@@ -0,0 +1,64 @@
+# Generated by Django 2.0.2 on 2018-05-01 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_plan_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user_health_questions_answer',
+            name='q_1',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+        ),
+        migrations.AlterField(
+            model_name='user_health_questions_answer',
+            name='q_10',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+        ),
+        migrations.AlterField(
+            model_name='user_health_questions_answer',
+            name='q_11',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+        ),
+        migrations.AlterField(
+            model_name='user_health_questions_answer',
+            name='q_12',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+        ),
+        migrations.AlterField(
+            model_name='user_health_questions_answer',
+            name='q_2',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+        ),
+        migrations.AlterField(
+            model_name='user_health_questions_answer',
+            name='q_5',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+        ),
+        migrations.AlterField(
+            model_name='user_health_questions_answer',
+            name='q_6',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+        ),
+        migrations.AlterField(
+            model_name='user_health_questions_answer',
+            name='q_7',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+        ),
+        migrations.AlterField(
+            model_name='user_health_questions_answer',
+            name='q_8',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+        ),
+        migrations.AlterField(
+            model_name='user_health_questions_answer',
+            name='q_9',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.health_question_options'),
+        ),
+    ]
@@ -89,6 +89,12 @@ class health_plan_costs(models.Model):
 	has_spouse = models.BooleanField(default = False);
 	num_kids = models.IntegerField(default = 0)
 
+	class Meta:
+		# matches the quote lookup, see app/scripts/catalog.py
+		indexes = [
+			models.Index(fields = ['plan_type', 'deductible_level', 'has_spouse', 'num_kids'], name = 'health_plan_lookup_idx')
+		]
+
 class life_plan_costs(models.Model):
 	age_options = (
 		('25', '25 year old healthy'),
@@ -102,6 +108,12 @@ class life_plan_costs(models.Model):
 	age = models.CharField(max_length = 20, choices = age_options)
 	monthly = models.IntegerField();
 
+	class Meta:
+		# matches the quote lookup, see app/scripts/catalog.py
+		indexes = [
+			models.Index(fields = ['policy_term', 'policy_amount', 'gender', 'age'], name = 'life_plan_lookup_idx')
+		]
+
 class disability_plan_costs(models.Model):
 	age_options = (
 		('25', '25 year old office worker'),
@@ -121,17 +133,17 @@ class user_recommendation(models.Model):
 		primary_key = True,
 		on_delete = models.CASCADE,
 	)
-	health_plan_id = models.OneToOneField(
+	health_plan_id = models.ForeignKey(
 		health_plan_costs,
 		on_delete = models.CASCADE,
 		null = True
 	)
-	disability_plan_id = models.OneToOneField(
+	disability_plan_id = models.ForeignKey(
 		disability_plan_costs,
 		on_delete = models.CASCADE,
 		null = True
 	)
-	life_plan_id = models.OneToOneField(
+	life_plan_id = models.ForeignKey(
 		life_plan_costs,
 		on_delete = models.CASCADE,
 		null = True
@@ -172,20 +184,16 @@ class user_health_questions_answer(models.Model):
 		on_delete = models.CASCADE,
 		primary_key = True
 	)
-	q_1 = models.OneToOneField(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
-	q_2 = models.OneToOneField(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
-	q_5 = models.OneToOneField(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
-	q_6 = models.OneToOneField(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
-	q_7 = models.OneToOneField(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
-	q_8 = models.OneToOneField(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
-	q_9 = models.OneToOneField(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
-	q_10 = models.OneToOneField(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
-	q_11 = models.OneToOneField(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
-	q_12 = models.OneToOneField(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
-
-
-
-
-
-
-
+	q_1 = models.ForeignKey(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
+	q_2 = models.ForeignKey(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
+	q_5 = models.ForeignKey(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
+	q_6 = models.ForeignKey(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
+	q_7 = models.ForeignKey(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
+	q_8 = models.ForeignKey(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
+	q_9 = models.ForeignKey(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
+	q_10 = models.ForeignKey(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
+	q_11 = models.ForeignKey(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
+	q_12 = models.ForeignKey(health_question_options, related_name = '+', null = True, on_delete = models.CASCADE)
+
+# the q_N fields of user_health_questions_answer, in declaration order
+HEALTH_ANSWER_FIELDS = tuple(field.name for field in user_health_questions_answer._meta.fields if field.name.startswith('q_'))
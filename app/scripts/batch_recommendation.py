@@ -0,0 +1,193 @@
+"""
+	batch_recommendation.py: vectorized versions of the recommendation logic
+
+	life_insurance, health_insurance and disability_rec in recommendation_logic.py score one
+	household at a time through model instances. The functions below take columnar numpy
+	arrays (one entry per household) and return arrays, so whole populations can be
+	re-scored when actuarial parameters change. Every output matches the scalar functions
+	exactly, including their rounding and tie breaking (see app/tests.py).
+"""
+
+import numpy as np
+
+from app.models import HEALTH_ANSWER_FIELDS
+
+# the list life_insurance snaps coverage amounts onto
+COVERAGE_AMOUNTS = np.array([250000, 300000, 350000, 400000, 450000, 500000, 600000, 700000])
+LIFE_TERM = 20
+ESTIMATE_COLLEGE_EXPENSES = 50000
+
+DISABILITY_DURATION = 65
+
+# the question ids of user_health_questions_answer in field order, which is also the order
+# health_insurance sums them in --> column order of the health answer matrix
+HEALTH_QUESTION_IDS = tuple(int(field[2:]) for field in HEALTH_ANSWER_FIELDS)
+
+# catalog ages the quote lookups snap a user's age onto
+CATALOG_AGES = (25, 35)
+
+
+def min_kid_ages(kid_ages):
+	"""
+		Collapses ragged kid ages into the column life_insurance uses
+		:param kid_ages: [ [int] ] --> kid ages of every household
+		:return int array --> youngest kid per household, 0 when there are no kids
+	"""
+	return np.array([min(ages) if len(ages) > 0 else 0 for ages in kid_ages], dtype=np.int64)
+
+def catalog_ages(ages):
+	"""
+		Snaps ages onto the catalog's age buckets the same way the quote lookups do
+		:return int array of 25 or 35
+	"""
+	ages = np.asarray(ages, dtype=np.int64)
+	young, old = CATALOG_AGES
+	return np.where(np.abs(young - ages) <= np.abs(old - ages), young, old)
+
+
+def batch_life_insurance(married, num_kids, annual_income, has_life_answers=None, min_kid_age=None,
+		other_debts_balance=None, existing_life_insurance=None, balance_investings_savings=None):
+	"""
+		Vectorized life_insurance
+		:param
+			married = bool array --> marital_status == 'married'
+			num_kids, annual_income = int arrays from user_general_answers
+			has_life_answers = bool array --> False where the household has no user_life_answers
+				(defaults to all False, i.e. the 10x income rule)
+			min_kid_age = int array, see min_kid_ages()
+			other_debts_balance, existing_life_insurance, balance_investings_savings = int arrays
+				from user_life_answers, only read where has_life_answers is True
+
+		:return need_insurance (bool array), coverage_amount (int array), term (int array)
+	"""
+	married = np.asarray(married, dtype=bool)
+	num_kids = np.asarray(num_kids, dtype=np.int64)
+	annual_income = np.asarray(annual_income, dtype=np.int64)
+	size = len(annual_income)
+	zeros = np.zeros(size, dtype=np.int64)
+
+	if has_life_answers is None:
+		has_life_answers = np.zeros(size, dtype=bool)
+	has_life_answers = np.asarray(has_life_answers, dtype=bool)
+	min_kid_age = zeros if min_kid_age is None else np.asarray(min_kid_age, dtype=np.int64)
+	other_debts_balance = zeros if other_debts_balance is None else np.asarray(other_debts_balance, dtype=np.int64)
+	existing_life_insurance = zeros if existing_life_insurance is None else np.asarray(existing_life_insurance, dtype=np.int64)
+	balance_investings_savings = zeros if balance_investings_savings is None else np.asarray(balance_investings_savings, dtype=np.int64)
+
+	need_insurance = married | (num_kids > 0)
+
+	# same operation order as the scalar version so the floats round identically
+	needs_based = (annual_income * (22 - min_kid_age) * .03 + other_debts_balance
+		+ ESTIMATE_COLLEGE_EXPENSES * 4 * num_kids - (existing_life_insurance - balance_investings_savings))
+	coverage_amount = np.where(has_life_answers, needs_based, 10 * annual_income)
+
+	# argmin keeps the first of two equally close amounts, like min(list, key=...)
+	distance = np.abs(COVERAGE_AMOUNTS[np.newaxis, :] - coverage_amount[:, np.newaxis])
+	coverage_amount_final = COVERAGE_AMOUNTS[np.argmin(distance, axis=1)]
+
+	return need_insurance, coverage_amount_final, np.full(size, LIFE_TERM, dtype=np.int64)
+
+
+class HealthOptionTable(object):
+	"""
+		Per question arrays of the option scores, indexed by option position
+		:param positions: { question_id: (health_question_options, ...) }, see catalog.QuestionSnapshot
+	"""
+	SCORES = ('HMO', 'PPO', 'HSA', 'high_deductible', 'low_deductible', 'critical_illness')
+
+	def __init__(self, positions):
+		self.scores = {}
+		self.texts = []
+		for question_id in HEALTH_QUESTION_IDS:
+			options = positions.get(question_id, ())
+			# a trailing zero row is what unanswered (-1) positions index into
+			table = np.zeros((len(options) + 1, len(self.SCORES)))
+			for i, option in enumerate(options):
+				table[i] = [float(getattr(option, score)) for score in self.SCORES]
+			self.scores[question_id] = table
+			self.texts.append(np.array([option.option for option in options] + [None], dtype=object))
+
+	def matches(self, answers, question_id, texts):
+		"""
+			:return bool array --> the answer to question_id is one of texts
+		"""
+		column = HEALTH_QUESTION_IDS.index(question_id)
+		return np.isin(self.texts[column][answers[:, column]], list(texts))
+
+
+def batch_health_insurance(answers, denominators, options, has_health_answers=None):
+	"""
+		Vectorized health_insurance
+		:param
+			answers = int matrix (households x HEALTH_QUESTION_IDS) of option positions,
+				-1 where a question was not answered
+			denominators = health_insurance_totals() output, see catalog.health_denominators
+			options = HealthOptionTable
+			has_health_answers = bool array --> False where the household has no
+				user_health_questions_answer (defaults to all True)
+
+		:return
+			plan_type = array of 'HMO' or 'PPO'
+			deductible = array of 'High' or 'Low'
+			critical_illness = bool array
+	"""
+	answers = np.asarray(answers, dtype=np.int64)
+	size = answers.shape[0]
+	if has_health_answers is None:
+		has_health_answers = np.ones(size, dtype=bool)
+	has_health_answers = np.asarray(has_health_answers, dtype=bool)
+
+	hmo = np.zeros(size)
+	ppo = np.zeros(size)
+	hsa = np.zeros(size)
+	high = np.zeros(size)
+	low = np.zeros(size)
+	critical = np.zeros(size)
+
+	# accumulate one question at a time, in field order, to keep the scalar float sums
+	for column, question_id in enumerate(HEALTH_QUESTION_IDS):
+		answered = answers[:, column] >= 0
+		scores = options.scores[question_id][answers[:, column]]
+		hmo = hmo + scores[:, 0]
+		# the scalar version sets PPO_TOTAL = HMO_TOTAL + PPO on every answered question
+		ppo = np.where(answered, hmo + scores[:, 1], ppo)
+		hsa = hsa + scores[:, 2]
+		high = high + scores[:, 3]
+		low = low + scores[:, 4]
+		critical = critical + scores[:, 5]
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		hmo_ratio = hmo / float(denominators['HMO_denom'])
+		ppo_ratio = ppo / float(denominators['PPO_denom'])
+		high_ratio = high / float(denominators['high_deduct_denom'])
+		low_ratio = low / float(denominators['low_deduct_denom'])
+		critical_ratio = critical / float(denominators['critical_illness_denom'])
+
+	is_hmo = hmo_ratio >= ppo_ratio
+	is_high = high_ratio > low_ratio
+	critical_illness = critical_ratio >= 0.33
+
+	is_hmo |= (options.matches(answers, 5, ['No chance'])
+		& options.matches(answers, 6, ['Never or just for my annual physical'])
+		& options.matches(answers, 7, ['Drink some tea, it will pass']))
+	is_high &= ~options.matches(answers, 2, ['Yes'])
+	is_hmo &= ~options.matches(answers, 11, ['Convenient time with any doctor', 'I love second opinions'])
+
+	# households without answers get the defaults
+	is_hmo |= ~has_health_answers
+	is_high |= ~has_health_answers
+	critical_illness &= has_health_answers
+
+	return np.where(is_hmo, 'HMO', 'PPO'), np.where(is_high, 'High', 'Low'), critical_illness
+
+
+def batch_disability_rec(annual_income):
+	"""
+		Vectorized disability_rec
+		:param annual_income = int array
+		:return benefit_amount (float array), duration (int array), monthly (float array)
+	"""
+	annual_income = np.asarray(annual_income, dtype=np.int64)
+	benefit_amount = annual_income * .6
+	monthly = benefit_amount / float(12)
+	return benefit_amount, np.full(len(annual_income), DISABILITY_DURATION, dtype=np.int64), monthly
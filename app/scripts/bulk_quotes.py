@@ -0,0 +1,143 @@
+"""
+	bulk_quotes.py: quotes whole chunks of households with the batch engine
+
+	The per request quote paths in api/views.py look up one plan at a time. The functions
+	below run the same decision logic over columnar chunks (see load_user_columns) using
+	batch_recommendation.py and plain dict copies of the catalog indexes, so they can run in
+	worker processes without touching the database.
+"""
+
+import numpy as np
+
+from app.models import user_general_answers, user_life_answers, user_kids, user_health_questions_answer, HEALTH_ANSWER_FIELDS
+from app.scripts import catalog
+from app.scripts.batch_recommendation import *
+
+
+class QuoteTables(object):
+	"""
+		Picklable copy of everything the quote logic reads from the catalogs
+		health --> { health_plan_key: health_plan_id }
+		life --> { life_plan_key: life_plan_id }
+		denominators --> health scoring denominators
+		options --> HealthOptionTable
+		option_positions --> { health_question_option_id: position within its question }
+	"""
+	def __init__(self, plans, questions):
+		self.version = (plans.version, questions.version)
+		self.health = dict((key, plan.pk) for key, plan in plans.health.items())
+		self.life = dict((key, plan.pk) for key, plan in plans.life.items())
+		self.denominators = dict(questions.denominators)
+		self.options = HealthOptionTable(questions.positions)
+		self.option_positions = {}
+		for question_options in questions.positions.values():
+			for position, option in enumerate(question_options):
+				self.option_positions[option.pk] = position
+
+	@classmethod
+	def current(cls):
+		return cls(catalog.plans.get(), catalog.questions.get())
+
+
+def load_user_columns(user_ids, option_positions):
+	"""
+		Loads the answers of a chunk of users into columns for score_households
+		:param user_ids: [int] --> ids of the users in the chunk, in order
+		:param option_positions: see QuoteTables
+
+		:return dict of numpy arrays, one entry per user (4 queries per chunk)
+	"""
+	size = len(user_ids)
+	row = dict((user_id, i) for i, user_id in enumerate(user_ids))
+	columns = {
+		'user_id': np.array(user_ids, dtype=np.int64),
+		'has_general': np.zeros(size, dtype=bool),
+		'married': np.zeros(size, dtype=bool),
+		'num_kids': np.zeros(size, dtype=np.int64),
+		'annual_income': np.zeros(size, dtype=np.int64),
+		'age': np.zeros(size, dtype=np.int64),
+		'gender': np.full(size, None, dtype=object),
+		'min_kid_age': np.zeros(size, dtype=np.int64),
+		'has_life': np.zeros(size, dtype=bool),
+		'other_debts_balance': np.zeros(size, dtype=np.int64),
+		'existing_life_insurance': np.zeros(size, dtype=np.int64),
+		'balance_investings_savings': np.zeros(size, dtype=np.int64),
+		'has_health': np.zeros(size, dtype=bool),
+		'answers': np.full((size, len(HEALTH_QUESTION_IDS)), -1, dtype=np.int64),
+	}
+
+	general = user_general_answers.objects.filter(user_id__in=user_ids).values_list(
+		'user_id', 'marital_status', 'num_kids', 'annual_income', 'age', 'gender')
+	for user_id, marital_status, num_kids, annual_income, age, gender in general.iterator():
+		i = row[user_id]
+		columns['has_general'][i] = True
+		columns['married'][i] = marital_status == 'married'
+		columns['num_kids'][i] = num_kids
+		columns['annual_income'][i] = annual_income
+		columns['age'][i] = age
+		columns['gender'][i] = gender
+
+	life = user_life_answers.objects.filter(user_id__in=user_ids).values_list(
+		'user_id', 'other_debts_balance', 'existing_life_insurance', 'balance_investings_savings')
+	for user_id, other_debts_balance, existing_life_insurance, balance_investings_savings in life.iterator():
+		i = row[user_id]
+		columns['has_life'][i] = True
+		columns['other_debts_balance'][i] = other_debts_balance
+		columns['existing_life_insurance'][i] = existing_life_insurance
+		columns['balance_investings_savings'][i] = balance_investings_savings
+
+	kids = user_kids.objects.filter(user_id__in=user_ids).values_list('user_id', 'kid_age')
+	youngest = {}
+	for user_id, kid_age in kids.iterator():
+		youngest[user_id] = min(kid_age, youngest.get(user_id, kid_age))
+	for user_id, kid_age in youngest.items():
+		columns['min_kid_age'][row[user_id]] = kid_age
+
+	health = user_health_questions_answer.objects.filter(user_id__in=user_ids).values_list('user_id', *HEALTH_ANSWER_FIELDS)
+	for answer in health.iterator():
+		i = row[answer[0]]
+		columns['has_health'][i] = True
+		for column, option_id in enumerate(answer[1:]):
+			if option_id is not None:
+				columns['answers'][i, column] = option_positions[option_id]
+
+	return columns
+
+
+def score_households(tables, columns):
+	"""
+		Picks the health and life plans the quote endpoints would pick for every household
+		:param tables: QuoteTables
+		:param columns: see load_user_columns
+
+		:return health_plan_ids, life_plan_ids --> lists with None where no plan matched
+			(life is always None for households without general answers, whose life
+			quote cannot be computed)
+	"""
+	has_general = columns['has_general']
+	num_kids = columns['num_kids']
+	annual_income = columns['annual_income']
+
+	plan_type, deductible, critical_illness = batch_health_insurance(
+		columns['answers'], tables.denominators, tables.options, columns['has_health'])
+	need_insurance, coverage_amount, term = batch_life_insurance(
+		columns['married'], num_kids, annual_income, columns['has_life'], columns['min_kid_age'],
+		columns['other_debts_balance'], columns['existing_life_insurance'], columns['balance_investings_savings'])
+	default_need, default_coverage, default_term = batch_life_insurance(columns['married'], num_kids, annual_income)
+	ages = catalog_ages(columns['age'])
+
+	health_plan_ids = []
+	life_plan_ids = []
+	for i in range(len(annual_income)):
+		health_plan_ids.append(tables.health.get(catalog.health_plan_key(
+			plan_type[i], deductible[i], columns['married'][i], min(num_kids[i], 2))))
+
+		life_plan_id = None
+		if has_general[i]:
+			life_plan_id = tables.life.get(catalog.life_plan_key(term[i], coverage_amount[i], columns['gender'][i], ages[i]))
+			if life_plan_id is None:
+				# same default quote as getQuoteHelper when no plan matches
+				life_plan_id = tables.life.get(catalog.life_plan_key(default_term[i], default_coverage[i], 'female', 25))
+		life_plan_ids.append(life_plan_id)
+
+	return health_plan_ids, life_plan_ids
@@ -0,0 +1,319 @@
+"""
+	catalog.py: in-process, versioned index of the plan catalogs
+
+	The rate tables (health_plan_costs, life_plan_costs, disability_plan_costs) change
+	rarely, so every worker keeps an immutable snapshot of them keyed on the exact tuples
+	the quote lookups filter on. A version stamp kept in the shared `versions` cache (see
+	CACHES in jetson/settings.py) is replaced whenever a catalog row is saved or deleted
+	(admin, loaddata) or when `manage.py reload_catalog` is run, in whichever process that
+	happens, and every worker rebuilds its snapshot lazily the next time it sees a
+	different stamp. The health scoring denominators are kept the same way under their
+	own stamp, together with an index of the health question options, and only change
+	with the health_questions and health_question_options tables.
+
+	The stamps are read with a single get_many the first time a request needs one and
+	kept for the rest of the request (see start_request), so a quote sees one consistent
+	catalog and costs one round trip to the shared cache however many plans it looks up.
+	Outside of requests (management commands, scripts) every lookup reads them again.
+
+	With settings.PLAN_CATALOG_CACHE = False every lookup is a single indexed query instead
+	(see the Meta.indexes of the plan models).
+"""
+
+import threading
+import uuid
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.cache import caches
+
+from app.models import health_plan_costs, life_plan_costs, disability_plan_costs, health_questions, health_question_options
+from app.scripts.recommendation_logic import health_insurance_totals
+
+# models whose rows make up the catalog, used to hook up invalidation signals
+CATALOG_MODELS = (health_plan_costs, life_plan_costs, disability_plan_costs)
+
+# models the health scoring tables are computed from
+QUESTION_MODELS = (health_questions, health_question_options)
+
+# lookup counters of this worker, updated without a lock so concurrent lookups can lose
+# an increment: they are approximate and only meant for catalog_stats()
+_stats = {'hits': 0, 'misses': 0}
+
+# every VersionedSnapshot, their stamps are read together
+_snapshots = []
+
+# the stamps read by this thread during the current request, see read_versions
+_local = threading.local()
+
+
+def health_plan_key(plan_type, deductible_level, has_spouse, num_kids):
+	return (str(plan_type), str(deductible_level), bool(has_spouse), int(num_kids))
+
+def life_plan_key(policy_term, policy_amount, gender, age):
+	return (int(policy_term), int(policy_amount), str(gender), str(age))
+
+def disability_plan_key(salary, gender, age):
+	return (int(salary), str(gender), str(age))
+
+
+def _build_index(queryset, key_func):
+	"""
+		Indexes the rows of a queryset by key_func, keeping the first row (lowest pk)
+		for every key so lookups are deterministic
+		:return read only mapping { key: model instance }
+	"""
+	index = {}
+	for row in queryset.order_by('pk'):
+		index.setdefault(key_func(row), row)
+	return MappingProxyType(index)
+
+
+class CatalogSnapshot(object):
+	"""
+		Immutable view of the three plan catalogs at a given version
+	"""
+	def __init__(self, version):
+		self.version = version
+		self.health = _build_index(health_plan_costs.objects.all(),
+			lambda p: health_plan_key(p.plan_type, p.deductible_level, p.has_spouse, p.num_kids))
+		self.life = _build_index(life_plan_costs.objects.all(),
+			lambda p: life_plan_key(p.policy_term, p.policy_amount, p.gender, p.age))
+		self.disability = _build_index(disability_plan_costs.objects.all(),
+			lambda p: disability_plan_key(p.salary, p.gender, p.age))
+
+
+class QuestionSnapshot(object):
+	"""
+		Immutable view of the health scoring tables at a given version
+		denominators --> health_insurance_totals() over every health_questions row
+		options --> { (question_id, option text): health_question_options }
+		positions --> { question_id: (health_question_options, ...) } ordered by pk
+	"""
+	def __init__(self, version):
+		self.version = version
+		self.denominators = MappingProxyType(health_insurance_totals(health_questions.objects.order_by('pk')))
+
+		options = {}
+		positions = {}
+		for option in health_question_options.objects.order_by('pk'):
+			question_id = int(option.health_question_id_id)
+			options.setdefault((question_id, option.option), option)
+			positions.setdefault(question_id, []).append(option)
+		self.options = MappingProxyType(options)
+		self.positions = MappingProxyType(dict((k, tuple(v)) for k, v in positions.items()))
+
+
+def versions_cache():
+	return caches[getattr(settings, 'CATALOG_VERSIONS_CACHE', 'versions')]
+
+
+def start_request(**kwargs):
+	"""
+		Signal receiver for request_started (see app/apps.py): the stamps are read again
+		once per request
+	"""
+	_local.in_request = True
+	_local.versions = None
+
+def finish_request(**kwargs):
+	"""
+		Signal receiver for request_finished
+	"""
+	_local.in_request = False
+	_local.versions = None
+
+
+def read_versions():
+	"""
+		Returns the version stamps of every snapshot, creating the ones the shared cache
+		has none of. Inside a request they are only read once.
+		:return { stamp key: version }
+	"""
+	versions = getattr(_local, 'versions', None)
+	if versions is not None:
+		return versions
+
+	shared = versions_cache()
+	keys = [snapshot.key for snapshot in _snapshots]
+	versions = shared.get_many(keys)
+	for key in keys:
+		if versions.get(key) is None:
+			shared.add(key, uuid.uuid4().hex)
+			versions[key] = shared.get(key)
+
+	if getattr(_local, 'in_request', False):
+		_local.versions = versions
+	return versions
+
+
+class VersionedSnapshot(object):
+	"""
+		Keeps one snapshot per worker and rebuilds it when the version stamp stored
+		in the shared versions cache under `name` changes
+		:param name: cache namespace of the version stamp
+		:param build: callable(version) -> snapshot
+	"""
+	def __init__(self, name, build):
+		self.key = 'app.' + name + '.version'
+		self.build = build
+		self.snapshot = None
+		self.reloads = 0
+		self._lock = threading.Lock()
+		_snapshots.append(self)
+
+	def version(self):
+		"""
+			Returns the current version stamp, see read_versions
+		"""
+		return read_versions()[self.key]
+
+	def bump(self):
+		"""
+			Invalidates every worker's snapshot by replacing the version stamp
+			:return the new version stamp
+		"""
+		version = uuid.uuid4().hex
+		versions_cache().set(self.key, version)
+		# the rest of this request sees its own write
+		pinned = getattr(_local, 'versions', None)
+		if pinned is not None:
+			_local.versions = dict(pinned, **{self.key: version})
+		return version
+
+	def invalidate(self, sender, **kwargs):
+		"""
+			Signal receiver for post_save/post_delete (see app/apps.py)
+		"""
+		self.bump()
+
+	def get(self):
+		"""
+			Returns the snapshot for the current version, rebuilding it if stale
+		"""
+		version = self.version()
+		snapshot = self.snapshot
+		if snapshot is not None and snapshot.version == version:
+			return snapshot
+
+		with self._lock:
+			if self.snapshot is None or self.snapshot.version != version:
+				self.snapshot = self.build(version)
+				self.reloads += 1
+			return self.snapshot
+
+
+plans = VersionedSnapshot('catalog', CatalogSnapshot)
+questions = VersionedSnapshot('questions', QuestionSnapshot)
+
+
+def catalog_version():
+	return plans.version()
+
+def bump_catalog_version():
+	return plans.bump()
+
+def get_catalog():
+	return plans.get()
+
+def health_denominators():
+	"""
+		Returns the precomputed health scoring denominators (see health_insurance_totals)
+	"""
+	return questions.get().denominators
+
+def health_option(question_id, answer):
+	"""
+		Resolves an answer to a health question without touching the database
+		:param question_id: int, the N in q_N
+		:param answer: int --> 0 based position of the option within the question
+			string --> the option text (the format the frontend has always sent)
+
+		:return health_question_options
+		:raise health_question_options.DoesNotExist if the answer matches no option
+	"""
+	snapshot = questions.get()
+	question_id = int(question_id)
+	option = None
+
+	if isinstance(answer, int) and not isinstance(answer, bool):
+		question_options = snapshot.positions.get(question_id, ())
+		if 0 <= answer < len(question_options):
+			option = question_options[answer]
+	else:
+		option = snapshot.options.get((question_id, answer))
+
+	if option is None:
+		raise health_question_options.DoesNotExist(
+			'No option %r for health question %d' % (answer, question_id))
+	return option
+
+def catalog_stats():
+	"""
+		Returns a copy of this worker's lookup counters
+		hits --> lookups that matched a plan
+		misses --> lookups with no matching plan
+		reloads --> number of times the plan snapshot was (re)built
+		question_reloads --> number of times the health scoring tables were (re)built
+	"""
+	stats = dict(_stats)
+	stats['reloads'] = plans.reloads
+	stats['version'] = plans.snapshot.version if plans.snapshot is not None else None
+	stats['question_reloads'] = questions.reloads
+	return stats
+
+
+def health_plan_query(plan_type, deductible_level, has_spouse, num_kids):
+	"""
+		The database form of a health plan lookup, served by health_plan_lookup_idx
+	"""
+	plan_type, deductible_level, has_spouse, num_kids = health_plan_key(plan_type, deductible_level, has_spouse, num_kids)
+	return health_plan_costs.objects.filter(plan_type = plan_type, deductible_level = deductible_level,
+		has_spouse = has_spouse, num_kids = num_kids).order_by('pk')
+
+def life_plan_query(policy_term, policy_amount, gender, age):
+	"""
+		The database form of a life plan lookup, served by life_plan_lookup_idx
+	"""
+	policy_term, policy_amount, gender, age = life_plan_key(policy_term, policy_amount, gender, age)
+	return life_plan_costs.objects.filter(policy_term = policy_term, policy_amount = policy_amount,
+		gender = gender, age = age).order_by('pk')
+
+def disability_plan_query(salary, gender, age):
+	salary, gender, age = disability_plan_key(salary, gender, age)
+	return disability_plan_costs.objects.filter(salary = salary, gender = gender, age = age).order_by('pk')
+
+
+def _lookup(index, key, query):
+	"""
+		Answers a lookup from the in-process index, or with a single query (lowest pk
+		first, same as the index) when settings.PLAN_CATALOG_CACHE is off
+	"""
+	if getattr(settings, 'PLAN_CATALOG_CACHE', True):
+		plan = index().get(key)
+	else:
+		plan = query(*key).first()
+
+	if plan is None:
+		_stats['misses'] += 1
+	else:
+		_stats['hits'] += 1
+	return plan
+
+def health_plan(plan_type, deductible_level, has_spouse, num_kids):
+	"""
+		Returns the health_plan_costs row matching the given attributes or None
+	"""
+	return _lookup(lambda: get_catalog().health, health_plan_key(plan_type, deductible_level, has_spouse, num_kids), health_plan_query)
+
+def life_plan(policy_term, policy_amount, gender, age):
+	"""
+		Returns the life_plan_costs row matching the given attributes or None
+	"""
+	return _lookup(lambda: get_catalog().life, life_plan_key(policy_term, policy_amount, gender, age), life_plan_query)
+
+def disability_plan(salary, gender, age):
+	"""
+		Returns the disability_plan_costs row matching the given attributes or None
+	"""
+	return _lookup(lambda: get_catalog().disability, disability_plan_key(salary, gender, age), disability_plan_query)
@@ -0,0 +1,109 @@
+"""
+	export.py: streams every user's answers and recommendation as CSV or NDJSON
+
+	Users are read in primary key order, chunk_size at a time, with one joined query per
+	chunk that starts after the last id of the previous one (keyset pagination, no OFFSET)
+	and is iterated without caching the queryset. Health answers are exported with their
+	option text from the in-process question catalog, so the query never joins
+	health_question_options. Memory stays the same however many users there are.
+
+	Used by the export_answers management command and the exportAnswers endpoint.
+"""
+
+import csv
+import datetime
+import json
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from app.models import HEALTH_ANSWER_FIELDS
+from app.scripts import catalog
+
+GENERAL_COLUMNS = ['age', 'zipcode', 'marital_status', 'spouse_age', 'num_kids', 'annual_income',
+	'spouse_annual_income', 'health_condition', 'gender']
+LIFE_COLUMNS = ['mortgage_balance', 'other_debts_balance', 'existing_life_insurance', 'balance_investings_savings']
+RECOMMENDATION_COLUMNS = ['health_plan_id', 'life_plan_id', 'disability_plan_id']
+
+# output column --> User lookup
+COLUMNS = [('user_id', 'pk'), ('username', 'username'), ('date_joined', 'date_joined')] + \
+	[(name, 'user_general_answers__' + name) for name in GENERAL_COLUMNS] + \
+	[(name, 'user_life_answers__' + name) for name in LIFE_COLUMNS] + \
+	[(name, 'user_health_questions_answer__' + name) for name in HEALTH_ANSWER_FIELDS] + \
+	[('recommended_' + name, 'user_recommendation__' + name) for name in RECOMMENDATION_COLUMNS]
+
+FORMATS = ['csv', 'ndjson']
+
+
+def parse_since(value):
+	"""
+		:return aware datetime of an ISO date or datetime, None if it is neither
+	"""
+	try:
+		since = parse_datetime(value)
+		day = parse_date(value) if since is None else None
+	except ValueError:
+		return None
+	if since is None:
+		if day is None:
+			return None
+		since = datetime.datetime(day.year, day.month, day.day)
+	if timezone.is_naive(since):
+		since = timezone.make_aware(since)
+	return since
+
+def export_rows(since_id=None, since=None, chunk_size=1000):
+	"""
+		:param since_id: int --> only users with a greater id
+		:param since: datetime --> only users who joined at or after it
+		:param chunk_size: int --> users per query
+
+		:return generator of [ value ] in COLUMNS order, health answers as option text
+	"""
+	option_text = {}
+	for question_options in catalog.questions.get().positions.values():
+		for option in question_options:
+			option_text[option.pk] = option.option
+	health_columns = set(i for i, (name, lookup) in enumerate(COLUMNS) if name in HEALTH_ANSWER_FIELDS)
+
+	users = User.objects.order_by('pk').values_list(*[lookup for name, lookup in COLUMNS])
+	if since is not None:
+		users = users.filter(date_joined__gte=since)
+
+	last_id = since_id
+	while True:
+		chunk = users if last_id is None else users.filter(pk__gt=last_id)
+		count = 0
+		for row in chunk[:chunk_size].iterator():
+			count += 1
+			last_id = row[0]
+			yield [option_text.get(value) if i in health_columns else value for i, value in enumerate(row)]
+
+		if count < chunk_size:
+			return
+
+
+class _Line(object):
+	# file-like object csv.writer writes a single row to
+	def write(self, value):
+		return value
+
+
+def export_lines(rows, format='csv'):
+	"""
+		:param rows: see export_rows
+		:param format: 'csv' (with a header line) or 'ndjson'
+
+		:return generator of output lines
+	"""
+	names = [name for name, lookup in COLUMNS]
+	if format == 'csv':
+		writer = csv.writer(_Line())
+		yield writer.writerow(names)
+		for row in rows:
+			yield writer.writerow(row)
+	else:
+		for row in rows:
+			yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + '\n'
@@ -0,0 +1,116 @@
+"""
+	flamegraph.py: turns the request profiles written by api/profiling.py into collapsed
+	stacks, the input format of flamegraph.pl, speedscope and inferno
+
+	Every profile is a .json file of metadata next to either its sampled stacks (sampling
+	mode) or a cProfile dump (deterministic mode, a .prof file). cProfile only records who
+	called whom, so its stacks are rebuilt from the call graph by splitting the time of
+	every function between its callers in proportion to the calls each made; the result is
+	approximate for functions reached from several places. Weights are microseconds in
+	both modes so dumps of either kind can be merged.
+
+	Used by the collapse_profiles management command.
+"""
+
+import glob
+import json
+import os
+import pstats
+import sys
+from collections import Counter
+
+MODES = ['deterministic', 'sampling']
+
+# branches of the rebuilt cProfile call tree lighter than this (microseconds) are dropped
+MIN_WEIGHT = 1.0
+
+
+def short_path(filename):
+	"""
+		:return filename relative to the sys.path entry it was imported from
+	"""
+	for prefix in sorted(sys.path, key=len, reverse=True):
+		if prefix and filename.startswith(prefix + os.sep):
+			return filename[len(prefix) + 1:]
+	return filename
+
+
+def frame_label(filename, name):
+	"""
+		:return 'path/module.py:function', the name of one frame in a collapsed stack
+	"""
+	# cProfile reports builtins with the file name '~'
+	label = name if filename == '~' else short_path(filename) + ':' + name
+	return label.replace(';', ',')
+
+
+def collapse_pstats(stats):
+	"""
+		Rebuilds the call stacks of a cProfile dump
+		:param stats: pstats.Stats
+		:return Counter of 'root;caller;callee' --> microseconds spent in the callee itself
+	"""
+	children = {}
+	roots = []
+	for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+		for caller, edge in callers.items():
+			# edge is (cc, nc, tt, ct) of the calls made from caller
+			children.setdefault(caller, []).append((func, edge[3]))
+		# the profiler's own disable() call is a root of every dump
+		if not any(caller in stats.stats for caller in callers) and '_lsprof.Profiler' not in func[2]:
+			roots.append(func)
+
+	stacks = Counter()
+
+	def walk(func, weight, path, labels):
+		cc, nc, tt, ct, callers = stats.stats[func]
+		scale = weight / ct if ct else 0
+		stack = ';'.join(labels)
+		stacks[stack] += tt * scale * 1e6
+		for child, child_ct in children.get(func, []):
+			# recursive calls are already part of the caller's own time
+			if child in path or child_ct * scale * 1e6 < MIN_WEIGHT:
+				continue
+			walk(child, child_ct * scale, path | {child}, labels + [frame_label(child[0], child[2])])
+
+	for root in roots:
+		walk(root, stats.stats[root][3], {root}, [frame_label(root[0], root[2])])
+	return stacks
+
+
+def load_profile(path):
+	"""
+		:param path: the .json metadata file of one profile
+		:return metadata dict, Counter of collapsed stack --> microseconds
+	"""
+	with open(path) as f:
+		meta = json.load(f)
+	if meta['mode'] == 'sampling':
+		return meta, Counter(meta['stacks'])
+	return meta, collapse_pstats(pstats.Stats(os.path.join(os.path.dirname(path), meta['profile'])))
+
+
+def collapse_profiles(directory, url_names=None, mode=None):
+	"""
+		Merges every profile in directory
+		:param url_names: only the profiles of these endpoints
+		:param mode: only 'sampling' or only 'deterministic' profiles
+		:return number of profiles merged, Counter of collapsed stack --> microseconds
+	"""
+	merged = Counter()
+	count = 0
+	for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+		with open(path) as f:
+			meta = json.load(f)
+		if (url_names and meta['url_name'] not in url_names) or (mode and meta['mode'] != mode):
+			continue
+		merged.update(load_profile(path)[1])
+		count += 1
+	return count, merged
+
+
+def collapsed_lines(stacks):
+	"""
+		:return ['stack weight\\n'] sorted by stack, whole microseconds, empty stacks dropped
+	"""
+	return ['%s %d\n' % (stack, round(weight)) for stack, weight in sorted(stacks.items()) if stack and round(weight) > 0]
@@ -2,6 +2,7 @@ from django.core import serializers
 from django.forms.models import model_to_dict
 from app.models import *
 from django.db import models
+from collections.abc import Mapping
 
 def asInt(value):
 	return 0 if value == '' else int(value)
@@ -34,7 +35,6 @@ def life_insurance(life_insurance_dict = None, general_questions_dict = None, us
 		coverage_amount = 10 * asInt(general_questions_dict.annual_income)
 
 	else:
-		print(user_kids_age)
 		if (len(user_kids_age) < 1):
 			min_age = 0
 		else:
@@ -99,8 +99,10 @@ def health_insurance(health_insurance_total, health_insurance_obj = None):
 	"""
 	    Genrates health recommendation
         :param
-            health_insurance_total = models.health_questions
-            health_insurance_obj = models.user_health_questions_answer
+            health_insurance_total = models.health_questions, or the denominators already
+            	computed from it by health_insurance_totals (see catalog.health_denominators)
+            health_insurance_obj = models.user_health_questions_answer, ideally loaded with
+            	its options joined in (see api/profile.py) since every answer is read
 
 
         :return 
@@ -125,23 +127,23 @@ def health_insurance(health_insurance_total, health_insurance_obj = None):
 		low_deductible_total = 0.0
 		PPO_TOTAL = 0.0
 		HSA_TOTAL = 0.0
-		critical_illness = 0.0
+		critical_illness_total = 0.0
 		
-		fields = user_health_questions_answer._meta.get_fields()
-		health_insurance_dict = model_to_dict(health_insurance_obj) # TODO: Necessary???
-
-		denom_dict = health_insurance_totals(health_insurance_total)
-		print(denom_dict)
+		if isinstance(health_insurance_total, Mapping):
+			denom_dict = health_insurance_total
+		else:
+			denom_dict = health_insurance_totals(health_insurance_total)
 
-		for field in fields:
-			value = getattr(health_insurance_obj, field.name)
+		# only the q_N fields, so scoring never loads the related user
+		for field in HEALTH_ANSWER_FIELDS:
+			value = getattr(health_insurance_obj, field)
 			if (value != None and isinstance(value, health_question_options)):
 				HMO_TOTAL = HMO_TOTAL+float(value.HMO)
 				PPO_TOTAL = HMO_TOTAL+float(value.PPO)
 				HSA_TOTAL = HSA_TOTAL+float(value.HSA)
 				high_deductible_total = high_deductible_total+ float(value.high_deductible)
 				low_deductible_total = low_deductible_total+ float(value.low_deductible)
-				critical_illness = critical_illness + float(value.critical_illness)
+				critical_illness_total = critical_illness_total + float(value.critical_illness)
 
 
 		HMO_ratio = float(HMO_TOTAL) / float(denom_dict['HMO_denom'])
@@ -149,7 +151,7 @@ def health_insurance(health_insurance_total, health_insurance_obj = None):
 		HSA_ratio = float(HSA_TOTAL) / float(denom_dict['HSA_denom'])
 		high_deductible_ratio = float(high_deductible_total) / float(denom_dict['high_deduct_denom'])
 		low_deductible_ratio =  float(low_deductible_total) / float(denom_dict['low_deduct_denom'])
-		critical_illness_ratio = float(critical_illness) / float(denom_dict['critical_illness_denom'])
+		critical_illness_ratio = float(critical_illness_total) / float(denom_dict['critical_illness_denom'])
 
 		if (HMO_ratio >= PPO_ratio):
 			plan_type = 'HMO'
@@ -0,0 +1,162 @@
+"""
+	recommendations.py: change-only writes of user_recommendation
+
+	The quote endpoints know which plan they picked and which plan is stored for the user
+	(the stored row is loaded with the answers, see api/profile.py), so they only write
+	when the pick changed, and only the columns that changed. Writes are either applied
+	right away or, with settings.RECOMMENDATION_WRITE_BEHIND, queued in a per-worker
+	buffer that is flushed in batches (see RecommendationBuffer).
+
+	Columns are given by attname, e.g. health_plan_id_id=12.
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+
+from app.models import user_recommendation
+
+logger = logging.getLogger(__name__)
+
+
+def changed_columns(current, **columns):
+	"""
+		:param current: the stored user_recommendation or None
+		:return dict of the columns whose value differs from current
+	"""
+	if current is None:
+		return dict((attname, value) for attname, value in columns.items() if value is not None)
+	return dict((attname, value) for attname, value in columns.items() if getattr(current, attname) != value)
+
+
+def apply_changes(changes):
+	"""
+		Upserts many users' changed columns: one UPDATE per distinct set of changes and one
+		bulk INSERT for the users without a row
+		:param changes: { user_id: { attname: value } }
+		:return number of rows inserted or updated
+	"""
+	if not changes:
+		return 0
+
+	existing = set(user_recommendation.objects.filter(user_id__in=list(changes)).values_list('user_id', flat=True))
+	groups = {}
+	created = []
+	for user_id, columns in changes.items():
+		if user_id in existing:
+			groups.setdefault(tuple(sorted(columns.items())), []).append(user_id)
+		else:
+			created.append(user_recommendation(user_id_id=user_id, **columns))
+
+	with transaction.atomic():
+		for columns, user_ids in groups.items():
+			user_recommendation.objects.filter(user_id__in=user_ids).update(**dict(columns))
+		user_recommendation.objects.bulk_create(created)
+
+	return len(created) + sum(len(user_ids) for user_ids in groups.values())
+
+
+def upsert(user_id, current, columns):
+	"""
+		Writes the changed columns of one user right away (1 query)
+		:param current: the stored user_recommendation or None if the user has no row
+	"""
+	if current is not None:
+		user_recommendation.objects.filter(user_id=user_id).update(**columns)
+		return
+
+	try:
+		with transaction.atomic():
+			user_recommendation.objects.create(user_id_id=user_id, **columns)
+	except IntegrityError:
+		# the row was created since current was read
+		user_recommendation.objects.filter(user_id=user_id).update(**columns)
+
+
+class RecommendationBuffer(object):
+	"""
+		Per worker write-behind buffer of recommendation changes, later changes of a user
+		overwrite earlier ones. It is flushed with apply_changes once it holds `size` users,
+		by a timer thread `interval` seconds after its oldest change (so a quiet worker does
+		not sit on changes), and when the worker exits.
+	"""
+	def __init__(self, size, interval):
+		self.size = size
+		self.interval = interval
+		self.pending = {}
+		self.since = None
+		self.flushes = 0
+		self._lock = threading.Lock()
+
+	def add(self, user_id, columns):
+		with self._lock:
+			self.pending.setdefault(user_id, {}).update(columns)
+			first = self.since is None
+			if first:
+				self.since = time.time()
+			due = len(self.pending) >= self.size or time.time() - self.since >= self.interval
+		if due:
+			self.flush()
+		elif first:
+			timer = threading.Timer(self.interval, self._flush_on_timer)
+			timer.daemon = True
+			timer.start()
+
+	def _flush_on_timer(self):
+		try:
+			self.flush()
+		except Exception:
+			logger.exception('Flushing the recommendation changes failed')
+		finally:
+			# the timer thread's own connections
+			connections.close_all()
+
+	def flush(self):
+		"""
+			:return number of rows inserted or updated
+		"""
+		with self._lock:
+			pending, self.pending, self.since = self.pending, {}, None
+		if not pending:
+			return 0
+		self.flushes += 1
+		return apply_changes(pending)
+
+	def stats(self):
+		with self._lock:
+			return {'pending': len(self.pending), 'flushes': self.flushes}
+
+
+buffer = RecommendationBuffer(getattr(settings, 'RECOMMENDATION_FLUSH_SIZE', 100),
+	getattr(settings, 'RECOMMENDATION_FLUSH_INTERVAL', 5))
+atexit.register(buffer.flush)
+
+
+def record(user_id, current, **columns):
+	"""
+		Persists a user's recommended plans if they changed
+		:param user_id: int
+		:param current: the stored user_recommendation or None if the user has no row
+		:param columns: attname=plan id, e.g. health_plan_id_id=12
+
+		:return user_recommendation reflecting the new values (pass it as current next time),
+			nothing is written when no column changed
+	"""
+	changes = changed_columns(current, **columns)
+	if not changes:
+		return current
+
+	if getattr(settings, 'RECOMMENDATION_WRITE_BEHIND', False):
+		buffer.add(user_id, changes)
+	else:
+		upsert(user_id, current, changes)
+
+	if current is None:
+		current = user_recommendation(user_id_id=user_id)
+	for attname, value in changes.items():
+		setattr(current, attname, value)
+	return current
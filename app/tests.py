@@ -1,3 +1,345 @@
-from django.test import TestCase
+import json
+import os
+import random
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.contrib.auth.models import User
+
+from app.models import *
+from app.scripts.recommendation_logic import life_insurance, health_insurance, health_insurance_totals, disability_rec
+from app.scripts.batch_recommendation import *
+from app.scripts import catalog
+from app.management.commands.requote import write_recommendations
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixture(model, name):
+    """
+        Builds unsaved model instances from one of our fixture files
+    """
+    with open(os.path.join(FIXTURES_DIR, name + '.json')) as f:
+        rows = json.load(f)
+    return [model(pk=row['pk'], **dict((k + '_id' if k == 'health_question_id' else k, v) for k, v in row['fields'].items()))
+        for row in rows]
+
+
+class BatchRecommendationParityTest(SimpleTestCase):
+    """
+        The batch engine must give exactly the same answers as the scalar functions
+    """
+    households = 2000
+
+    def setUp(self):
+        self.random = random.Random(1234)
+        self.denominators = health_insurance_totals(load_fixture(health_questions, 'health_questions'))
+
+        self.positions = {}
+        for option in sorted(load_fixture(health_question_options, 'health_question_options'), key=lambda o: o.pk):
+            self.positions.setdefault(int(option.health_question_id_id), []).append(option)
+        self.options = HealthOptionTable(self.positions)
+
+    def test_life_insurance(self):
+        rows = []
+        for i in range(self.households):
+            kids = [self.random.randint(0, 21) for k in range(self.random.randint(0, 4))]
+            rows.append({
+                'general': user_general_answers(
+                    marital_status=self.random.choice(['single', 'married', 'divorced', 'widowed']),
+                    num_kids=len(kids),
+                    annual_income=self.random.choice([0, 15000, 40000, 85000, 120000, 250000, 1000000])),
+                'life': None if self.random.random() < 0.3 else user_life_answers(
+                    other_debts_balance=self.random.randint(0, 400000),
+                    existing_life_insurance=self.random.randint(0, 500000),
+                    balance_investings_savings=self.random.randint(0, 300000)),
+                'kids': kids,
+            })
+
+        life = [row['life'] or user_life_answers() for row in rows]
+        need, coverage, term = batch_life_insurance(
+            married=[row['general'].marital_status == 'married' for row in rows],
+            num_kids=[row['general'].num_kids for row in rows],
+            annual_income=[row['general'].annual_income for row in rows],
+            has_life_answers=[row['life'] is not None for row in rows],
+            min_kid_age=min_kid_ages([row['kids'] for row in rows]),
+            other_debts_balance=[l.other_debts_balance for l in life],
+            existing_life_insurance=[l.existing_life_insurance for l in life],
+            balance_investings_savings=[l.balance_investings_savings for l in life])
+
+        for i, row in enumerate(rows):
+            expected = life_insurance(row['life'], row['general'], row['kids'])
+            self.assertEqual(expected, (bool(need[i]), int(coverage[i]), int(term[i])))
+
+    def test_health_insurance(self):
+        answers = []
+        objects = []
+        for i in range(self.households):
+            row = []
+            obj = user_health_questions_answer(user_id=User())
+            for question_id in HEALTH_QUESTION_IDS:
+                position = self.random.randint(-1, len(self.positions[question_id]) - 1)
+                row.append(position)
+                setattr(obj, 'q_' + str(question_id), self.positions[question_id][position] if position >= 0 else None)
+            answers.append(row)
+            objects.append(obj if self.random.random() > 0.1 else None)
+
+        plan_type, deductible, critical_illness = batch_health_insurance(
+            answers, self.denominators, self.options, has_health_answers=[obj is not None for obj in objects])
+
+        for i, obj in enumerate(objects):
+            expected = health_insurance(self.denominators, obj)
+            self.assertEqual(expected, (plan_type[i], deductible[i], bool(critical_illness[i])))
+
+    def test_disability_rec(self):
+        incomes = [self.random.randint(0, 500000) for i in range(self.households)]
+        benefit_amount, duration, monthly = batch_disability_rec(incomes)
+
+        for i, income in enumerate(incomes):
+            expected = disability_rec(user_general_answers(annual_income=income))
+            self.assertEqual(expected, (float(benefit_amount[i]), int(duration[i]), float(monthly[i])))
+
+    def test_catalog_ages(self):
+        ages = list(range(0, 90))
+        expected = [min([25, 35], key=lambda x: abs(x - age)) for age in ages]
+        self.assertEqual(expected, list(catalog_ages(ages)))
+
+
+SQLITE_PLANNER = 'SQLite query plans only, run benchmarks/bench_plan_index.py for MySQL'
+
+
+class PlanLookupIndexTest(TestCase):
+    """
+        The database form of the quote lookups must be a single query served by the
+        composite lookup indexes, not a scan of the rate tables
+
+        The EXPLAIN checks are a SQLite smoke test on a few thousand rows, they say nothing
+        about the MySQL optimizer on production sized tables: benchmarks/bench_plan_index.py
+        checks that against the MySQL server.
+    """
+    fixtures = ['health_plan_costs', 'life_plan_costs']
+
+    def setUp(self):
+        # enough extra carriers that the planner prefers the index over a scan
+        health = [(plan_type, level, spouse, kids) for plan_type in ['HMO', 'PPO'] for level in ['High', 'Low']
+            for spouse in [True, False] for kids in range(3)]
+        health_plan_costs.objects.bulk_create([health_plan_costs(health_plan_id=100000 + i, carrier='carrier ' + str(i),
+            plan_name='plan', medal='Silver', plan_type=plan_type, monthly_premium=400, deductible=2000,
+            deductible_level=level, has_spouse=spouse, num_kids=kids)
+            for i, (plan_type, level, spouse, kids) in enumerate(health * 100)])
+
+        life = [(amount, gender, age) for amount in [250000, 500000, 700000] for gender in ['male', 'female'] for age in ['25', '35']]
+        life_plan_costs.objects.bulk_create([life_plan_costs(life_plan_id=100000 + i, carrier='carrier ' + str(i),
+            policy_term=20, policy_amount=amount, gender=gender, age=age, monthly=30)
+            for i, (amount, gender, age) in enumerate(life * 100)])
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return ' '.join(str(column) for row in cursor.fetchall() for column in row)
+
+    @skipUnless(connection.vendor == 'sqlite', SQLITE_PLANNER)
+    def test_health_plan_lookup(self):
+        self.assertIn('health_plan_lookup_idx', self.explain(catalog.health_plan_query('HMO', 'High', True, 2)))
+
+    @skipUnless(connection.vendor == 'sqlite', SQLITE_PLANNER)
+    def test_life_plan_lookup(self):
+        self.assertIn('life_plan_lookup_idx', self.explain(catalog.life_plan_query(20, 500000, 'female', 25)))
+
+    def test_uncached_lookups(self):
+        cached = catalog.health_plan('PPO', 'Low', False, 1), catalog.life_plan(20, 250000, 'male', 35)
+        with self.settings(PLAN_CATALOG_CACHE=False), self.assertNumQueries(2):
+            uncached = catalog.health_plan('PPO', 'Low', False, 1), catalog.life_plan(20, 250000, 'male', 35)
+        self.assertEqual(cached, uncached)
+
+
+class CatalogInvalidationTest(TestCase):
+    """
+        A catalog change in any process (admin save, loaddata, reload_catalog) reaches every
+        worker through the version stamps in the shared versions cache
+    """
+    fixtures = ['health_plan_costs']
+
+    def setUp(self):
+        self.plan = health_plan_costs.objects.order_by('pk').first()
+        self.key = (self.plan.plan_type, self.plan.deductible_level, self.plan.has_spouse, self.plan.num_kids)
+        # another worker's copy of the plan catalog, it only shares the versions cache with this one
+        self.worker = catalog.VersionedSnapshot('catalog', catalog.CatalogSnapshot)
+        self.addCleanup(catalog._snapshots.remove, self.worker)
+
+    def premium(self, snapshot):
+        return snapshot.health[catalog.health_plan_key(*self.key)].monthly_premium
+
+    def test_shared_store(self):
+        self.assertNotIsInstance(catalog.versions_cache(), LocMemCache)
+
+    def test_save_invalidates_other_workers(self):
+        self.worker.get()
+        self.plan.monthly_premium += 100
+        self.plan.save()
+        self.assertEqual(self.premium(self.worker.get()), self.plan.monthly_premium)
+
+    def test_reload_elsewhere(self):
+        catalog.get_catalog()
+        # changed behind the signals, then reload_catalog runs in another worker
+        health_plan_costs.objects.filter(pk=self.plan.pk).update(monthly_premium=self.plan.monthly_premium + 100)
+        self.worker.bump()
+        self.assertEqual(self.premium(catalog.get_catalog()), self.plan.monthly_premium + 100)
+
+        health_plan_costs.objects.filter(pk=self.plan.pk).update(monthly_premium=self.plan.monthly_premium)
+        call_command('reload_catalog', stdout=StringIO())
+        self.assertEqual(self.premium(self.worker.get()), self.plan.monthly_premium)
+
+    def test_stamps_read_once_per_request(self):
+        catalog.get_catalog()
+        catalog.start_request()
+        self.addCleanup(catalog.finish_request)
+        shared = catalog.versions_cache()
+        with mock.patch.object(shared, 'get_many', wraps=shared.get_many) as get_many:
+            for i in range(10):
+                catalog.health_plan(*self.key)
+        self.assertEqual(get_many.call_count, 1)
+        # a reload in another process is picked up by the next request, not halfway through this one
+        version = catalog.catalog_version()
+        catalog.versions_cache().set(catalog.plans.key, 'reloaded')
+        self.assertEqual(catalog.catalog_version(), version)
+        catalog.start_request()
+        self.assertEqual(catalog.catalog_version(), 'reloaded')
+
+
+class ExportAnswersCommandTest(TestCase):
+    """
+        export_answers pages through users by id, one query per chunk
+    """
+    fixtures = ['health_questions', 'health_question_options']
+
+    def setUp(self):
+        for i in range(5):
+            user = User.objects.create(username='user%d@jetson.com' % i)
+            user_general_answers.objects.create(user_id=user, age=30 + i, zipcode=14850, num_kids=0, annual_income=50000)
+        self.ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        catalog.questions.get()
+
+    def export(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('export_answers', '--format', 'ndjson', *args, stdout=out, stderr=err)
+        return [json.loads(line) for line in out.getvalue().splitlines()], err.getvalue()
+
+    def test_keyset_chunks(self):
+        with self.assertNumQueries(3):
+            rows, summary = self.export('--chunk-size', '2')
+        self.assertEqual([row['user_id'] for row in rows], self.ids)
+        self.assertEqual([row['age'] for row in rows], [30, 31, 32, 33, 34])
+        self.assertIn('exported 5 users, last id %d' % self.ids[-1], summary)
+
+    def test_incremental(self):
+        rows, summary = self.export('--since-id', str(self.ids[2]))
+        self.assertEqual([row['user_id'] for row in rows], self.ids[3:])
+        rows, summary = self.export('--since', '2999-01-01')
+        self.assertEqual(rows, [])
+
+
+class RequoteCommandTest(TransactionTestCase):
+    """
+        requote scores users in chunks, only writes changed recommendations and resumes
+        from its checkpoint
+    """
+    fixtures = ['health_questions', 'health_question_options', 'health_plan_costs', 'life_plan_costs', 'disability_plan_costs']
+
+    def setUp(self):
+        for i in range(5):
+            user = User.objects.create(username='user%d@jetson.com' % i)
+            user_general_answers.objects.create(user_id=user, age=30 + i, zipcode=14850, marital_status='married',
+                num_kids=2, annual_income=50000 + 10000 * i, gender='female')
+            user_life_answers.objects.create(user_id=user, mortgage_balance=20000, other_debts_balance=500,
+                existing_life_insurance=100, balance_investings_savings=1000)
+        self.ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.checkpoint = os.path.join(directory, 'requote.json')
+
+    def requote(self, *args):
+        out = StringIO()
+        call_command('requote', '--workers', '1', '--chunk-size', '2', '--checkpoint', self.checkpoint, *args, stdout=out)
+        return out.getvalue()
+
+    def recommended(self):
+        return dict(user_recommendation.objects.values_list('user_id', 'health_plan_id'))
+
+    def test_chunks_and_changed_columns(self):
+        output = self.requote()
+        self.assertEqual(output.count('requoted users up to'), 3)
+        self.assertIn('done: 5 users, 5 rows written', output)
+        recommended = self.recommended()
+        self.assertEqual(set(recommended), set(self.ids))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+        # nothing changed, nothing written
+        self.assertIn('done: 5 users, 0 rows written', self.requote())
+
+        other_plan = health_plan_costs.objects.exclude(pk=recommended[self.ids[0]]).first()
+        user_recommendation.objects.filter(user_id=self.ids[0]).update(health_plan_id=other_plan)
+        self.assertIn('done: 5 users, 1 rows written', self.requote())
+        self.assertEqual(self.recommended(), recommended)
+
+    def test_unquotable_users_keep_their_plans(self):
+        self.requote()
+        stored = user_recommendation.objects.get(user_id=self.ids[0])
+        plans = (stored.health_plan_id_id, stored.life_plan_id_id)
+
+        # no matching health or life plan for the user's answers
+        self.assertEqual(write_recommendations([self.ids[0]], [None], [None]), 0)
+        stored.refresh_from_db()
+        self.assertEqual((stored.health_plan_id_id, stored.life_plan_id_id), plans)
+
+    def test_resume(self):
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'last_id': self.ids[2], 'rows': 3}, f)
+        output = self.requote('--resume')
+        self.assertIn('resuming after user %d (3 users already requoted)' % self.ids[2], output)
+        self.assertEqual(set(self.recommended()), set(self.ids[3:]))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_filter(self):
+        user = User.objects.get(pk=self.ids[0])
+        for age in [3, 6]:
+            user_kids.objects.create(user_id=user, kid_age=age, will_pay_for_college='yes')
+
+        # two kids match, the user is still requoted once
+        self.assertIn('done: 1 users, 1 rows written', self.requote('--filter', 'user_kids__will_pay_for_college=yes'))
+        self.assertEqual(set(self.recommended()), set([self.ids[0]]))
+
+        with self.assertRaises(CommandError):
+            self.requote('--filter', 'is_active')
+
+
+class SyncModelStateMigrationTest(TransactionTestCase):
+    """
+        0010 only records the state on databases that already have the models' schema
+        (production), it never drops or re-adds their columns
+    """
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('app', target)])
+
+    def test_existing_schema_is_kept(self):
+        leaf = MigrationExecutor(connection).loader.graph.leaf_nodes('app')[0][1]
+        plan = health_plan_costs.objects.create(health_plan_id=1, carrier='carrier', plan_name='plan', medal='Gold',
+            plan_type='HMO', monthly_premium=400, deductible=2000, deductible_level='Low', has_spouse=True, num_kids=2)
+
+        # a database whose migrations stop at 0009 although it has the current tables
+        self.migrate('0009_auto_20180330_1937')
+        self.migrate(leaf)
+
+        plan.refresh_from_db()
+        self.assertEqual((plan.has_spouse, plan.num_kids), (True, 2))
 
-# Create your tests here.
@@ -0,0 +1,105 @@
+"""
+    benchmarks: offline performance checks for the recommendation engine and the API
+
+    Every benchmark is a script run from the project root, e.g.
+        python -m benchmarks.bench_batch_recommendation
+
+    benchmarks.suite runs the whole set of recommendation, formatting and endpoint cases
+    and writes the results to a JSON file to diff between builds.
+"""
+import json
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CATALOG_FIXTURES = ['health_questions', 'health_question_options', 'health_plan_costs', 'life_plan_costs', 'disability_plan_costs']
+
+HEALTH_ANSWERS = {'q_1': 'No', 'q_2': 'No', 'q_5': 'Might go', 'q_6': 'Never or just for my annual physical',
+    'q_7': "Drink some tea, it'll pass", 'q_8': 'Find out cost before booking appt', 'q_9': 'It crosses my mind sometimes.',
+    'q_10': 'It crosses my mind sometimes.', 'q_11': 'Convenient time with any doctor', 'q_12': 'If my doc says so'}
+
+# a generateInsuranceQuotes input, with the answers of create_answered_user
+USER_DATA = {
+    'GENERAL': {'age': 31, 'zipcode': '14850', 'marital_status': 'married', 'health_condition': 'good', 'annual_income': '85000',
+        'spouse_annual_income': '0', 'spouse_age': 30, 'num_kids': '2', 'kid_ages': [3, 6], 'gender': 'female'},
+    'HEALTH': HEALTH_ANSWERS,
+    'LIFE': {'mortgage_balance': 20000, 'other_debts_balance': 500, 'existing_life_insurance': 100, 'balance_investings_savings': 1000}
+}
+
+
+def setup():
+    """
+        Configures django with the benchmark settings profile
+    """
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+
+def fixture_instances(model, name):
+    """
+        Builds unsaved model instances from one of the files in app/fixtures
+    """
+    with open(os.path.join(ROOT_DIR, 'app', 'fixtures', name + '.json')) as f:
+        rows = json.load(f)
+    return [model(pk=row['pk'], **dict((k + '_id' if k == 'health_question_id' else k, v) for k, v in row['fields'].items()))
+        for row in rows]
+
+
+def timed(func, repeat=3):
+    """
+        Runs func repeat times
+        :return best wall clock time in seconds
+    """
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0
+
+
+def seed_database():
+    """
+        Creates the tables (the shared cache ones too) and loads the plan catalogs and
+        health questions
+    """
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    call_command('createcachetable', verbosity=0)
+    call_command('loaddata', *CATALOG_FIXTURES, verbosity=0)
+
+
+def create_answered_user(username, password='jetson-bench-pw', **extra):
+    """
+        Creates a user with every answer filled in (the answers of USER_DATA)
+        :return User, token key
+    """
+    from django.contrib.auth.models import User
+    from rest_framework.authtoken.models import Token
+    from app.models import user_general_answers, user_life_answers, user_kids, user_health_questions_answer
+    from app.scripts import catalog
+
+    user = User.objects.create_user(username=username, password=password, **extra)
+    user_general_answers.objects.create(user_id=user, age=31, zipcode=14850, marital_status='married',
+        num_kids=2, annual_income=85000, gender='female')
+    user_life_answers.objects.create(user_id=user, mortgage_balance=20000, other_debts_balance=500,
+        existing_life_insurance=100, balance_investings_savings=1000)
+    for age in [3, 6]:
+        user_kids.objects.create(user_id=user, kid_age=age, will_pay_for_college='yes')
+    health = user_health_questions_answer(user_id=user)
+    for field, answer in HEALTH_ANSWERS.items():
+        setattr(health, field, catalog.health_option(int(field[2:]), answer))
+    health.save()
+    return user, Token.objects.create(user=user).key
@@ -0,0 +1,139 @@
+"""
+    The dashboard read endpoints through the WSGI app on a fixed thread pool (a threaded
+    WSGI server) against the ASGI app (jetson/asgi.py) on one event loop, with many
+    concurrent clients. Latency includes the time a request waits for a free thread.
+
+    Both return the same bodies and security headers, but the async views skip the rest of
+    the middleware stack (see api/async_views.py), so with SERVER_TIMING or PROFILING on
+    only the WSGI side pays for them.
+
+    usage: python -m benchmarks.bench_asgi [clients] [requests per client] [wsgi threads]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from benchmarks import setup, seed_database, percentile
+
+_db = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False)
+os.environ.setdefault('BENCHMARK_DB', _db.name)
+setup()
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from app.models import *
+from jetson.asgi import application as asgi_application
+
+# what a dashboard load requests
+DASHBOARD = [('getAllInsuranceQuotes', {}), ('getUserInfo', {}), ('getAllInsuranceInfo', {})]
+
+
+def create_users(count):
+    """
+        :return [ token key ] of count users with general and life answers
+    """
+    password = make_password(None)
+    keys = []
+    for i in range(count):
+        user = User.objects.create(username='user%d@jetson.com' % i, password=password)
+        user_general_answers.objects.create(user_id=user, age=30 + i % 10, zipcode=14850, marital_status='married',
+            num_kids=i % 3, annual_income=40000 + 1000 * i, gender='female')
+        user_life_answers.objects.create(user_id=user, mortgage_balance=0, other_debts_balance=1000,
+            existing_life_insurance=0, balance_investings_savings=5000)
+        keys.append(Token.objects.create(user=user).key)
+    return keys
+
+
+def requests_for(keys, per_client):
+    """
+        :return [ [ (path, query string, token key) ] ] --> the requests of every client
+    """
+    clients = []
+    for i, key in enumerate(keys):
+        clients.append([(reverse(name), urlencode(data), key) for name, data in DASHBOARD] * (per_client // len(DASHBOARD)))
+    return clients
+
+
+def report(label, latencies, elapsed):
+    print('%s %6.0f req/s   p50 %7.1fms   p99 %7.1fms' % (label, len(latencies) / elapsed,
+        percentile(latencies, .5) * 1000, percentile(latencies, .99) * 1000))
+
+
+def run_wsgi(clients, threads):
+    handler = WSGIHandler()
+
+    def call(path, query, key):
+        environ = {'PATH_INFO': path, 'QUERY_STRING': query, 'REQUEST_METHOD': 'GET', 'HTTP_AUTHORIZATION': 'Token ' + key}
+        setup_testing_defaults(environ)
+        result = handler(environ, lambda status, headers: None)
+        b''.join(result)
+
+    latencies = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        # every client sends its next request once the previous one is answered
+        def client(requests):
+            for request in requests:
+                sent = time.perf_counter()
+                pool.submit(call, *request).result()
+                latencies.append(time.perf_counter() - sent)
+
+        with ThreadPoolExecutor(len(clients)) as senders:
+            list(senders.map(client, clients))
+    return latencies, time.perf_counter() - start
+
+
+def run_asgi(clients):
+    async def call(path, query, key):
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        async def send(message):
+            pass
+        await asgi_application({'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode(),
+            'root_path': '', 'headers': [(b'authorization', ('Token ' + key).encode())], 'server': ('testserver', 80),
+            'client': ('127.0.0.1', 0), 'http_version': '1.1', 'scheme': 'http'}, receive, send)
+
+    latencies = []
+    async def client(requests):
+        for request in requests:
+            sent = time.perf_counter()
+            await call(*request)
+            latencies.append(time.perf_counter() - sent)
+
+    async def all_clients():
+        await asyncio.gather(*[client(requests) for requests in clients])
+
+    loop = asyncio.new_event_loop()
+    start = time.perf_counter()
+    loop.run_until_complete(all_clients())
+    elapsed = time.perf_counter() - start
+    loop.close()
+    return latencies, elapsed
+
+
+def main(clients, per_client, threads):
+    seed_database()
+    requests = requests_for(create_users(clients), per_client)
+
+    print('%d concurrent clients, %d requests each, %d WSGI threads' % (clients, per_client, threads))
+    # the first round warms the token and quote caches for both
+    for label in ['cold', 'warm']:
+        report('wsgi %s' % label, *run_wsgi(requests, threads))
+        report('asgi %s' % label, *run_asgi(requests))
+
+
+if __name__ == '__main__':
+    try:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 200, int(sys.argv[2]) if len(sys.argv) > 2 else 30,
+            int(sys.argv[3]) if len(sys.argv) > 3 else 8)
+    finally:
+        os.remove(_db.name)
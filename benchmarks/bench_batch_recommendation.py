@@ -0,0 +1,72 @@
+"""
+    Throughput of the scalar recommendation functions against the batch engine
+
+    usage: python -m benchmarks.bench_batch_recommendation [households]
+"""
+import random
+import sys
+
+from benchmarks import setup, fixture_instances, timed
+setup()
+
+import numpy as np
+from django.contrib.auth.models import User
+
+from app.models import *
+from app.scripts.recommendation_logic import life_insurance, health_insurance, health_insurance_totals, disability_rec
+from app.scripts.batch_recommendation import *
+
+
+def main(households):
+    rand = random.Random(0)
+    denominators = health_insurance_totals(fixture_instances(health_questions, 'health_questions'))
+    positions = {}
+    for option in sorted(fixture_instances(health_question_options, 'health_question_options'), key=lambda o: o.pk):
+        positions.setdefault(int(option.health_question_id_id), []).append(option)
+    options = HealthOptionTable(positions)
+
+    # columnar inputs
+    married = np.array([rand.random() < 0.5 for i in range(households)])
+    num_kids = np.array([rand.randint(0, 4) for i in range(households)])
+    income = np.array([rand.randint(0, 300000) for i in range(households)])
+    min_kid_age = np.array([rand.randint(0, 21) for i in range(households)])
+    debts = np.array([rand.randint(0, 400000) for i in range(households)])
+    existing = np.array([rand.randint(0, 500000) for i in range(households)])
+    savings = np.array([rand.randint(0, 300000) for i in range(households)])
+    answers = np.array([[rand.randint(-1, len(positions[q]) - 1) for q in HEALTH_QUESTION_IDS] for i in range(households)])
+
+    # the same households as model instances
+    general = [user_general_answers(marital_status='married' if married[i] else 'single', num_kids=int(num_kids[i]),
+        annual_income=int(income[i])) for i in range(households)]
+    life = [user_life_answers(other_debts_balance=int(debts[i]), existing_life_insurance=int(existing[i]),
+        balance_investings_savings=int(savings[i])) for i in range(households)]
+    kids = [[int(min_kid_age[i])] if num_kids[i] else [] for i in range(households)]
+    health = []
+    for row in answers:
+        obj = user_health_questions_answer(user_id=User())
+        for question_id, position in zip(HEALTH_QUESTION_IDS, row):
+            setattr(obj, 'q_' + str(question_id), positions[question_id][position] if position >= 0 else None)
+        health.append(obj)
+
+    def scalar():
+        for i in range(households):
+            life_insurance(life[i], general[i], kids[i])
+            health_insurance(denominators, health[i])
+            disability_rec(general[i])
+
+    def batch():
+        batch_life_insurance(married, num_kids, income, np.ones(households, dtype=bool),
+            np.where(num_kids > 0, min_kid_age, 0), debts, existing, savings)
+        batch_health_insurance(answers, denominators, options)
+        batch_disability_rec(income)
+
+    scalar_time = timed(scalar, repeat=1)
+    batch_time = timed(batch)
+    print('households: %d' % households)
+    print('scalar: %.3fs (%.0f households/sec)' % (scalar_time, households / scalar_time))
+    print('batch:  %.3fs (%.0f households/sec)' % (batch_time, households / batch_time))
+    print('speedup: %.1fx' % (scalar_time / batch_time))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
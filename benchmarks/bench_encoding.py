@@ -0,0 +1,52 @@
+"""
+    Payload size and serialization time of every API response encoding, per endpoint,
+    against the stdlib encoder JsonResponse uses. Encodings whose library is
+    not installed are skipped.
+
+    usage: python -m benchmarks.bench_encoding [encodes per measurement]
+"""
+import json
+import sys
+import timeit
+
+from benchmarks import setup, seed_database, create_answered_user, USER_DATA
+setup()
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import Client
+from django.urls import reverse
+
+from api.renderers import RENDERERS
+
+# (label, url name, GET parameters)
+ENDPOINTS = [
+    ('getUserInfo', 'getUserInfo', {}),
+    ('getInsuranceInfo HEALTH', 'getInsuranceInfo', {'insuranceType': 'HEALTH'}),
+    ('getAllInsuranceInfo', 'getAllInsuranceInfo', {}),
+    ('getAllInsuranceQuotes', 'getAllInsuranceQuotes', {}),
+    ('generateInsuranceQuotes', 'generateInsuranceQuotes', {'userData': json.dumps(USER_DATA)}),
+]
+
+
+def main(number):
+    seed_database()
+    client = Client(HTTP_AUTHORIZATION='Token ' + create_answered_user('bench@jetson.com')[1])
+
+    encoders = [('stdlib json', lambda data: json.dumps(data, cls=DjangoJSONEncoder).encode('utf-8'))]
+    for renderer in RENDERERS:
+        if renderer.available:
+            encoders.append((renderer.media_type, renderer.render))
+        else:
+            print('skipping %s, its library is not installed' % renderer.media_type)
+
+    print('%-26s %-20s %8s %10s' % ('endpoint', 'encoding', 'bytes', 'us/encode'))
+    for label, name, params in ENDPOINTS:
+        data = client.get(reverse(name), params).json()
+        for encoding, encode in encoders:
+            size = len(encode(data))
+            seconds = min(timeit.repeat(lambda: encode(data), number=number, repeat=3)) / number
+            print('%-26s %-20s %8d %10.1f' % (label, encoding, size, seconds * 1e6))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
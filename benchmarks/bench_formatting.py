@@ -0,0 +1,72 @@
+"""
+    Per-value cost of the number formatters at bulk quote volumes: the formatters without
+    their memo (what every call used to cost), the memoized scalar formatters and the
+    list formatters, over catalog values (deductibles, policy amounts, premiums)
+
+    usage: python -m benchmarks.bench_formatting [values]
+"""
+import random
+import sys
+from contextlib import contextmanager
+
+from benchmarks import setup, fixture_instances, timed
+setup()
+
+import numpy as np
+
+from app.models import health_plan_costs, life_plan_costs
+from api import formatting
+
+MEMOIZED = ['_num_to_usd', '_abbrev_num', '_abbrev_num_to_usd']
+
+
+@contextmanager
+def memo_disabled():
+    """
+        Swaps the memoized formatters for the plain functions they wrap
+    """
+    saved = dict((name, getattr(formatting, name)) for name in MEMOIZED)
+    for name, func in saved.items():
+        setattr(formatting, name, func.__wrapped__)
+    try:
+        yield
+    finally:
+        for name, func in saved.items():
+            setattr(formatting, name, func)
+
+
+def formatters():
+    """
+        :return [ (label, scalar formatter, list formatter, catalog values) ]
+    """
+    deductibles = [plan.deductible for plan in fixture_instances(health_plan_costs, 'health_plan_costs')]
+    premiums = [plan.monthly_premium for plan in fixture_instances(health_plan_costs, 'health_plan_costs')]
+    policy_amounts = [plan.policy_amount for plan in fixture_instances(life_plan_costs, 'life_plan_costs')]
+    return [
+        ('num_to_usd deductible', formatting.num_to_usd, formatting.nums_to_usd, deductibles),
+        ('num_to_usd premium', formatting.num_to_usd, formatting.nums_to_usd, premiums),
+        ('abbrev_num_to_usd policy', formatting.abbrev_num_to_usd, formatting.abbrev_nums_to_usd, policy_amounts),
+    ]
+
+
+def main(count):
+    rand = random.Random(0)
+    print('%d values per run, ns per value' % count)
+    print('%-26s %10s %10s %10s %10s' % ('formatter', 'uncached', 'memoized', 'list', 'array'))
+    for label, scalar, vectorized, catalog_values in formatters():
+        values = [rand.choice(catalog_values) for i in range(count)]
+        array = np.array(values)
+        with memo_disabled():
+            expected = [scalar(value) for value in values]
+            results = [timed(lambda: [scalar(value) for value in values])]
+        results += [
+            timed(lambda: [scalar(value) for value in values]),
+            timed(lambda: vectorized(values)),
+            timed(lambda: vectorized(array)),
+        ]
+        assert vectorized(array) == expected
+        print('%-26s %10.0f %10.0f %10.0f %10.0f' % ((label,) + tuple(seconds / count * 1e9 for seconds in results)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,111 @@
+"""
+    Login throughput and quote latency during a login storm, with password hashing on the
+    bounded pool (api/hashing.py) and with one hashing thread per request as before
+
+    usage: python -m benchmarks.bench_password_pool [storm threads] [seconds]
+"""
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from contextlib import redirect_stdout
+
+from benchmarks import setup, seed_database, percentile
+
+_db = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False)
+os.environ.setdefault('BENCHMARK_DB', _db.name)
+setup()
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from app.models import *
+from api import hashing
+from api.hashing import BoundedExecutor
+
+PASSWORD = 'benchmark-pw'
+
+
+def create_users(count):
+    """
+        :return [ token key ] of count users with general answers
+    """
+    password = make_password(PASSWORD)
+    keys = []
+    for i in range(count):
+        user = User.objects.create(username='user%d@jetson.com' % i, password=password)
+        user_general_answers.objects.create(user_id=user, age=30, zipcode=14850, marital_status='married',
+            num_kids=1, annual_income=80000, gender='female')
+        keys.append(Token.objects.create(user=user).key)
+    return keys
+
+
+def quote_latencies(key, seconds):
+    """
+        Requests getAllInsuranceQuotes (uncached) for `seconds`
+        :return [ seconds per request ]
+    """
+    client = Client(HTTP_AUTHORIZATION='Token ' + key)
+    latencies = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        caches['quotes'].clear()
+        start = time.perf_counter()
+        client.get('/api/get-all-insurance-quotes')
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def login_storm(threads, stop, counts):
+    def storm(i):
+        client = Client()
+        while not stop.is_set():
+            res = client.post('/api/login', {'username': 'user%d@jetson.com' % (i % 10), 'password': PASSWORD})
+            counts[res.status_code] = counts.get(res.status_code, 0) + 1
+
+    workers = [threading.Thread(target=storm, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+def run(label, pool, threads, seconds, key):
+    hashing.passwordPool = pool
+    counts = {}
+    stop = threading.Event()
+    # the views print every login
+    with redirect_stdout(io.StringIO()):
+        storm = login_storm(threads, stop, counts)
+        latencies = quote_latencies(key, seconds)
+        stop.set()
+        for worker in storm:
+            worker.join()
+
+    print('%s: %.1f logins/sec, %d rejected with 503, quotes p50 %.1fms p99 %.1fms' % (label,
+        counts.get(200, 0) / float(seconds), counts.get(503, 0), percentile(latencies, .5) * 1000, percentile(latencies, .99) * 1000))
+
+
+def main(threads, seconds):
+    seed_database()
+    keys = create_users(10)
+
+    latencies = quote_latencies(keys[0], seconds)
+    print('storm threads: %d, %d cores' % (threads, os.cpu_count()))
+    print('no storm: quotes p50 %.1fms p99 %.1fms' % (percentile(latencies, .5) * 1000, percentile(latencies, .99) * 1000))
+
+    # a pool as large as the storm hashes on every request thread, like before
+    run('unbounded', BoundedExecutor(threads, threads), threads, seconds, keys[0])
+    run('bounded  ', BoundedExecutor(2, 4), threads, seconds, keys[0])
+
+
+if __name__ == '__main__':
+    try:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 16, float(sys.argv[2]) if len(sys.argv) > 2 else 5)
+    finally:
+        os.remove(_db.name)
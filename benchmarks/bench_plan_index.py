@@ -0,0 +1,108 @@
+"""
+    The database form of the plan lookups (PLAN_CATALOG_CACHE = False) against rate tables
+    of production size: fills a throwaway test database with `rows` health and life plans,
+    checks that the optimizer serves catalog.health_plan_query / life_plan_query from the
+    composite lookup indexes without sorting, and times the lookups.
+
+    Meant for the project's MySQL server, run with the project settings:
+        DJANGO_SETTINGS_MODULE=jetson.settings python -m benchmarks.bench_plan_index [rows]
+    (creates and drops test_<MYSQL_DB>, the real tables are not touched). With the default
+    benchmark settings it runs on SQLite, whose planner says nothing about MySQL's.
+
+    Exits with status 1 when a lookup is not served by its index.
+
+    usage: python -m benchmarks.bench_plan_index [rows]
+"""
+import random
+import sys
+import time
+
+from benchmarks import setup, percentile
+setup()
+
+from django.db import connection
+
+from app.models import health_plan_costs, life_plan_costs
+from app.scripts import catalog
+
+CHUNK = 10000
+
+HEALTH_KEYS = [(plan_type, level, spouse, kids) for plan_type in ['HMO', 'PPO'] for level in ['High', 'Low']
+    for spouse in [True, False] for kids in range(3)]
+LIFE_KEYS = [(term, amount, gender, age) for term in [10, 20, 30] for amount in range(100000, 2600000, 50000)
+    for gender in ['male', 'female'] for age in ['25', '35']]
+
+
+def fill(rows):
+    rand = random.Random(0)
+    for start in range(0, rows, CHUNK):
+        health_plan_costs.objects.bulk_create([health_plan_costs(health_plan_id=i, carrier='carrier %d' % (i % 500),
+            plan_name='plan %d' % i, medal=rand.choice(['Gold', 'Silver', 'Bronze']), plan_type=key[0], monthly_premium=rand.randint(200, 900),
+            deductible=rand.randint(500, 6000), deductible_level=key[1], has_spouse=key[2], num_kids=key[3])
+            for i, key in ((i, rand.choice(HEALTH_KEYS)) for i in range(start, min(start + CHUNK, rows)))])
+        life_plan_costs.objects.bulk_create([life_plan_costs(life_plan_id=i, carrier='carrier %d' % (i % 500),
+            policy_term=key[0], policy_amount=key[1], gender=key[2], age=key[3], monthly=rand.randint(10, 300))
+            for i, key in ((i, rand.choice(LIFE_KEYS)) for i in range(start, min(start + CHUNK, rows)))])
+
+
+def explain(queryset):
+    """
+        :return (plan as text, index used or None, needs a sort) of queryset.first()
+    """
+    sql, params = queryset[:1].query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql, params)
+            columns = [column[0] for column in cursor.description]
+            row = dict(zip(columns, cursor.fetchone()))
+            extra = row.get('Extra') or ''
+            return 'key=%s rows=%s extra=%s' % (row['key'], row['rows'], extra), row['key'], 'filesort' in extra
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        plan = ' | '.join(str(row[-1]) for row in cursor.fetchall())
+        index = next((name for name in ['health_plan_lookup_idx', 'life_plan_lookup_idx'] if name in plan), None)
+        return plan, index, 'TEMP B-TREE' in plan
+
+
+def check(label, index, queries):
+    """
+        Explains and times queryset().first() for every query
+        :return True when every query uses index without a sort
+    """
+    ok = True
+    latencies = []
+    for queryset in queries:
+        plan, used, sorts = explain(queryset)
+        if used != index or sorts:
+            print('  FAIL %s: %s' % (label, plan))
+            ok = False
+        start = time.perf_counter()
+        queryset.first()
+        latencies.append(time.perf_counter() - start)
+    print('%-8s %s, %d lookups  p50 %.2fms  p99 %.2fms  e.g. %s' % (label, 'index used' if ok else 'NOT INDEXED', len(queries),
+        percentile(latencies, .5) * 1000, percentile(latencies, .99) * 1000, explain(queries[0])[0]))
+    return ok
+
+
+def main(rows):
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        start = time.perf_counter()
+        fill(rows)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute('ANALYZE TABLE app_health_plan_costs, app_life_plan_costs')
+                cursor.fetchall()
+            else:
+                cursor.execute('ANALYZE')
+        print('%s, %d health and %d life plans (%.0fs to load)' % (connection.vendor, rows, rows, time.perf_counter() - start))
+
+        ok = check('health', 'health_plan_lookup_idx', [catalog.health_plan_query(*key) for key in HEALTH_KEYS])
+        ok = check('life', 'life_plan_lookup_idx', [catalog.life_plan_query(*key) for key in LIFE_KEYS[::10]]) and ok
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000000) else 1)
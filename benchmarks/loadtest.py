@@ -0,0 +1,371 @@
+"""
+    Replays a request log against a server started locally with the benchmark settings
+    profile (or an already running one) and reports, per endpoint, throughput, latency
+    percentiles, error rates and the SQL statements the server ran (the X-Query-Count
+    header of benchmarks/middleware.py, which only the WSGI stack adds)
+
+    The log is NDJSON, one request per line:
+        { "method": "GET", "path": "/api/get-all-insurance-quotes", "params": {}, "auth": "user3@jetson.com" }
+    params go in the query string of GETs and the form body of POSTs (dicts and lists as
+    JSON, like the frontend sends userData), auth is the username whose token the request
+    carries (null for anonymous requests). Logins without a password get PASSWORD.
+
+    With --rate the requests arrive at that many per second whatever the server does
+    (latency then includes the time a request waits for a free connection), without it
+    every connection sends its next request as soon as the previous one is answered.
+
+    The local server is gunicorn (wsgi) or uvicorn (asgi) with --workers processes.
+    runserver is single process and drops idle keep-alive connections, use it only to
+    check that a log replays, not to measure saturation.
+
+    usage:
+        python -m benchmarks.loadtest generate traffic.ndjson [--requests 2000] [--users 50]
+        python -m benchmarks.loadtest run traffic.ndjson [--server wsgi|asgi|runserver|none] [--url URL]
+            [--workers 4] [--concurrency 8] [--rate 0] [--loops 1] [--output results.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import queue
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks import ROOT_DIR, USER_DATA, HEALTH_ANSWERS, percentile
+
+PASSWORD = 'jetson-bench-pw'
+
+# (share of the traffic, path), the mix of a dashboard-heavy day
+MIX = [
+    (.05, '/api/login'),
+    (.55, '/api/get-all-insurance-quotes'),
+    (.10, '/api/update-insurance-info'),
+    (.30, '/api/generate-insurance-quotes'),
+]
+
+
+def generate(path, requests, users):
+    """
+        Writes a synthetic log with the MIX of requests from `users` users
+    """
+    rand = random.Random(0)
+    with open(path, 'w') as f:
+        for i in range(requests):
+            username = 'user%d@jetson.com' % rand.randrange(users)
+            endpoint = rand.choices([endpoint for share, endpoint in MIX], [share for share, endpoint in MIX])[0]
+            entry = {'method': 'POST', 'path': endpoint, 'params': {}, 'auth': username}
+
+            if endpoint == '/api/login':
+                entry['params'] = {'username': username}
+                entry['auth'] = None
+            elif endpoint == '/api/get-all-insurance-quotes':
+                entry['method'] = 'GET'
+            elif endpoint == '/api/update-insurance-info':
+                entry['params'] = {'insuranceType': 'HEALTH', 'insuranceData': dict(HEALTH_ANSWERS, q_1=rand.choice(['Yes', 'No']))}
+            else:
+                # anonymous visitors trying a few profiles
+                general = dict(USER_DATA['GENERAL'], age=rand.randint(22, 60), annual_income=str(rand.randrange(20000, 200000, 5000)))
+                entry = {'method': 'GET', 'path': endpoint, 'params': {'userData': dict(USER_DATA, GENERAL=general)}, 'auth': None}
+            f.write(json.dumps(entry) + '\n')
+
+
+def load_log(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def usernames(log):
+    names = set(entry['auth'] for entry in log if entry.get('auth'))
+    names.update(entry['params']['username'] for entry in log if entry['path'].endswith('/login') and 'username' in entry.get('params', {}))
+    return sorted(names)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind, log, workers):
+    """
+        Seeds a fresh SQLite file with the catalogs and every user of the log and serves it
+        :return server process, base url, { username: token key }
+    """
+    db = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False).name
+    env = dict(os.environ, BENCHMARK_DB=db, DJANGO_SETTINGS_MODULE='benchmarks.settings')
+    os.environ.update(BENCHMARK_DB=db)
+
+    from benchmarks import setup, seed_database, create_answered_user
+    setup()
+    seed_database()
+    from django.contrib.auth.hashers import make_password
+    from django.db import connections
+    # hash once, create_user would hash for every user
+    password = make_password(PASSWORD)
+    tokens = {}
+    for username in usernames(log):
+        user, tokens[username] = create_answered_user(username, password=None)
+        user.password = password
+        user.save(update_fields=['password'])
+    connections.close_all()
+
+    port = free_port()
+    if kind == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'jetson.asgi:application', '--port', str(port), '--workers', str(workers),
+            '--log-level', 'warning']
+    elif kind == 'wsgi':
+        command = [sys.executable, '-m', 'gunicorn', 'jetson.wsgi:application', '--bind', '127.0.0.1:%d' % port,
+            '--workers', str(workers), '--log-level', 'warning']
+    else:
+        command = [sys.executable, 'manage.py', 'runserver', '127.0.0.1:%d' % port, '--noreload']
+    server = subprocess.Popen(command, cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    server.db = db
+
+    deadline = time.time() + 30
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            if time.time() > deadline or server.poll() is not None:
+                stop_server(server)
+                raise RuntimeError('the %s server did not start: %s' % (kind, ' '.join(command)))
+            time.sleep(.2)
+    return server, 'http://127.0.0.1:%d' % port, tokens
+
+
+def stop_server(server):
+    server.terminate()
+    server.wait()
+    os.remove(server.db)
+
+
+def login_tokens(url, log):
+    """
+        Logs every user of the log in on an already running server
+        :return { username: token key }
+    """
+    tokens = {}
+    for username in usernames(log):
+        status, body, queries = send(Connection(url), 'POST', '/api/login', {'username': username, 'password': PASSWORD}, None)
+        tokens[username] = json.loads(body.decode())['token']
+    return tokens
+
+
+class Connection(object):
+    """
+        A keep-alive connection to the server, reopened after errors
+
+        A server may close an idle keep-alive connection at any time, the next request
+        sent on it then fails without an answer. Like browsers, such a request is sent once
+        more on a new connection (counted in reconnects) instead of being reported as an
+        error; failures on a fresh connection are errors.
+    """
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.connection = None
+        self.reconnects = 0
+
+    def request(self, method, path, body, headers):
+        reused = self.connection is not None
+        try:
+            return self._request(method, path, body, headers)
+        except (ConnectionResetError, BrokenPipeError, http.client.BadStatusLine):
+            # RemoteDisconnected is both
+            if not reused:
+                raise
+            self.reconnects += 1
+            return self._request(method, path, body, headers)
+
+    def _request(self, method, path, body, headers):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+            return response.status, response.read(), response.getheader('X-Query-Count')
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+
+
+# any 32 characters work as a CSRF secret, as long as the cookie and the header agree
+CSRF_SECRET = 'loadtestloadtestloadtestloadtest'
+
+
+def send(connection, method, path, params, token):
+    """
+        :return status, body, X-Query-Count header (None when missing)
+    """
+    params = dict((key, json.dumps(value) if isinstance(value, (dict, list)) else value) for key, value in params.items())
+    headers = {}
+    if token:
+        headers['Authorization'] = 'Token ' + token
+    body = None
+    if method == 'GET':
+        path = path + ('?' + urlencode(params) if params else '')
+    else:
+        body = urlencode(params)
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        headers['Cookie'] = 'csrftoken=' + CSRF_SECRET
+        headers['X-CSRFToken'] = CSRF_SECRET
+    return connection.request(method, path, body, headers)
+
+
+class Stats(object):
+    """
+        Latencies, errors and query totals of one endpoint
+    """
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.queries = 0
+        self.counted = 0
+
+    def add(self, latency, ok, queries):
+        self.latencies.append(latency)
+        if not ok:
+            self.errors += 1
+        if queries is not None:
+            self.queries += int(queries)
+            self.counted += 1
+
+    def report(self, elapsed):
+        count = len(self.latencies)
+        return {
+            'requests': count,
+            'throughput': round(count / elapsed, 1),
+            'error_rate': round(self.errors / float(count), 4) if count else 0,
+            'p50_ms': round(percentile(self.latencies, .5) * 1000, 2),
+            'p90_ms': round(percentile(self.latencies, .9) * 1000, 2),
+            'p99_ms': round(percentile(self.latencies, .99) * 1000, 2),
+            'queries': self.queries if self.counted else None,
+            'queries_per_request': round(self.queries / float(self.counted), 2) if self.counted else None,
+        }
+
+
+def replay(url, log, tokens, concurrency, rate, loops):
+    """
+        :return { path: Stats }, elapsed seconds, requests resent after a stale keep-alive connection
+    """
+    stats = {}
+    lock = threading.Lock()
+    work = queue.Queue(maxsize=0 if rate else concurrency * 2)
+    connections = [Connection(url) for i in range(concurrency)]
+
+    def worker(connection):
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            entry, scheduled = item
+            params = dict(entry.get('params') or {})
+            if entry['path'].endswith('/login'):
+                params.setdefault('password', PASSWORD)
+            start = scheduled if scheduled is not None else time.perf_counter()
+            try:
+                status, body, queries = send(connection, entry['method'], entry['path'], params, tokens.get(entry.get('auth')))
+                ok = status < 400
+            except (OSError, http.client.HTTPException):
+                ok, queries = False, None
+            latency = time.perf_counter() - start
+            with lock:
+                stats.setdefault(entry['path'], Stats()).add(latency, ok, queries)
+
+    workers = [threading.Thread(target=worker, args=(connection,)) for connection in connections]
+    for thread in workers:
+        thread.start()
+
+    start = time.perf_counter()
+    for i, entry in enumerate(log * loops):
+        scheduled = None
+        if rate:
+            # open loop: the request is due at its arrival time whether or not a worker is free
+            scheduled = start + i / float(rate)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        work.put((entry, scheduled))
+    for thread in workers:
+        work.put(None)
+    for thread in workers:
+        thread.join()
+    return stats, time.perf_counter() - start, sum(connection.reconnects for connection in connections)
+
+
+def run(args):
+    log = load_log(args.log)
+    server = None
+    if args.server == 'none':
+        url = args.url
+        tokens = login_tokens(url, log)
+    else:
+        server, url, tokens = start_server(args.server, log, args.workers)
+
+    try:
+        stats, elapsed, reconnects = replay(url, log, tokens, args.concurrency, args.rate, args.loops)
+    finally:
+        if server is not None:
+            stop_server(server)
+
+    total = Stats()
+    for endpoint_stats in stats.values():
+        total.latencies += endpoint_stats.latencies
+        total.errors += endpoint_stats.errors
+        total.queries += endpoint_stats.queries
+        total.counted += endpoint_stats.counted
+    results = dict((path, endpoint_stats.report(elapsed)) for path, endpoint_stats in stats.items())
+    results['total'] = total.report(elapsed)
+
+    print('%d requests in %.1fs, %d connections, %s, %d resent on a new connection' % (len(total.latencies), elapsed,
+        args.concurrency, 'arrival rate %g/s' % args.rate if args.rate else 'closed loop', reconnects))
+    print('%-34s %8s %8s %7s %9s %9s %9s %9s' % ('endpoint', 'requests', 'req/s', 'errors', 'p50 ms', 'p90 ms', 'p99 ms', 'queries'))
+    for path in sorted(results, key=lambda path: (path == 'total', path)):
+        result = results[path]
+        print('%-34s %8d %8.1f %6.1f%% %9.1f %9.1f %9.1f %9s' % (path, result['requests'], result['throughput'],
+            result['error_rate'] * 100, result['p50_ms'], result['p90_ms'], result['p99_ms'],
+            '-' if result['queries'] is None else result['queries']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'server': args.server, 'workers': args.workers, 'concurrency': args.concurrency, 'rate': args.rate,
+                'elapsed': round(elapsed, 3), 'reconnects': reconnects, 'endpoints': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replays recorded API traffic against a local server')
+    commands = parser.add_subparsers(dest='command')
+
+    generate_parser = commands.add_parser('generate', help='write a synthetic log with the usual request mix')
+    generate_parser.add_argument('log')
+    generate_parser.add_argument('--requests', type=int, default=2000)
+    generate_parser.add_argument('--users', type=int, default=50)
+
+    run_parser = commands.add_parser('run', help='replay a log')
+    run_parser.add_argument('log')
+    run_parser.add_argument('--server', choices=['wsgi', 'asgi', 'runserver', 'none'], default='wsgi',
+        help='start gunicorn (wsgi), uvicorn (asgi) or runserver on a seeded SQLite file, or use --url')
+    run_parser.add_argument('--workers', type=int, default=4, help='server processes of gunicorn and uvicorn')
+    run_parser.add_argument('--url', default='http://127.0.0.1:8000', help='server to use with --server none')
+    run_parser.add_argument('--concurrency', type=int, default=8, help='open connections')
+    run_parser.add_argument('--rate', type=float, default=0, help='arrivals per second, 0 for a closed loop')
+    run_parser.add_argument('--loops', type=int, default=1, help='times to replay the log')
+    run_parser.add_argument('--output', default=None, help='JSON file for the results')
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        generate(args.log, args.requests, args.users)
+    elif args.command == 'run':
+        run(args)
+    else:
+        parser.print_help()
@@ -0,0 +1,26 @@
+"""
+    Middleware of the benchmark settings profile
+"""
+from django.db import connection
+
+
+class QueryCountMiddleware(object):
+    """
+        Adds X-Query-Count, the number of SQL statements the request ran, to every response
+        (benchmarks/loadtest.py totals it per endpoint). Statements run while a streaming
+        response is being consumed are not counted.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        count = [0]
+
+        def counted(execute, sql, params, many, context):
+            count[0] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(counted):
+            response = self.get_response(request)
+        response['X-Query-Count'] = str(count[0])
+        return response
@@ -0,0 +1,26 @@
+"""
+    Settings profile for the offline benchmarks: the project settings on top of an
+    in-memory SQLite database, so no MySQL server is needed
+"""
+import os
+
+for key in ['MYSQL_DB', 'MYSQL_USER', 'MYSQL_PASSWORD']:
+    os.environ.setdefault(key, '')
+
+from jetson.settings import *
+
+DEBUG = False
+
+# benchmarks that query from several threads need a file, every thread would get its own
+# empty in-memory database
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('BENCHMARK_DB', ':memory:'),
+        # the server processes of benchmarks/loadtest.py take turns writing the file
+        'OPTIONS': {'timeout': 30},
+    }
+}
+
+# X-Query-Count on every response, for benchmarks/loadtest.py
+MIDDLEWARE = ['benchmarks.middleware.QueryCountMiddleware'] + MIDDLEWARE
@@ -0,0 +1,239 @@
+"""
+    The offline benchmark suite: the recommendation functions, the formatting helpers and
+    every endpoint in api/urls.py (through the django test client), against the in-memory
+    SQLite profile in benchmarks/settings.py
+
+    Every case reports ops/sec, p50/p99 latency and the queries one operation runs. The
+    results go to a JSON file (sorted keys, one case per key) meant to be kept per build and
+    diffed, --compare prints the changes against an earlier file.
+
+    usage: python -m benchmarks.suite [--number 200] [--only name] [--output benchmark-results.json]
+        [--compare old-results.json]
+"""
+import argparse
+import io
+import itertools
+import json
+import platform
+import sys
+import time
+from contextlib import redirect_stdout
+
+from benchmarks import setup, seed_database, create_answered_user, percentile, USER_DATA, HEALTH_ANSWERS
+setup()
+
+import django
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from app.models import *
+from app.scripts import catalog
+from app.scripts.recommendation_logic import life_insurance, health_insurance, disability_rec
+from api import formatting, urls, views
+
+DEFAULT_OUTPUT = 'benchmark-results.json'
+
+
+class Case(object):
+    """
+        :param name: unique name in the results file
+        :param group: 'recommendation', 'formatting' or 'endpoint'
+        :param run: func() --> one operation
+        :param prepare: optional func() run before every operation, not timed
+        :param scale: operations per run relative to --number (slow cases run fewer)
+    """
+    def __init__(self, name, group, run, prepare=None, scale=1.0):
+        self.name = name
+        self.group = group
+        self.run = run
+        self.prepare = prepare
+        self.scale = scale
+
+
+def measure(case, number):
+    """
+        :return dict of the case's results
+    """
+    number = max(5, int(number * case.scale))
+    # the views print on login, keep the report readable
+    with redirect_stdout(io.StringIO()):
+        # warm up (catalogs, caches) and count the queries of one operation
+        if case.prepare:
+            case.prepare()
+        case.run()
+        if case.prepare:
+            case.prepare()
+        with CaptureQueriesContext(connection) as queries:
+            case.run()
+        # every request resets the query log, count before the next one
+        query_count = len(queries.captured_queries)
+
+        latencies = []
+        for i in range(number):
+            if case.prepare:
+                case.prepare()
+            start = time.perf_counter()
+            case.run()
+            latencies.append(time.perf_counter() - start)
+
+    return {
+        'group': case.group,
+        'number': number,
+        'ops_per_sec': round(number / sum(latencies), 1),
+        'p50_ms': round(percentile(latencies, .5) * 1000, 4),
+        'p99_ms': round(percentile(latencies, .99) * 1000, 4),
+        'queries': query_count,
+    }
+
+
+def recommendation_cases(user):
+    general = user_general_answers.objects.get(user_id=user)
+    life = user_life_answers.objects.get(user_id=user)
+    health = user_health_questions_answer.objects.select_related(*HEALTH_ANSWER_FIELDS).get(user_id=user)
+    kid_ages = list(user_kids.objects.filter(user_id=user).values_list('kid_age', flat=True))
+    totals = catalog.health_denominators()
+
+    return [
+        Case('life_insurance', 'recommendation', lambda: life_insurance(life, general, kid_ages), scale=50),
+        Case('health_insurance', 'recommendation', lambda: health_insurance(totals, health), scale=50),
+        Case('disability_rec', 'recommendation', lambda: disability_rec(general), scale=50),
+    ]
+
+
+def formatting_cases():
+    amounts = list(life_plan_costs.objects.values_list('policy_amount', flat=True))
+    return [
+        Case('num_to_usd', 'formatting', lambda: formatting.num_to_usd(1500), scale=50),
+        Case('abbrev_num_to_usd', 'formatting', lambda: formatting.abbrev_num_to_usd(500000), scale=50),
+        Case('abbrev_nums_to_usd x%d' % len(amounts), 'formatting', lambda: formatting.abbrev_nums_to_usd(amounts), scale=10),
+    ]
+
+
+def check(res):
+    """
+        Fails the run on error responses, so no case ever measures an error path
+        :return res
+    """
+    if res.status_code >= 400 or (res.get('Content-Type') == 'application/json' and not res.json().get('success', True)):
+        raise AssertionError('%s %s' % (res.status_code, res.content[:200]))
+    if res.streaming:
+        b''.join(res.streaming_content)
+    return res
+
+
+def endpoint_cases():
+    """
+        :return [ Case ] for every url name in api/urls.py that has a request below
+    """
+    user, key = create_answered_user('bench@jetson.com')
+    admin, admin_key = create_answered_user('admin@jetson.com', is_staff=True)
+    logout_user, logout_key = create_answered_user('logout@jetson.com')
+    client = Client(HTTP_AUTHORIZATION='Token ' + key)
+    admin_client = Client(HTTP_AUTHORIZATION='Token ' + admin_key)
+    logout_client = Client()
+    anonymous = Client()
+    counter = itertools.count()
+
+    general = dict(USER_DATA['GENERAL'], kid_ages=[3, 6])
+    user_data = [json.dumps(dict(general, annual_income=income)) for income in [85000, 86000]]
+    health_data = [json.dumps(dict(HEALTH_ANSWERS, q_1=answer)) for answer in ['No', 'Yes']]
+    operations = json.dumps(['getUserInfo', 'getAllInsuranceInfo', 'getAllInsuranceQuotes'])
+    bulk = '\n'.join(json.dumps(dict(USER_DATA, GENERAL=dict(USER_DATA['GENERAL'], age=20 + i), id=i)) for i in range(100))
+
+    def logged_in():
+        logout_client.defaults['HTTP_AUTHORIZATION'] = 'Token ' + Token.objects.get(user=logout_user).key
+
+    requests = {
+        'signup': lambda: check(anonymous.post(reverse('signup'), {'firstName': 'Bench', 'lastName': 'User',
+            'email': 'signup%d@jetson.com' % next(counter), 'password': 'jetson-bench-pw'})),
+        'signIn': lambda: check(anonymous.post(reverse('signIn'), {'username': 'bench@jetson.com', 'password': 'jetson-bench-pw'})),
+        'logout': lambda: check(logout_client.post(reverse('logout'))),
+        'updateUserInfo': lambda: check(client.post(reverse('updateUserInfo'), {'userData': user_data[next(counter) % 2]})),
+        'getUserInfo': lambda: check(client.get(reverse('getUserInfo'))),
+        'updateInsuranceInfo': lambda: check(client.post(reverse('updateInsuranceInfo'),
+            {'insuranceType': 'HEALTH', 'insuranceData': health_data[next(counter) % 2]})),
+        'getInsuranceInfo': lambda: check(client.get(reverse('getInsuranceInfo'), {'insuranceType': 'HEALTH'})),
+        'getAllInsuranceInfo': lambda: check(client.get(reverse('getAllInsuranceInfo'))),
+        'getInsuranceQuote': lambda: check(client.get(reverse('getInsuranceQuote'), {'insuranceType': 'HEALTH'})),
+        'getAllInsuranceQuotes': lambda: check(client.get(reverse('getAllInsuranceQuotes'))),
+        'batch': lambda: check(client.post(reverse('batch'), {'operations': operations})),
+        'generateInsuranceQuotes': lambda: check(anonymous.get(reverse('generateInsuranceQuotes'), {'userData': json.dumps(USER_DATA)})),
+        'bulkInsuranceQuotes': lambda: check(client.post(reverse('bulkInsuranceQuotes'), bulk, content_type='application/x-ndjson')),
+        'exportAnswers': lambda: check(admin_client.get(reverse('exportAnswers'), {'fileType': 'ndjson'})),
+        'getMetrics': lambda: check(admin_client.get(reverse('getMetrics'))),
+    }
+    prepare = {
+        'logout': logged_in,
+    }
+    # password hashing takes most of a second per operation
+    scale = {'signup': .05, 'signIn': .05}
+
+    cases = []
+    for pattern in urls.urlpatterns:
+        if pattern.name not in requests:
+            print('no benchmark for %s' % pattern.name, file=sys.stderr)
+            continue
+        cases.append(Case(pattern.name, 'endpoint', requests[pattern.name], prepare.get(pattern.name), scale.get(pattern.name, 1.0)))
+
+    # the quote endpoints again, without their response caches
+    cases.append(Case('getAllInsuranceQuotes uncached', 'endpoint', requests['getAllInsuranceQuotes'], caches['quotes'].clear))
+    cases.append(Case('generateInsuranceQuotes uncached', 'endpoint', requests['generateInsuranceQuotes'], views.quoteCache.clear))
+    return cases
+
+
+def compare(results, path):
+    """
+        Prints the cases whose throughput or query count changed since the results in path
+    """
+    with open(path) as f:
+        before = json.load(f)['results']
+
+    print('\nchanges since %s' % path)
+    for name in sorted(set(results) & set(before)):
+        old, new = before[name], results[name]
+        ratio = new['ops_per_sec'] / old['ops_per_sec'] if old['ops_per_sec'] else 0
+        queries = '' if new['queries'] == old['queries'] else '   queries %d -> %d' % (old['queries'], new['queries'])
+        print('%-36s %8.2fx ops/sec%s' % (name, ratio, queries))
+    for name in sorted(set(results) ^ set(before)):
+        print('%-36s %s' % (name, 'new' if name in results else 'gone'))
+
+
+def main(args):
+    seed_database()
+    cases = endpoint_cases()
+    user = User.objects.get(username='bench@jetson.com')
+    cases = recommendation_cases(user) + formatting_cases() + cases
+    if args.only:
+        cases = [case for case in cases if args.only in case.name]
+
+    results = {}
+    print('%-36s %12s %10s %10s %8s' % ('case', 'ops/sec', 'p50 ms', 'p99 ms', 'queries'))
+    for case in cases:
+        result = results[case.name] = measure(case, args.number)
+        print('%-36s %12.1f %10.3f %10.3f %8d' % (case.name, result['ops_per_sec'], result['p50_ms'],
+            result['p99_ms'], result['queries']))
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'environment': {'python': platform.python_version(), 'django': django.get_version(), 'database': connection.vendor,
+                'number': args.number},
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print('results written to %s' % args.output)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline benchmarks of the recommendation engine and the API')
+    parser.add_argument('--number', type=int, default=200, help='operations per case (fast cases run more)')
+    parser.add_argument('--only', default=None, help='only the cases whose name contains this')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', default=None, help='an earlier results file')
+    main(parser.parse_args())
@@ -0,0 +1,22 @@
+"""
+ASGI config for jetson project.
+
+It exposes the ASGI callable as a module-level variable named ``application``: the async
+read endpoints of api/async_views.py, with every other request handled by the WSGI app
+(see jetson/wsgi.py) through asgiref. Serve it with an ASGI server, e.g.
+
+    uvicorn jetson.asgi:application
+"""
+
+import os
+
+import django
+from asgiref.wsgi import WsgiToAsgi
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "jetson.settings")
+django.setup()
+
+from api.async_views import AsyncApiApplication
+
+application = AsyncApiApplication(WsgiToAsgi(get_wsgi_application()))
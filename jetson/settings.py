@@ -32,6 +32,7 @@ ALLOWED_HOSTS = ['*']
 
 INSTALLED_APPS = [
 	'app.apps.AppConfig',
+	'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,7 +54,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'django_user_agents.middleware.UserAgentMiddleware'
+    'django_user_agents.middleware.UserAgentMiddleware',
+    'api.profiling.ProfilingMiddleware'
 ]
 
 # specifies the file that holds the base url pattens
@@ -78,11 +81,19 @@ TEMPLATES = [
 # special configuration for django rest framework: specifiy authentication scheme
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
-    )
+    ),
+    # JSON unless the Accept header asks for MessagePack or CBOR (msgpack / cbor2 installed),
+    # see api/renderers.py
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.JSONRenderer',
+        'api.renderers.MessagePackRenderer',
+        'api.renderers.CBORRenderer',
+    ),
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS': 'api.renderers.AcceptNegotiation',
 }
 
 WSGI_APPLICATION = 'jetson.wsgi.application'
@@ -101,6 +112,112 @@ DATABASES = {
 }
 
 
+# Caches
+# versions holds the catalog version stamps (see app/scripts/catalog.py) and quotes the per-user
+# quotes (see api/caching.py UserQuoteCache). Every worker and every management command must see
+# the same entries, or a catalog change or an answer write only reaches the process that made it,
+# so both live in shared storage picked by SHARED_CACHE:
+#   file: one directory per cache under SHARED_CACHE_DIR, shared by the workers of one host and
+#       read without touching the database (the default); a write lists the directory to cull it
+#   memcached: SHARED_CACHE_LOCATION, a memcached server every worker and command connects to,
+#       for deployments with several hosts
+#   database: tables in the project database, create them with `manage.py createcachetable`;
+#       every read is a query and a write a few statements
+#   locmem: a single process only (runserver), entries expire after LOCAL_CACHE_TTL seconds so
+#       several workers misconfigured this way serve stale data for at most that long
+SHARED_CACHE = os.environ.get('SHARED_CACHE', 'file')
+SHARED_CACHE_DIR = os.environ.get('SHARED_CACHE_DIR', '/tmp/jetson-cache')
+LOCAL_CACHE_TTL = 60
+
+def shared_cache(name, timeout=None, max_entries=300):
+    """
+        The CACHES entry of a shared cache, see SHARED_CACHE
+    """
+    if SHARED_CACHE == 'file':
+        return {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': os.path.join(SHARED_CACHE_DIR, name),
+            'TIMEOUT': timeout, 'OPTIONS': {'MAX_ENTRIES': max_entries}}
+    if SHARED_CACHE == 'database':
+        return {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'jetson_cache_' + name,
+            'TIMEOUT': timeout, 'OPTIONS': {'MAX_ENTRIES': max_entries}}
+    if SHARED_CACHE == 'memcached':
+        return {'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': os.environ.get('SHARED_CACHE_LOCATION', '127.0.0.1:11211'), 'KEY_PREFIX': name, 'TIMEOUT': timeout}
+    return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': name,
+        'TIMEOUT': min(timeout or LOCAL_CACHE_TTL, LOCAL_CACHE_TTL), 'OPTIONS': {'MAX_ENTRIES': max_entries}}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+    },
+    'versions': shared_cache('versions'),
+    'quotes': shared_cache('quotes', timeout=24 * 60 * 60, max_entries=100000)
+}
+
+
+# Serve plan lookups from the in-process catalog index (app/scripts/catalog.py) instead of
+# querying the rate tables on every quote
+PLAN_CATALOG_CACHE = True
+
+# Responses of the anonymous generateInsuranceQuotes endpoint cached per worker (entries, seconds),
+# the ttl is also the max-age browsers and proxies get
+QUOTE_CACHE_SIZE = 1024
+QUOTE_CACHE_TTL = 300
+
+# Records bulkInsuranceQuotes reads, quotes and writes at a time
+BULK_QUOTES_CHUNK_SIZE = 500
+
+# Queue user_recommendation changes from the quote endpoints and write them in batches of
+# RECOMMENDATION_FLUSH_SIZE users, or RECOMMENDATION_FLUSH_INTERVAL seconds after the oldest
+# queued change at the latest (a timer thread per worker, see app/scripts/recommendations.py),
+# instead of writing them during the request
+RECOMMENDATION_WRITE_BEHIND = False
+RECOMMENDATION_FLUSH_SIZE = 100
+RECOMMENDATION_FLUSH_INTERVAL = 5
+
+# Token -> user lookups cached per worker (entries, seconds), see api/authentication.py.
+# A logout, token rotation or deactivation takes effect at once in the worker handling it,
+# other workers keep accepting the old token for up to AUTH_TOKEN_CACHE_TTL seconds
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TTL = 5
+
+# Threads hashing passwords for signup/login and how many more requests may wait for one,
+# beyond that they get a 503 (see api/hashing.py)
+PASSWORD_HASHING_WORKERS = 2
+PASSWORD_HASHING_QUEUE = 16
+
+# django's default hashers, with the PBKDF2 one running on the hashing pool
+PASSWORD_HASHERS = [
+    'api.hashing.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+
+# Server-Timing header and an 'api.timing' log line with the SQL, recommendation and
+# serialization time of every request (see api/timing.py), SERVER_TIMING=1 to turn on
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '') == '1'
+
+# Request profiles (see api/profiling.py), PROFILING=1 to turn on: staff users send an
+# X-Profile header, or a PROFILE_SAMPLE_RATE fraction of all requests is profiled with PROFILE_MODE
+PROFILING = os.environ.get('PROFILING', '') == '1'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_MODE = os.environ.get('PROFILE_MODE', 'sampling')
+PROFILE_SAMPLE_INTERVAL = .001
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.timing': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
 